@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, g, request
 from ddtrace import tracer
 
 # Import ALL Blueprints (admin + public)
@@ -24,6 +24,29 @@ def init_app():
     from models import init_redis_orm
     init_redis_orm()
 
+    from core import accounting, start_read_scope
+
+    @app.before_request
+    def start_request_reads():
+        # GET requests read from replicas (until they write); others from the primary, as they write what they read
+        start_read_scope(primary=request.method not in ("GET", "HEAD"))
+
+    @app.before_request
+    def start_request_accounting():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.redis_usage = accounting.start(f"{request.method} {rule}")
+
+    @app.after_request
+    def finish_request_accounting(response):
+        # Logs the Redis usage of the request - and returns it as X-Redis-* headers in debug (and testing) mode.
+        # Streamed responses are counted up to their first byte.
+        usage = g.pop("redis_usage", None)
+        if usage is not None:
+            accounting.finish(usage)
+            if app.debug or app.testing:
+                response.headers.update(usage.headers())
+        return response
+
     # Initialize login system (needed for public routes)
     login.init_app(app)
 
@@ -1,8 +1,10 @@
 from ...admin import admin_api  # Import the Blueprint from __init__.py
 
 import flask 
+import json
 
-from models import Room, User, Code, UserCodes
+from models import Room, User, Code, UserCodes, UsersRooms
+from core import get_redis_client, pool_stats
 
 import utils
 log = utils.get_logger(__name__)
@@ -14,17 +16,16 @@ def ping():
     log.info("admin ping successful")
     return flask.jsonify(response="pong", service="admin"), 200
 
-import redis, os
-redis_client = redis.Redis(
-    host=os.environ.get("REDIS_HOST"),
-    db=os.environ.get("REDIS_DATA_DB"),
-    decode_responses=True
-)
+@admin_api.route("/pools", methods=['GET'])
+def pools():
+    """Connection pool usage of this worker's Redis clients, by role"""
+    return flask.jsonify(pool_stats()), 200
 
 
 @admin_api.route("/flush", methods=['POST'])
 def flush_redis():
     """Flush (clear) the entire Redis database"""
+    redis_client = get_redis_client()  # the data client, shared with the ORM
     try:
         # Get count before flushing for logging
         current_db = redis_client.connection_pool.connection_kwargs.get('db', 0)
@@ -53,6 +54,28 @@ def flush_redis():
         }), 500
 
 
+@admin_api.route("/reindex", methods=['POST'])
+def reindex():
+    """Rebuild indexes - room membership roles, code owners and model registries - e.g. after an upgrade"""
+    memberships = UsersRooms.reindex()
+    codes = UserCodes.reindex()
+    registries = {model.__name__.lower(): model.reindex() for model in (User, Room, Code)}
+    log.info(f"{memberships} room memberships and {codes} codes reindexed, registries {registries}")
+    return flask.jsonify({"status": "ok", "reindexed": {"memberships": memberships, "codes": codes, "registries": registries}}), 200
+
+
+@admin_api.route("/migrate", methods=['POST'])
+def migrate():
+    """Move keys from another layout (?source=flat by default) to the configured one - REDIS_KEY_LAYOUT, e.g. before moving to a cluster"""
+    source = flask.request.args.get("source", "flat")
+    try:
+        moved = {model.__name__.lower(): model.migrate(source) for model in (User, Room, Code, UsersRooms, UserCodes)}
+    except ValueError as e:  # unknown layout
+        return flask.jsonify({"status": "error", "message": str(e)}), 400
+    log.info(f"Keys migrated from the {source} layout: {moved}")
+    return flask.jsonify({"status": "ok", "migrated": moved}), 200
+
+
 @admin_api.route("/rooms", methods=['POST'])
 @admin_api.route("/rooms/<room_id>", methods=['GET', 'PATCH', 'DELETE'])
 def rooms(room_id=None):
@@ -126,34 +149,42 @@ def users(user_id=None):
 
 
 
+def stream_dicts(model, as_list=False, page_size=100):
+    """
+    Streams all objects of a model as a JSON document - an {id: data} object, or a [{id: data}] list -
+    paging through the model registry, oldest first. Relations are eager-loaded page by page, so memory stays constant.
+    Objects deleted while streaming are left out, without cutting the document short.
+
+    Objects created before registries existed are only listed once registered: POST /admin/api/reindex after upgrading.
+    """
+    def generate():
+        yield "[" if as_list else "{"
+        separator = ""
+        for page in model.pages(limit=page_size):
+            for id, data in model.to_dicts(page, include_related=True).items():
+                item = json.dumps({id: data}) if as_list else f"{json.dumps(id)}: {json.dumps(data)}"
+                yield separator + item
+                separator = ", "
+        yield "]" if as_list else "}"
+
+    response = flask.Response(flask.stream_with_context(generate()), status=200, mimetype="application/json")
+    response.headers["X-Total-Count"] = str(model.count())
+    return response
+
+
 @admin_api.route("/codes", methods=['GET'])
 def list_codes():
-
-    codes, cursor = Code.search()
-    data = [code.to_dict(True) for code in codes]    
-    return flask.jsonify(data), 200
+    return stream_dicts(Code, as_list=True)
 
 
 @admin_api.route("/users", methods=['GET'])
 def list_users():
-
-    users, cursor = User.search()
-    data = {}
-    for user in users:
-        data.update(user.to_dict(True))
-
-    return flask.jsonify(data), 200
+    return stream_dicts(User)
 
 
 @admin_api.route("/rooms", methods=['GET'])
 def list_rooms():
-
-    rooms, cursor = Room.search()
-    data = {}
-    for room in rooms:
-        data.update(room.to_dict(True))
-
-    return flask.jsonify(data), 200
+    return stream_dicts(Room)
 
 
 @admin_api.route("/rooms/<room_id>/round", methods=['POST'])
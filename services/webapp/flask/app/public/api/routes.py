@@ -3,7 +3,8 @@ from ...public import public_api  # Import the Blueprint from __init__.py
 import io, qrcode
 import flask, flask_login
 
-from models import Room, User, Code, new_id
+from models import Room, User, Code, UsersRooms, new_id
+from core import batch
 from auth import code_auth  # Import from auth library
 
 import utils, json
@@ -22,7 +23,14 @@ def room_get(room_id=None):
         return flask.jsonify(), 404
 
     # ORM automatically unflattens messages from Redis
-    return flask.jsonify(room.to_dict(True)), 200
+    data = room.to_dict(True)
+
+    # Reactions are counts: add the caller's own reactions to each message
+    reacted = room.reacted(flask_login.current_user.id) if flask_login.current_user.is_authenticated else {}
+    for message_id, message in (data[room.id].get("messages") or {}).items():
+        message["reacted"] = reacted.get(message_id, [])
+
+    return flask.jsonify(data), 200
 
 
 @public_api.route("/v1/rooms/<room_id>/round", methods=['POST'])
@@ -38,11 +46,11 @@ def round_new(room_id=None):
         return flask.jsonify(), 404
 
     user_id = flask_login.current_user.id
-    users = room.users().all()
-    if user_id not in users:
+    role = room.users().role_of(user_id)
+    if role is None:
         return flask.jsonify({"error": "user not in room"}), 403
     # Authorization is always based on current role, not next
-    if users[user_id].role == "watcher":
+    if role == "watcher":
         return flask.jsonify({"error": "watchers cannot start a new round"}), 403
 
     round, cards = room.new_round()
@@ -61,16 +69,22 @@ def room_join(room_id=None):
     if room_id is None:
         return flask.jsonify(), 400
 
-    room = Room.get_by_id(room_id)
+    user_id = flask_login.current_user.id
+
+    # Load the room and check membership in one round trip
+    with batch() as b:
+        room = b.get_by_id(Room, room_id)
+        member = b.exists(UsersRooms, (user_id, room_id))
+
+    room = room.result()
     if room is None:
         return flask.jsonify(), 404
 
-    user_id = flask_login.current_user.id
-
-    if room.users().exists(user_id):
+    if member.result():
         log.debug(f'user {user_id} already member of room {room_id}')
     else:
         log.info(f'adding user {user_id} to room {room_id}')
+        # The relation creation itself checks both objects exist
         room.users().add(user_id, role="watcher", next="watcher")
         utils.publish(room_id, "user:joined", user_id)
 
@@ -90,10 +104,10 @@ def room_message(room_id=None):
     user_id = flask_login.current_user.id
 
     # Check user is member of room and not a watcher
-    users = room.users().all()
-    if user_id not in users:
+    role = room.users().role_of(user_id)
+    if role is None:
         return flask.jsonify({"error": "user not in room"}), 403
-    if users[user_id].role == "watcher":
+    if role == "watcher":
         return flask.jsonify({"error": "watchers cannot send messages"}), 403
 
     # Generate unique message ID
@@ -158,21 +172,19 @@ def message_react(room_id=None, message_id=None):
     if not room.messages or message_id not in room.messages:
         return flask.jsonify({"error": "message not found"}), 404
     
-    # Add or remove reaction using atomic patch operation
-    # ORM flattens: messages:{msg_id}:reactions:{emoji}:{user_id} = "True"
-    reaction_key = f"messages:{message_id}:reactions:{emoji}:{user_id}"
-    
-    if action == "add":
-        Room.patch(room_id, reaction_key, "True", add=True)
-    elif action == "remove":
-        Room.delete_field(room_id, reaction_key)
+    # Add or remove reaction, atomically with the message's reaction count
+    # messages:{msg_id}:reactions:{emoji} = count, and the user's reactions set
+    count = room.react(message_id, emoji, user_id, add=(action == "add"))
+    if count is None:
+        return flask.jsonify({"error": "room does not exist"}), 404
     
     # Publish WebSocket event for real-time updates
     reaction_event = {
         "message_id": message_id,
         "emoji": emoji,
         "action": action,
-        "user_id": user_id
+        "user_id": user_id,
+        "count": count
     }
     utils.publish(room_id, "message:reaction", json.dumps(reaction_event))
     
@@ -191,15 +203,13 @@ def card_score(room_id=None, card_id=None):
     
     user_id = flask_login.current_user.id
     
-    # Check user is member of room and get their relation
-    users = room.users().all()
-    if user_id not in users:
+    # Check user is member of room and get their role
+    role = room.users().role_of(user_id)
+    if role is None:
         return flask.jsonify({"error": "user not in room"}), 403
     
-    relation = users[user_id]
-    
     # Check user is master
-    if relation.role != "master":
+    if role != "master":
         return flask.jsonify({"error": "only masters can score cards"}), 403
     
     # Get score from request
@@ -249,7 +259,8 @@ def room_patch(room_id=None):
 
     user_id = flask_login.current_user.id
 
-    if not room.users().exists(user_id):
+    role = room.users().role_of(user_id)
+    if role is None:
         return flask.jsonify(), 401
 
     for k,v in flask.request.args.items():
@@ -258,7 +269,7 @@ def room_patch(room_id=None):
 
         path = k.split(':')
         
-        if path[0] != "cards":
+        if path[0] != "cards" or len(path) < 3:
             return flask.jsonify(), 400
         else: 
             if path[1] not in room.cards:
@@ -267,6 +278,10 @@ def room_patch(room_id=None):
             if path[2] not in ["flipped", "peeked"]:
                 log.debug(f'invalid card property {path[2]}')
                 return flask.jsonify(), 400
+            # cards:<card_id>:flipped, or cards:<card_id>:peeked:<user_id> - nothing deeper
+            if len(path) != (4 if path[2] == "peeked" else 3):
+                log.debug(f'invalid card path {k}')
+                return flask.jsonify(), 400
             if path[2] == "flipped":
                 if room.cards[path[1]].get("player_id") != user_id:
                     log.debug(f'flip denied: card {path[1]} belongs to {room.cards[path[1]].get("player_id")}, not {user_id}')
@@ -275,18 +290,44 @@ def room_patch(room_id=None):
                 if path[3] != user_id:
                     log.debug(f'peeked card {path[3]} != user {user_id}')
                     return flask.jsonify(), 401
-                relation = room.users().all().get(user_id)
-                if relation and relation.role == "master":
+                if role == "master":
                     log.debug(f'peek denied: user {user_id} is a master')
                     return flask.jsonify(), 403
-
-        Room.patch(room_id, k, v)
+                if v not in ["True", "False"]:
+                    log.debug(f'invalid peek state {v}')
+                    return flask.jsonify(), 400
+
+        if path[2] == "peeked":
+            # Peeks are sparse: only users currently peeking have an entry
+            if v == "True":
+                Room.patch(room_id, k, v, add=True)
+            else:
+                Room.delete_field(room_id, k)
+        else:
+            Room.patch(room_id, k, v)
 
         utils.publish(room_id, f"{k}", v)
 
     return flask.jsonify(), 200
 
 
+@public_api.route("/v1/rooms/<room_id>/cards/<card_id>/peekers", methods=['GET'])
+def card_peekers(room_id=None, card_id=None):
+    '''Lists the users currently peeking at a card'''
+
+    if room_id is None or card_id is None:
+        return flask.jsonify(), 400
+
+    room = Room.get_by_id(room_id)
+    if room is None:
+        return flask.jsonify(), 404
+
+    if not room.cards or card_id not in room.cards:
+        return flask.jsonify({"error": "card not found"}), 404
+
+    return flask.jsonify(peekers=room.peekers(card_id)), 200
+
+
 @public_api.route("/v1/rooms/<room_id>/user/<user_id>", methods=['PATCH'])
 @flask_login.login_required
 def room_user(room_id=None, user_id=None):
@@ -306,12 +347,12 @@ def room_user(room_id=None, user_id=None):
     if user is None:
         return flask.jsonify(), 404
 
-    users = room.users().all()
+    roles = room.users().lookup_many("role", [user_id, flask_login.current_user.id])
 
-    if user_id not in users:
+    if user_id not in roles:
         return flask.jsonify(), 404
 
-    if flask_login.current_user.id not in users:
+    if flask_login.current_user.id not in roles:
         return flask.jsonify(), 403
 
     # Whitelist allowed fields to prevent direct role bypass
@@ -321,7 +362,7 @@ def room_user(room_id=None, user_id=None):
     if not args:
         return flask.jsonify({"error": "no valid fields provided"}), 400
 
-    room.users().set(user_id, **args)
+    room.users().update(user_id, **args)
 
     if "next" in args:
         utils.publish(room_id, "user:next", json.dumps({"user_id": user_id, "next": args["next"]}))
@@ -1,16 +1,18 @@
 import os
-from core import set_redis_client, create_redis_client
+from core import set_redis_client, create_client, pool_options
 
 def init_redis_orm():
     """Initialize Redis ORM with the application's Redis configuration.
     
     This should be called from Flask application factories, not during module import.
+    REDIS_BACKEND=memory runs the app on the in-process memory backend, e.g. for a single-process dev server.
     """
-    client = create_redis_client(
+    client = create_client(
         host=os.environ.get("REDIS_HOST", "localhost"),
         port=int(os.environ.get("REDIS_PORT", "6379")),
         db=int(os.environ.get("REDIS_DATA_DB", "1")),
-        decode_responses=True
+        decode_responses=True,
+        **pool_options("data")
     )
     set_redis_client(client)
 
@@ -1,5 +1,6 @@
 # Import from the redis-orm core package
-from core import ObjectMixin, RelationMixin
+from core import ObjectMixin, RelationMixin, get_redis_client, now
+from core import backends, scripts
 
 import random, json
 import nanoid
@@ -36,25 +37,7 @@ class User(ObjectMixin):
         "rooms": "models.UsersRooms"
     }
     LEFTS   = {}
-
-    @tracer.wrap()
-    def delete(self) -> bool:
-        """Deletes the user and all associated codes."""
-        log.info(f"Deleting all codes associated with User ID {self.id}")
-
-        # Iterate over codes associated with this user
-        for code_id, association in self.codes().all().items():
-            try:
-                code_instance = Code.get_by_id(code_id)
-                if code_instance:
-                    code_instance.delete()
-                    log.info(f"Deleted Code with ID {code_id} associated with User ID {self.id}")
-            except Exception as e:
-                log.error(f"Failed to delete Code with ID {code_id} for User ID {self.id}: {e}")
-
-        # Delete the user and its associations
-        super().delete()
-        return True
+    CASCADE = {"codes"}  # deleting a user deletes their codes - and room memberships, as any relation
 
     # Flask-Login required methods and properties
 
@@ -106,12 +89,67 @@ class UserCodes(RelationMixin):
 
 
 
+# Adds or removes a reaction, keeping the message's reaction count in step with the user's reactions set
+# KEYS[1]: room hash, KEYS[2]: the user's reactions set in the room
+# ARGV: "{message_id}:{emoji}" set member, count field, "add"/"remove", timestamp
+# Returns the reaction count, or false if the room does not exist (anymore)
+REACT = """
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HEXISTS', KEYS[1], '_deleted') == 1 then
+    return false
+end
+local changed
+if ARGV[3] == 'add' then
+    changed = redis.call('SADD', KEYS[2], ARGV[1])
+else
+    changed = redis.call('SREM', KEYS[2], ARGV[1])
+end
+if changed == 0 then
+    return tonumber(redis.call('HGET', KEYS[1], ARGV[2]) or 0)
+end
+local count = redis.call('HINCRBY', KEYS[1], ARGV[2], ARGV[3] == 'add' and 1 or -1)
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[2])
+    count = 0
+end
+redis.call('HINCRBY', KEYS[1], '_version', 1)
+redis.call('HSET', KEYS[1], '_edited', ARGV[4])
+return count
+"""
+
+
+@backends.emulate(REACT)
+def _react(r, keys, args):
+    '''REACT, on the memory backend - keep in step with the Lua script'''
+    if not r.exists(keys[0]) or r.hexists(keys[0], '_deleted'):
+        return False
+    add = args[2] == 'add'
+    changed = r.sadd(keys[1], args[0]) if add else r.srem(keys[1], args[0])
+    if not changed:
+        return int(r.hget(keys[0], args[1]) or 0)
+    count = r.hincrby(keys[0], args[1], 1 if add else -1)
+    if count <= 0:
+        r.hdel(keys[0], args[1])
+        count = 0
+    r.hincrby(keys[0], '_version', 1)
+    r.hset(keys[0], '_edited', args[3])
+    return count
+
+
 class Room(ObjectMixin):
     '''
     Room model with messages as nested dict.
+
+    Reactions are counted per message and emoji (messages:{mid}:reactions:{emoji} = count),
+    while each user's own reactions live in a set beside the room - see react().
     '''
 
-    FIELDS = {"name", "round", "cards", "messages"}
+    FIELDS = {
+        "name": str,
+        "round": dict,
+        # flipped & peeked stay "True"/"False" strings: they are relayed as is to and from the browser
+        "cards": {"*": {"scored": int}},
+        "messages": {"*": {"reactions": {"*": int}}},
+    }
 
     RIGHTS = {} 
     LEFTS = {
@@ -120,16 +158,18 @@ class Room(ObjectMixin):
 
     @tracer.wrap("Room.new_round")
     def new_round(self):
-        users = self.users().all()
+        members = self.users()
 
-        # Promote next -> role for all users
-        for user_id, relation in users.items():
-            if relation.next:
-                self.users().set(user_id, role=relation.next)
-                relation.role = relation.next
+        # Roles and next roles of all members, out of their lookup hashes - no relation is loaded
+        roles = members.lookup_many("role")
+        nexts = members.lookup_many("next")
 
-        # Re-read after promotion
-        users = self.users().all()
+        # Promote next -> role for all users - written alongside the new round below
+        promotions = {}
+        for user_id, next_role in nexts.items():
+            if user_id in roles and next_role != roles[user_id]:
+                promotions[user_id] = {"role": next_role}
+                roles[user_id] = next_role
 
         round_id = new_id()
         round_topic = get_topic()
@@ -142,8 +182,8 @@ class Room(ObjectMixin):
 
         i = 0
         card_ids = []
-        for user_id, relation in users.items():
-            if relation.role == "player":
+        for user_id, role in roles.items():
+            if role == "player":
 
                 while True:
                     card_id = new_id(4)
@@ -151,10 +191,10 @@ class Room(ObjectMixin):
                         break
                 card_ids.append(card_id)
 
+                # Peeks are sparse: only users currently peeking get a cards:{cid}:peeked:{uid} entry
                 cards[card_id] = {
                     "flipped": "True",
                     "player_id": user_id,
-                    "peeked": {u_id: "False" for u_id in users.keys()},
                     "value": values[i],
                     "scored": None
                 }
@@ -164,10 +204,75 @@ class Room(ObjectMixin):
         # Clear old messages when starting new round
         self.messages = {}
         self.cards = cards
-        self.save()
+
+        # Role promotions, the new round state and the reset of reactions - messages are gone, and so are the
+        # reactions to them - are applied atomically, in a single round trip
+        self.save(*members.updates(promotions), drop=[self.reactions_key(user_id) for user_id in roles])
 
         return round, cards
 
+    def reactions_key(self, user_id: str) -> str:
+        '''
+        Key of the set of a user's reactions in the room, as "{message_id}:{emoji}" members
+        - tagged as the room's, for REACT to write both in the same cluster slot
+        '''
+        return self.reactions_key_of(self.id, user_id)
+
+    @classmethod
+    def reactions_key_of(cls, room_id: str, user_id: str) -> str:
+        '''reactions_key(), by room id'''
+        return f"reactions:room_{cls.tag(room_id)}:user_{user_id}"
+
+    @classmethod
+    def migrate(cls, source: str = "flat") -> int:
+        '''Moves rooms to the rooms' key layout (see ObjectMixin.migrate), along with their users' reactions sets'''
+        moved = super().migrate(source)
+
+        redis_client = get_redis_client()
+        for key in list(redis_client.scan_iter(match="reactions:room_*")):
+            room, _, user_id = key[len("reactions:room_"):].rpartition(":user_")
+            target = f"reactions:room_{cls.tag(room.strip('{}'))}:user_{user_id}"
+            if target == key:
+                continue
+            # copied then deleted, rather than renamed: both keys may live in distinct cluster slots
+            members = redis_client.smembers(key)
+            with redis_client.pipeline(transaction=False) as pipe:
+                if members:
+                    pipe.sadd(target, *members)
+                pipe.delete(key)
+                pipe.execute()
+        return moved
+
+    @tracer.wrap("Room.react")
+    def react(self, message_id: str, emoji: str, user_id: str, add: bool = True):
+        '''
+        Adds or removes a user's reaction to a message, atomically with the message's reaction count.
+        Adding twice, or removing a missing reaction, changes nothing.
+
+        Returns:
+            The updated reaction count, or None if the room does not exist (anymore)
+        '''
+        return scripts.run(
+            REACT,
+            [self.key, self.reactions_key(user_id)],
+            [f"{message_id}:{emoji}", f"messages:{message_id}:reactions:{emoji}", "add" if add else "remove", now()],
+        )
+
+    def reacted(self, user_id: str) -> dict:
+        '''A user's own reactions in the room: {message_id: [emoji, ...]}'''
+        reacted = {}
+        for member in get_redis_client().smembers(self.reactions_key(user_id)):
+            message_id, emoji = member.split(":", 1)
+            reacted.setdefault(message_id, []).append(emoji)
+        return reacted
+
+    def peekers(self, card_id: str) -> list:
+        """Ids of the users currently peeking at a card."""
+        card = (self.cards or {}).get(card_id) or {}
+        peeked = card.get("peeked") or {}
+        # rooms dealt before peeks were sparse also hold "False" entries
+        return sorted(user_id for user_id, state in peeked.items() if state == "True")
+
 
 class UsersRooms(RelationMixin):
     '''
@@ -176,9 +281,22 @@ class UsersRooms(RelationMixin):
     '''
 
     FIELDS = {"role", "next", "status"}
+    LOOKUPS = {"role", "next"}  # room.users().role_of(user_id): membership & authorization checks in one HGET
+    INDEXES = {"role", "status"}  # room.users().filter(role="player"), room.users().count(status="online")
 
     L_CLASS = User
     R_CLASS = Room
 
     NAME    = "member"
     RELATION_TYPE = "many_to_many"
+    ANCHOR  = "right"  # a room's memberships live beside the room, in its cluster slot
+
+    @classmethod
+    def _unindex(cls, key: str, pipe) -> None:
+        '''
+        Also drops the member's reactions set in the room: a member leaving, a deleted room or user, take theirs
+        along - in the room's cluster slot, as the membership
+        '''
+        super()._unindex(key, pipe)
+        user_id, room_id = cls._split_key(key)
+        pipe.delete(Room.reactions_key_of(room_id, user_id))
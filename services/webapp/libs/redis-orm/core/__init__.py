@@ -7,11 +7,10 @@ and relationship handling.
 
 Example usage:
 
-    from core import ObjectMixin, RelationMixin, set_redis_client
-    import fakeredis
+    from core import ObjectMixin, RelationMixin, MemoryBackend, set_redis_client
     
-    # For testing
-    set_redis_client(fakeredis.FakeRedis(decode_responses=True))
+    # For testing - in memory, no Redis server needed
+    set_redis_client(MemoryBackend())
     
     class User(ObjectMixin):
         FIELDS = {"name", "email"}
@@ -42,6 +41,12 @@ from .mixins import (
     LeftwardsRelationManager,
 )
 
+from .batch import (
+    Batch,
+    Future,
+    batch,
+)
+
 from .exceptions import (
     RedisORMError,
     ConflictError,
@@ -52,8 +57,21 @@ from .exceptions import (
 from .connection import (
     get_redis_client,
     set_redis_client,
+    get_read_client,
+    read_scope,
+    start_read_scope,
+    get_replica_clients,
+    set_replica_clients,
+    get_client,
+    create_client,
     create_redis_client,
     reset_connection,
+    pool_options,
+    pool_stats,
+)
+
+from .backends import (
+    MemoryBackend,
 )
 
 from .utils import (
@@ -77,6 +95,11 @@ __all__ = [
     "RightwardsRelationManager",
     "LeftwardsRelationManager",
     
+    # Batches
+    "Batch",
+    "Future",
+    "batch",
+    
     # Exceptions
     "RedisORMError",
     "ConflictError",
@@ -86,8 +109,20 @@ __all__ = [
     # Connection management
     "get_redis_client",
     "set_redis_client", 
+    "get_read_client",
+    "read_scope",
+    "start_read_scope",
+    "get_replica_clients",
+    "set_replica_clients",
+    "get_client",
+    "create_client",
     "create_redis_client",
     "reset_connection",
+    "pool_options",
+    "pool_stats",
+    
+    # Storage backends
+    "MemoryBackend",
     
     # Utilities
     "new_id",
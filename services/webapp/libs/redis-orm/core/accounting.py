@@ -0,0 +1,366 @@
+"""
+Redis usage accounting, per logical scope - e.g. a web request, or a websocket event.
+
+A scope counts the commands and round trips its context sends, the bytes sent and received, and the time
+spent waiting for them:
+
+    with accounting.scope("GET /api/rooms") as usage:
+        room.to_dict(True)
+
+    usage.round_trips, usage.commands, usage.bytes_out, usage.bytes_in, usage.redis_time
+
+Redis clients count through their connections: create_redis_client() and aio.create_async_client() set up
+MeteredConnection and AsyncMeteredConnection (REDIS_ACCOUNTING=false opts out), and the memory backend counts
+by itself - the same way, bytes aside. Outside of any scope, nothing is counted. A pipeline or a script call
+is one round trip, whatever the number of commands it carries; MULTI and EXEC, which wrap transactions on
+Redis only, are not counted, and neither are the commands setting up new connections (e.g. HELLO, SELECT).
+
+Each round trip has a shape: its commands and key patterns, ids left out - e.g. "HGETALL room:*". A shape
+repeated more than REDIS_REPEAT_THRESHOLD times in a scope is most likely a loop querying Redis once per
+item (N+1 queries), where a pipeline would do: finish() logs a warning.
+"""
+
+import contextlib
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from .utils import get_logger
+
+log = get_logger(__name__)
+
+# Commands wrapping transactions, left out of the counts
+UNCOUNTED = {"MULTI", "EXEC"}
+
+# Commands whose first argument is not a key: command -> position of their key in their arguments, None if keyless
+KEY_POSITIONS = {"EVALSHA": 3, "EVAL": 3, "SCAN": None, "PING": None, "SELECT": None, "HELLO": None, "AUTH": None, "CLIENT": None}
+
+# Key segments kept as is in shapes: words, e.g. "room" or "lookup" - ids hold digits, or capitals
+_WORD = re.compile(r"[a-z][a-z-]*")
+
+# The usage of the current scope - None outside of any
+_usage: ContextVar[Optional["Usage"]] = ContextVar("redis_usage", default=None)
+
+
+def enabled() -> bool:
+    """Whether new clients count their usage (REDIS_ACCOUNTING, true by default)."""
+    return os.environ.get("REDIS_ACCOUNTING", "true").lower() in ("1", "true", "yes")
+
+
+def repeat_threshold() -> int:
+    """The number of round trips of the same shape a scope may send before a warning (REDIS_REPEAT_THRESHOLD) - 0 for none."""
+    return int(os.environ.get("REDIS_REPEAT_THRESHOLD", "10"))
+
+
+def key_pattern(key: str) -> str:
+    """A key, ids left out: room:4f2a -> room:*, member:lookup:{4f2a} -> member:lookup:{*}, reactions:room_4f2a -> reactions:room_*"""
+    segments = []
+    for segment in key.split(":"):
+        if _WORD.fullmatch(segment):
+            segments.append(segment)
+        elif segment.startswith("{"):
+            segments.append("{*}")
+        else:
+            prefix, underscore, _ = segment.partition("_")
+            segments.append(f"{prefix}_*" if underscore and _WORD.fullmatch(prefix) else "*")
+    return ":".join(segments)
+
+
+def shape(args: Iterable[Any]) -> str:
+    """The shape of a command: its name and key pattern, e.g. HGETALL room:* - or EVALSHA 3f2a9c1b room:* for scripts."""
+    args = [arg.decode() if isinstance(arg, bytes) else str(arg) for arg in args]
+    name = args[0].upper() if args else ""
+    if " " in name:
+        return name  # e.g. SCRIPT LOAD, CLIENT SETNAME
+    position = KEY_POSITIONS.get(name, 1)
+    if name in ("EVALSHA", "EVAL") and len(args) > 1:
+        name = f"{name} {args[1][:8]}"
+    if position is None or len(args) <= position:
+        return name
+    return f"{name} {key_pattern(args[position])}"
+
+
+class Usage:
+    """The Redis usage of a scope."""
+
+    __slots__ = ("name", "commands", "round_trips", "bytes_out", "bytes_in", "redis_time", "shapes", "started", "elapsed")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.commands = 0
+        self.round_trips = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.redis_time = 0.0  # seconds spent sending commands and waiting for replies
+        self.shapes: Counter = Counter()  # round trip shape -> count
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None  # seconds, once finished
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}<{self.name}: {self.commands} commands, {self.round_trips} round trips>"
+
+    def add(self, shapes: List[str], sent: int = 0) -> None:
+        """Counts a round trip, carrying commands of the given shapes."""
+        shapes = [shape for shape in shapes if shape not in UNCOUNTED]
+        if not shapes:
+            return
+        self.round_trips += 1
+        self.commands += len(shapes)
+        self.bytes_out += sent
+        self.shapes[" | ".join(dict.fromkeys(shapes))] += 1  # pipelines: their distinct shapes, in order
+
+    def repeated(self, threshold: Optional[int] = None) -> Dict[str, int]:
+        """The round trip shapes sent more than threshold (REDIS_REPEAT_THRESHOLD by default) times, and their counts."""
+        threshold = repeat_threshold() if threshold is None else threshold
+        if threshold <= 0:
+            return {}
+        return {shape: count for shape, count in self.shapes.most_common() if count > threshold}
+
+    def fields(self) -> Dict[str, Any]:
+        """The usage as log record fields (see logging's extra), prefixed with redis_."""
+        return {
+            "redis_scope": self.name,
+            "redis_commands": self.commands,
+            "redis_round_trips": self.round_trips,
+            "redis_bytes_out": self.bytes_out,
+            "redis_bytes_in": self.bytes_in,
+            "redis_time_ms": round(self.redis_time * 1000, 3),
+            "redis_elapsed_ms": round((self.elapsed or 0) * 1000, 3),
+        }
+
+    def headers(self) -> Dict[str, str]:
+        """The usage as HTTP response headers, e.g. X-Redis-Round-Trips."""
+        return {
+            "X-Redis-Commands": str(self.commands),
+            "X-Redis-Round-Trips": str(self.round_trips),
+            "X-Redis-Bytes-Out": str(self.bytes_out),
+            "X-Redis-Bytes-In": str(self.bytes_in),
+            "X-Redis-Time": f"{self.redis_time * 1000:.3f}ms",
+        }
+
+
+def current() -> Optional[Usage]:
+    """The usage of the current scope - None outside of any."""
+    return _usage.get()
+
+
+def start(name: str = "") -> Usage:
+    """Starts counting the usage of the current context, in a new scope - e.g. in a before request hook."""
+    usage = Usage(name)
+    _usage.set(usage)
+    return usage
+
+
+def finish(usage: Usage) -> Usage:
+    """
+    Ends a scope started with start(): logs its usage, with a warning for each round trip shape repeated
+    more than REDIS_REPEAT_THRESHOLD times.
+    """
+    if _usage.get() is usage:
+        _usage.set(None)
+    usage.elapsed = time.perf_counter() - usage.started
+
+    for repeated, count in usage.repeated().items():
+        log.warning(f"{usage.name}: '{repeated}' sent {count} times - N+1 queries?", extra=usage.fields())
+    log.info(
+        f"{usage.name}: {usage.commands} commands in {usage.round_trips} round trips, "
+        f"{usage.bytes_out}B out, {usage.bytes_in}B in, {usage.redis_time * 1000:.1f}ms in Redis",
+        extra=usage.fields(),
+    )
+    return usage
+
+
+def detach() -> None:
+    """Stops counting in the current context - e.g. in a long-lived task spawned within a scope, which copied it."""
+    _usage.set(None)
+
+
+@contextlib.contextmanager
+def scope(name: str = "") -> Iterator[Usage]:
+    """Counts the usage of the enclosed block - nested scopes count their own usage only."""
+    usage = Usage(name)
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+        finish(usage)
+
+
+class _MeteredSocket:
+    """A socket counting the bytes it receives in the scope of the reader."""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._sock, name)
+
+    def recv(self, *args) -> bytes:
+        data = self._sock.recv(*args)
+        usage = _usage.get()
+        if usage is not None:
+            usage.bytes_in += len(data)
+        return data
+
+    def recv_into(self, *args) -> int:
+        size = self._sock.recv_into(*args)
+        usage = _usage.get()
+        if usage is not None:
+            usage.bytes_in += size
+        return size
+
+
+class MeteredConnection(redis.Connection):
+    """A Redis connection counting its commands, round trips, bytes and time in the current scope."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shapes: List[str] = []  # of the commands about to be sent
+        self._handshake = False  # whether the connection is being set up - its commands are not counted
+
+    def _connect(self):
+        return _MeteredSocket(super()._connect())
+
+    def on_connect(self, *args, **kwargs):
+        handshake, self._handshake = self._handshake, True
+        try:
+            return super().on_connect(*args, **kwargs)
+        finally:
+            self._handshake = handshake
+
+    def on_connect_check_health(self, *args, **kwargs):  # redis-py 6+, in place of on_connect()
+        handshake, self._handshake = self._handshake, True
+        try:
+            return super().on_connect_check_health(*args, **kwargs)
+        finally:
+            self._handshake = handshake
+
+    def send_command(self, *args, **kwargs):
+        self._shapes = [shape(args)]
+        return super().send_command(*args, **kwargs)
+
+    def pack_commands(self, commands):
+        commands = list(commands)
+        packed = super().pack_commands(commands)  # which may pack each command with pack_command()
+        self._shapes = [shape(args) for args in commands]
+        return packed
+
+    def send_packed_command(self, command, check_health=True):
+        shapes, self._shapes = self._shapes, []  # health checks send their own command
+        usage = _usage.get()
+        if usage is None or self._handshake:
+            return super().send_packed_command(command, check_health)
+
+        usage.add(shapes, len(command) if isinstance(command, (str, bytes)) else sum(len(item) for item in command))
+        started = time.perf_counter()
+        try:
+            return super().send_packed_command(command, check_health)
+        finally:
+            usage.redis_time += time.perf_counter() - started
+
+    def read_response(self, *args, **kwargs):
+        usage = _usage.get()
+        if usage is None or self._handshake:
+            return super().read_response(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            usage.redis_time += time.perf_counter() - started
+
+
+class _MeteredReader:
+    """A stream reader counting the bytes it reads in the scope of the reader."""
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._reader, name)
+
+    def _count(self, data: bytes) -> bytes:
+        usage = _usage.get()
+        if usage is not None:
+            usage.bytes_in += len(data)
+        return data
+
+    async def read(self, *args) -> bytes:
+        return self._count(await self._reader.read(*args))
+
+    async def readline(self) -> bytes:
+        return self._count(await self._reader.readline())
+
+    async def readexactly(self, n: int) -> bytes:
+        return self._count(await self._reader.readexactly(n))
+
+    async def readuntil(self, *args) -> bytes:
+        return self._count(await self._reader.readuntil(*args))
+
+
+class AsyncMeteredConnection(aioredis.Connection):
+    """MeteredConnection's asyncio counterpart."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shapes: List[str] = []
+        self._handshake = False
+
+    async def _connect(self):
+        await super()._connect()
+        self._reader = _MeteredReader(self._reader)
+
+    async def on_connect(self, *args, **kwargs):
+        handshake, self._handshake = self._handshake, True
+        try:
+            return await super().on_connect(*args, **kwargs)
+        finally:
+            self._handshake = handshake
+
+    async def on_connect_check_health(self, *args, **kwargs):
+        handshake, self._handshake = self._handshake, True
+        try:
+            return await super().on_connect_check_health(*args, **kwargs)
+        finally:
+            self._handshake = handshake
+
+    def pack_command(self, *args):
+        self._shapes = [shape(args)]
+        return super().pack_command(*args)
+
+    def pack_commands(self, commands):
+        commands = list(commands)
+        packed = super().pack_commands(commands)  # which may pack each command with pack_command()
+        self._shapes = [shape(args) for args in commands]
+        return packed
+
+    async def send_packed_command(self, command, check_health=True):
+        shapes, self._shapes = self._shapes, []
+        usage = _usage.get()
+        if usage is None or self._handshake:
+            return await super().send_packed_command(command, check_health)
+
+        usage.add(shapes, len(command) if isinstance(command, (str, bytes)) else sum(len(item) for item in command))
+        started = time.perf_counter()
+        try:
+            return await super().send_packed_command(command, check_health)
+        finally:
+            usage.redis_time += time.perf_counter() - started
+
+    async def read_response(self, *args, **kwargs):
+        usage = _usage.get()
+        if usage is None or self._handshake:
+            return await super().read_response(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            return await super().read_response(*args, **kwargs)
+        finally:
+            usage.redis_time += time.perf_counter() - started
@@ -0,0 +1,212 @@
+"""
+Async access to Redis ORM models, for asyncio services (e.g. the websocket service).
+
+Loads are coalesced DataLoader style: all get_by_id() and exists() calls issued by concurrent coroutines
+within one event loop tick are deduplicated and sent in a single pipeline. Round trips scale with ticks,
+not with callers:
+
+    loader = Loader(create_async_client())
+
+    room, user = await asyncio.gather(
+        loader.get_by_id(Room, room_id),
+        loader.get_by_id(User, user_id),
+    )  # one round trip
+
+update() calls are batched the same way (each one applied atomically, see scripts.WRITE), but not
+deduplicated. Loaded objects are not cached across ticks: each tick reads fresh data. In accounting scopes
+(see accounting), a pipeline shared by concurrent scopes counts in the scope of its first request.
+
+As their sync counterparts (see connection), asyncio clients are shared per role, out of a registry:
+get_async_client("data"), get_async_client("pubsub")... with the same pool settings and statistics.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional, Tuple, Type, Union
+
+import redis.asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+
+from . import accounting, scripts
+from .connection import ROLES, cluster_enabled, pool_options, pool_usage
+from .mixins import RedisMixin, tracer
+from .utils import get_logger
+
+log = get_logger(__name__)
+
+# An object id, or the (left_id, right_id) pair of a relation
+Id = Union[str, Tuple[str, str]]
+
+# Async client registry: role -> client
+_clients: Dict[str, aioredis.Redis] = {}
+
+
+def create_async_client(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    db: Optional[int] = None,
+    decode_responses: bool = True,
+    cluster: bool = False,
+    **kwargs
+) -> Union[aioredis.Redis, RedisCluster]:
+    """
+    Create a new asyncio Redis client, on its own blocking connection pool - same configuration as
+    connection.create_redis_client(), Redis Cluster included.
+    """
+    host = host or os.environ.get("REDIS_HOST", "localhost")
+    port = port or int(os.environ.get("REDIS_PORT", "6379"))
+    db = db if db is not None else int(os.environ.get("REDIS_DATA_DB", "0"))
+
+    options = {**pool_options(), **kwargs}
+    retries = options.pop("retries", 0)
+    if retries and "retry" not in options:
+        options["retry"] = Retry(ExponentialBackoff(), retries)
+
+    if cluster:
+        options.pop("timeout", None)
+        client = RedisCluster(host=host, port=port, decode_responses=decode_responses, **options)
+        log.info(f"Async Redis Cluster client created: {host}:{port}")
+        return client
+
+    if accounting.enabled():  # asyncio cluster clients pick their own connection class: not counted
+        options.setdefault("connection_class", accounting.AsyncMeteredConnection)
+    pool = aioredis.BlockingConnectionPool(
+        host=host, port=port, db=db, decode_responses=decode_responses, **options
+    )
+    client = aioredis.Redis(connection_pool=pool)
+
+    log.info(f"Async Redis client created: {host}:{port}/{db} (max {pool.max_connections} connections)")
+    return client
+
+
+def get_async_client(role: str = "data") -> aioredis.Redis:
+    """
+    Get the shared asyncio client of a role (see connection.ROLES), created on first use.
+    Like any asyncio client, it is bound to the event loop it is first used in.
+
+    Raises:
+        ValueError: unknown role
+    """
+    client = _clients.get(role)
+    if client is None:
+        if role not in ROLES:
+            raise ValueError(f"Unknown client role '{role}': expected one of {', '.join(ROLES)}")
+        db = os.environ.get(ROLES[role])
+        client = _clients[role] = create_async_client(
+            db=int(db) if db else None, cluster=cluster_enabled(role), **pool_options(role)
+        )
+    return client
+
+
+def reset_connection() -> None:
+    """Reset the registered asyncio clients (useful for testing, as each is bound to an event loop) - each role gets a new one on next use."""
+    _clients.clear()
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """The usage of the connection pool of each registered asyncio client, by role - see connection.pool_usage()."""
+    return {
+        role: pool_usage(client.connection_pool)
+        for role, client in list(_clients.items())
+        if getattr(client, "connection_pool", None) is not None  # e.g. not cluster clients, pooled per node
+    }
+
+
+class Loader:
+    """Coalesces the loads (and updates) of concurrent coroutines, per event loop tick, into one pipeline."""
+
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+        self.round_trips = 0  # pipelines sent so far - e.g. for monitoring
+        self._pending: Dict[Tuple[str, Any], Tuple[asyncio.Future, Type[RedisMixin], Any]] = {}
+        self._write = None  # WRITE script, registered on the async client on first use
+        self._flushes = set()  # flushes in flight: the event loop only keeps weak references to its tasks
+
+    @staticmethod
+    def _key(model: Type[RedisMixin], id: Id) -> str:
+        return model._key(*id) if isinstance(id, tuple) else model._key(id)
+
+    async def get_by_id(self, model: Type[RedisMixin], id: Id) -> Optional[RedisMixin]:
+        """Loads an object (or relation) - None if missing or deleted."""
+        return await self._enqueue(("get", self._key(model, id)), model)
+
+    async def exists(self, model: Type[RedisMixin], id: Id) -> bool:
+        """Whether an object (or relation) exists and is not marked for deletion."""
+        return await self._enqueue(("exists", self._key(model, id)), model)
+
+    async def update(self, model: Type[RedisMixin], id: Id, **kwargs) -> Optional[RedisMixin]:
+        """Updates whole fields, as RedisMixin.update() - the updated object, or None if missing or deleted."""
+        operation = model._update_op(self._key(model, id), **kwargs)
+        return await self._enqueue(("update", object()), model, operation)  # writes are never deduplicated
+
+    def _enqueue(self, request: Tuple[str, Any], model: Type[RedisMixin], payload: Any = None) -> asyncio.Future:
+        """Registers a request for the next dispatch - sharing the future of an identical pending one."""
+        pending = self._pending.get(request)
+        if pending is not None:
+            return pending[0]
+
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            # requests issued until the end of the current tick join this dispatch
+            loop.call_soon(self._dispatch)
+
+        future = loop.create_future()
+        self._pending[request] = (future, model, payload)
+        return future
+
+    def _dispatch(self) -> None:
+        requests, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._flush(requests))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    @tracer.wrap("Loader.flush")
+    async def _flush(self, requests: Dict[Tuple[str, Any], Tuple[asyncio.Future, Type[RedisMixin], Any]]) -> None:
+        """Sends all requests of a tick in one pipeline, and resolves their futures."""
+        log.debug(f"Loading {len(requests)} requests in one pipeline")
+
+        if self._write is None:
+            self._write = self.client.register_script(scripts.WRITE)
+
+        sizes = []
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for (kind, key), (future, model, operation) in requests.items():
+                    if kind == "get":
+                        pipe.hgetall(key)
+                        sizes.append(1)
+                    elif kind == "exists":
+                        pipe.exists(key)
+                        pipe.hexists(key, "_deleted")
+                        sizes.append(2)
+                    else:
+                        keys, args = scripts.write_args([operation])
+                        await self._write(keys=keys, args=args, client=pipe)
+                        sizes.append(1)
+                replies = await pipe.execute(raise_on_error=False)
+            self.round_trips += 1
+        except Exception as e:
+            for future, _, _ in requests.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        position = 0
+        for ((kind, key), (future, model, operation)), size in zip(requests.items(), sizes):
+            op_replies = replies[position:position + size]
+            position += size
+            if future.done():
+                continue  # cancelled by its caller
+
+            errors = [reply for reply in op_replies if isinstance(reply, Exception)]
+            if errors:
+                future.set_exception(scripts.write_error(errors[0]) if kind == "update" else errors[0])
+            elif kind == "get":
+                future.set_result(model._from_raw(key, op_replies[0]))
+            elif kind == "exists":
+                future.set_result(bool(op_replies[0]) and not op_replies[1])
+            else:
+                raw, = scripts.write_results(op_replies[0])
+                future.set_result(model._from_raw(operation["key"], raw) if raw else None)
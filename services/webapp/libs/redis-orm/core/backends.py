@@ -0,0 +1,762 @@
+"""
+Storage backends for Redis ORM.
+
+The ORM stores everything through a client exposing the subset of the redis-py client API listed in
+INTERFACE: hashes, sets, sorted sets, scripts, pub/sub and pipelines. Two backends provide it:
+
+    - "redis": redis.Redis, talking to a Redis server (see connection.create_redis_client())
+    - "memory": MemoryBackend, an in-process store - no server, no network
+
+Pick one with connection.create_client(), or the REDIS_BACKEND environment variable ("redis" by default).
+
+The memory backend suits single-process deployments (e.g. development), tests and benchmarks - e.g. to
+profile the ORM's own overhead apart from network costs. Its data lives and dies with the process, and
+is not shared between processes: services sharing data through Redis (e.g. the web app and the
+websocket service) need the redis backend.
+
+Lua scripts cannot run in memory: each script run on the memory backend needs a Python implementation,
+registered with emulate() next to its Lua source (see scripts.py).
+
+The memory backend accounts for its commands and round trips as Redis connections do (see accounting): each
+command called directly is a round trip, and so is each pipeline - the commands scripts and pipelines run
+are not counted apart.
+"""
+
+import fnmatch
+import functools
+import hashlib
+import queue
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import redis
+from redis.commands.core import Script
+
+from . import accounting
+from .utils import get_logger
+
+log = get_logger(__name__)
+
+# The storage interface the ORM relies on: the redis-py client methods it calls, by data type
+INTERFACE = {
+    "keys": ("exists", "delete", "expire", "ttl", "type", "keys", "scan", "scan_iter", "dbsize", "flushdb"),
+    "hashes": ("hget", "hmget", "hset", "hgetall", "hkeys", "hlen", "hexists", "hdel", "hincrby"),
+    "sets": ("sadd", "srem", "smembers", "sismember", "scard", "sinter"),
+    "sorted sets": ("zadd", "zrem", "zcard", "zscore", "zrank", "zrange", "zcount", "zrangebyscore"),
+    "scripts": ("register_script", "script_load", "evalsha", "eval"),
+    "pub/sub": ("publish", "pubsub"),
+    "connection": ("ping", "pipeline"),
+}
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+SCAN_CURSORS = 100  # SCAN iterations kept open at once, see MemoryBackend.scan()
+
+# Python implementations of Lua scripts, by script SHA1 - see emulate()
+_implementations: Dict[str, Callable[["MemoryBackend", List[str], List[str]], Any]] = {}
+
+
+def sha1(source: str) -> str:
+    """The SHA1 a script is run by (EVALSHA)."""
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def emulate(source: str) -> Callable:
+    """
+    Registers the Python implementation of a Lua script, run in its place by the memory backend.
+
+    The implementation is called as function(backend, keys, args), atomically (with the backend locked),
+    keys and args being strings as in Lua's KEYS and ARGV. It calls the backend's methods where the script
+    calls redis.call(), raises redis.ResponseError where it returns redis.error_reply(), and returns what
+    the script does - False standing for Lua's false (nil reply), True for Lua's true (1).
+
+    Args:
+        source: the Lua source of the script
+    """
+    def decorator(function):
+        _implementations[sha1(source)] = function
+        return function
+    return decorator
+
+
+def encode(value: Any) -> str:
+    """Converts a command argument to a string, as redis-py does before sending it."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise redis.DataError(
+            f"Invalid input of type: '{type(value).__name__}'. Convert to a bytes, string, int or float first."
+        )
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _list_or_args(keys: Union[str, List[str]], args: Tuple) -> List[str]:
+    """Arguments passed either as a list, or as positional arguments - as redis-py accepts them."""
+    if isinstance(keys, (str, bytes)):
+        keys = [keys]
+    return [encode(key) for key in [*keys, *args]]
+
+
+def _reply(value: Any) -> Any:
+    """Converts a script implementation's return value the way Redis converts Lua values to replies."""
+    if value is True:
+        return 1
+    if value is False or value is None:
+        return None
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return [_reply(item) for item in value]
+    return value
+
+
+def _monotonic() -> float:
+    return time.monotonic()  # a module function: MemoryBackend.expire()'s time argument shadows the time module
+
+
+def command(method: Callable) -> Callable:
+    """
+    Marks a MemoryBackend method as a command - run with the backend locked, and queueable in pipelines.
+    Called directly, within an accounting scope, it counts as a round trip.
+    """
+    name = method.__name__.upper()
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            usage = accounting.current()
+            if usage is None or self._running:  # or run by a script or a pipeline, accounted for as a whole
+                return method(self, *args, **kwargs)
+            return self._run(usage, [accounting.shape((name, *args))], method, self, *args, **kwargs)
+    wrapper.command = True
+    return wrapper
+
+
+def _score_bound(bound: Union[float, str]) -> Tuple[float, bool]:
+    """A sorted set score bound, as (score, exclusive)."""
+    bound = str(bound)
+    if bound.startswith("("):
+        return float(bound[1:]), True
+    return float(bound), False
+
+
+class SortedSet:
+    """Members and their scores, kept in (score, member) order."""
+
+    __slots__ = ("scores", "order")
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.order: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, member: str, score: float) -> None:
+        if member in self.scores:
+            self.remove(member)
+        self.scores[member] = score
+        insort(self.order, (score, member))
+
+    def remove(self, member: str) -> None:
+        score = self.scores.pop(member)
+        del self.order[bisect_left(self.order, (score, member))]
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self.scores.get(member)
+        return None if score is None else bisect_left(self.order, (score, member))
+
+
+class MemoryScript(Script):
+    """A script registered on the memory backend - runnable on any client, as redis-py's."""
+
+    def __init__(self, registered_client: "MemoryBackend", script: str):
+        self.registered_client = registered_client
+        self.script = script
+        self.sha = sha1(script)
+
+
+class MemoryBackend:
+    """
+    In-process, thread-safe implementation of the ORM's storage interface (see INTERFACE), with the
+    semantics of a Redis client decoding responses: keys, fields and values are strings.
+
+    Commands run one at a time (the backend is locked while each runs), and so do pipelines and scripts,
+    as a whole - which makes them atomic, as on a Redis server.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Union[Dict[str, str], Set[str], SortedSet]] = {}
+        self._expires: Dict[str, float] = {}  # key -> monotonic deadline
+        self._cursors: Dict[int, Tuple[List[str], int]] = {}  # SCAN cursor -> (sorted keys, position in them)
+        self._next_cursor = 1
+        self._subscribers: Dict[str, Set["MemoryPubSub"]] = defaultdict(set)
+        self._running = False  # whether a command, script or pipeline is running - see command()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}<{len(self._data)} keys>"
+
+    # Internals - called with the backend locked
+
+    def _run(self, usage: "accounting.Usage", shapes: List[str], function: Callable, *args, **kwargs) -> Any:
+        """Runs a round trip - a command, or a pipeline - accounting for it in usage."""
+        usage.add(shapes)
+        started = time.perf_counter()
+        self._running = True
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._running = False
+            usage.redis_time += time.perf_counter() - started
+
+    def _live(self, key: str) -> bool:
+        """Whether a key exists, deleting it first if it expired."""
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= _monotonic():
+            del self._data[key]
+            del self._expires[key]
+        return key in self._data
+
+    def _get(self, key: str, kind: type) -> Any:
+        """The value of a key, None if missing. Raises ResponseError if the key holds another type."""
+        key = encode(key)
+        if not self._live(key):
+            return None
+        value = self._data[key]
+        if type(value) is not kind:
+            raise redis.ResponseError(WRONGTYPE)
+        return value
+
+    def _get_or_create(self, key: str, kind: type) -> Any:
+        value = self._get(key, kind)
+        if value is None:
+            value = self._data[encode(key)] = kind()
+        return value
+
+    def _discard_if_empty(self, key: str, value: Any) -> None:
+        """Empty hashes, sets and sorted sets do not exist in Redis."""
+        if not value:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def _all_keys(self) -> List[str]:
+        return [key for key in list(self._data) if self._live(key)]
+
+    # Keys
+
+    @command
+    def ping(self) -> bool:
+        return True
+
+    @command
+    def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._live(encode(name)))
+
+    @command
+    def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            name = encode(name)
+            if self._live(name):
+                del self._data[name]
+                self._expires.pop(name, None)
+                deleted += 1
+        return deleted
+
+    @command
+    def expire(self, name: str, time: Union[int, timedelta]) -> bool:
+        name = encode(name)
+        if not self._live(name):
+            return False
+        seconds = time.total_seconds() if isinstance(time, timedelta) else int(time)
+        if seconds <= 0:
+            self.delete(name)
+        else:
+            self._expires[name] = _monotonic() + seconds
+        return True
+
+    @command
+    def ttl(self, name: str) -> int:
+        name = encode(name)
+        if not self._live(name):
+            return -2
+        deadline = self._expires.get(name)
+        return -1 if deadline is None else max(0, round(deadline - _monotonic()))
+
+    @command
+    def type(self, name: str) -> str:
+        name = encode(name)
+        if not self._live(name):
+            return "none"
+        return {dict: "hash", set: "set", SortedSet: "zset"}[type(self._data[name])]
+
+    @command
+    def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in self._all_keys() if fnmatch.fnmatchcase(key, pattern)]
+
+    @command
+    def scan(
+        self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None, _type: Optional[str] = None
+    ) -> Tuple[int, List[str]]:
+        """
+        Iterates over keys in lexicographic order, count keys (10 by default) at a time. As with Redis,
+        every key existing from the start to the end of the iteration is returned exactly once.
+
+        Keys are sorted once per iteration, into a snapshot each page is sliced out of - keys created meanwhile are
+        not returned. At most SCAN_CURSORS iterations are kept open: the least recently used are dropped beyond.
+        """
+        cursor = int(cursor)
+        if cursor:
+            iteration = self._cursors.pop(cursor, None)
+            if iteration is None:
+                return 0, []  # unknown cursor: as Redis, end the iteration
+            snapshot, position = iteration
+        else:
+            snapshot, position = sorted(self._all_keys()), 0
+
+        end = position + (count or 10)
+        keys = [
+            key for key in snapshot[position:end]
+            if self._live(key)
+            and (match is None or fnmatch.fnmatchcase(key, match)) and (_type is None or self.type(key) == _type)
+        ]
+        if end >= len(snapshot):
+            return 0, keys
+
+        cursor = self._next_cursor
+        self._next_cursor += 1
+        self._cursors[cursor] = (snapshot, end)
+        while len(self._cursors) > SCAN_CURSORS:
+            del self._cursors[next(iter(self._cursors))]
+        return cursor, keys
+
+    def scan_iter(
+        self, match: Optional[str] = None, count: Optional[int] = None, _type: Optional[str] = None
+    ) -> Iterator[str]:
+        cursor = None
+        while cursor != 0:
+            cursor, keys = self.scan(cursor=cursor or 0, match=match, count=count, _type=_type)
+            yield from keys
+
+    @command
+    def dbsize(self) -> int:
+        return len(self._all_keys())
+
+    @command
+    def flushdb(self, asynchronous: bool = False) -> bool:
+        self._data.clear()
+        self._expires.clear()
+        self._cursors.clear()
+        return True
+
+    flushall = flushdb
+
+    @command
+    def info(self, section: Optional[str] = None) -> Dict[str, Any]:
+        """A few of Redis' INFO fields - used_memory being a rough estimate of the size of the data."""
+        used_memory = 0
+        for key in self._all_keys():
+            value = self._data[key]
+            items = value.items() if isinstance(value, dict) else value.scores.items() if isinstance(value, SortedSet) \
+                else ((member, "") for member in value)
+            used_memory += len(key) + sum(len(k) + len(str(v)) for k, v in items)
+        return {"redis_version": redis.__version__, "redis_mode": "memory", "used_memory": used_memory}
+
+    # Hashes
+
+    @command
+    def hget(self, name: str, key: str) -> Optional[str]:
+        value = self._get(name, dict)
+        return None if value is None else value.get(encode(key))
+
+    @command
+    def hmget(self, name: str, keys: Union[str, List[str]], *args: str) -> List[Optional[str]]:
+        value = self._get(name, dict) or {}
+        return [value.get(key) for key in _list_or_args(keys, args)]
+
+    @command
+    def hset(
+        self,
+        name: str,
+        key: Optional[str] = None,
+        value: Optional[Any] = None,
+        mapping: Optional[Dict[str, Any]] = None,
+        items: Optional[List[Any]] = None,
+    ) -> int:
+        if key is None and not mapping and not items:
+            raise redis.DataError("'hset' with no key value pairs")
+        pairs = []
+        if key is not None:
+            pairs.append((key, value))
+        if items:
+            pairs.extend(zip(items[::2], items[1::2]))
+        if mapping:
+            pairs.extend(mapping.items())
+        pairs = [(encode(k), encode(v)) for k, v in pairs]
+
+        hash = self._get_or_create(name, dict)
+        added = sum(1 for k, _ in pairs if k not in hash)
+        hash.update(pairs)
+        return added
+
+    @command
+    def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._get(name, dict) or {})
+
+    @command
+    def hkeys(self, name: str) -> List[str]:
+        return list(self._get(name, dict) or {})
+
+    @command
+    def hlen(self, name: str) -> int:
+        return len(self._get(name, dict) or {})
+
+    @command
+    def hexists(self, name: str, key: str) -> bool:
+        return encode(key) in (self._get(name, dict) or {})
+
+    @command
+    def hdel(self, name: str, *keys: str) -> int:
+        hash = self._get(name, dict)
+        if hash is None:
+            return 0
+        deleted = sum(1 for key in keys if hash.pop(encode(key), None) is not None)
+        self._discard_if_empty(encode(name), hash)
+        return deleted
+
+    @command
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        hash = self._get_or_create(name, dict)
+        key = encode(key)
+        try:
+            value = int(hash.get(key, "0")) + int(amount)
+        except ValueError:
+            raise redis.ResponseError("ERR hash value is not an integer")
+        hash[key] = str(value)
+        return value
+
+    # Sets
+
+    @command
+    def sadd(self, name: str, *values: str) -> int:
+        members = self._get_or_create(name, set)
+        values = {encode(value) for value in values}
+        added = len(values - members)
+        members |= values
+        return added
+
+    @command
+    def srem(self, name: str, *values: str) -> int:
+        members = self._get(name, set)
+        if members is None:
+            return 0
+        values = {encode(value) for value in values}
+        removed = len(values & members)
+        members -= values
+        self._discard_if_empty(encode(name), members)
+        return removed
+
+    @command
+    def smembers(self, name: str) -> Set[str]:
+        return set(self._get(name, set) or ())
+
+    @command
+    def sismember(self, name: str, value: str) -> bool:
+        return encode(value) in (self._get(name, set) or ())
+
+    @command
+    def scard(self, name: str) -> int:
+        return len(self._get(name, set) or ())
+
+    @command
+    def sinter(self, keys: Union[str, List[str]], *args: str) -> Set[str]:
+        sets = [self._get(key, set) or set() for key in _list_or_args(keys, args)]
+        return set.intersection(*sets) if sets else set()
+
+    # Sorted sets
+
+    @command
+    def zadd(
+        self, name: str, mapping: Dict[str, float], nx: bool = False, xx: bool = False, ch: bool = False
+    ) -> int:
+        if nx and xx:
+            raise redis.DataError("ZADD allows either 'nx' or 'xx', not both")
+        zset = self._get_or_create(name, SortedSet)
+        changed = added = 0
+        for member, score in mapping.items():
+            member, score = encode(member), float(score)
+            current = zset.scores.get(member)
+            if (nx and current is not None) or (xx and current is None) or current == score:
+                continue
+            zset.add(member, score)
+            added += current is None
+            changed += 1
+        self._discard_if_empty(encode(name), zset)
+        return changed if ch else added
+
+    @command
+    def zrem(self, name: str, *values: str) -> int:
+        zset = self._get(name, SortedSet)
+        if zset is None:
+            return 0
+        removed = 0
+        for value in values:
+            if encode(value) in zset.scores:
+                zset.remove(encode(value))
+                removed += 1
+        self._discard_if_empty(encode(name), zset)
+        return removed
+
+    @command
+    def zcard(self, name: str) -> int:
+        return len(self._get(name, SortedSet) or ())
+
+    @command
+    def zscore(self, name: str, value: str) -> Optional[float]:
+        zset = self._get(name, SortedSet)
+        return None if zset is None else zset.scores.get(encode(value))
+
+    @command
+    def zrank(self, name: str, value: str) -> Optional[int]:
+        zset = self._get(name, SortedSet)
+        return None if zset is None else zset.rank(encode(value))
+
+    @command
+    def zrange(
+        self, name: str, start: int, end: int, desc: bool = False, withscores: bool = False,
+        score_cast_func: Callable = float,
+    ) -> List[Any]:
+        zset = self._get(name, SortedSet)
+        if zset is None:
+            return []
+        order = zset.order[::-1] if desc else zset.order
+        length = len(order)
+        start, end = int(start), int(end)
+        start = max(start + length if start < 0 else start, 0)
+        end = end + length if end < 0 else min(end, length - 1)
+        page = order[start:end + 1] if start <= end else []
+        if withscores:
+            return [(member, score_cast_func(score)) for score, member in page]
+        return [member for _, member in page]
+
+    @command
+    def zcount(self, name: str, min: Union[float, str], max: Union[float, str]) -> int:
+        return len(self._by_score(name, min, max))
+
+    @command
+    def zrangebyscore(
+        self, name: str, min: Union[float, str], max: Union[float, str], start: Optional[int] = None,
+        num: Optional[int] = None, withscores: bool = False, score_cast_func: Callable = float,
+    ) -> List[Any]:
+        page = self._by_score(name, min, max)
+        if start is not None and num is not None:
+            page = page[start:start + num] if num >= 0 else page[start:]
+        if withscores:
+            return [(member, score_cast_func(score)) for score, member in page]
+        return [member for _, member in page]
+
+    def _by_score(self, name: str, min: Union[float, str], max: Union[float, str]) -> List[Tuple[float, str]]:
+        """The (score, member) pairs of a sorted set within score bounds - e.g. 5, "-inf", or "(5" (exclusive)."""
+        zset = self._get(name, SortedSet)
+        if zset is None:
+            return []
+        (low, above), (high, below) = _score_bound(min), _score_bound(max)
+        return [
+            (score, member) for score, member in zset.order
+            if (score > low if above else score >= low) and (score < high if below else score <= high)
+        ]
+
+    # Scripts
+
+    def register_script(self, script: str) -> MemoryScript:
+        return MemoryScript(self, script)
+
+    @command
+    def script_load(self, script: str) -> str:
+        sha = sha1(script)
+        if sha not in _implementations:
+            raise redis.ResponseError(
+                f"Script {sha} has no Python implementation, required by the memory backend - see backends.emulate()"
+            )
+        return sha
+
+    @command
+    def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        implementation = _implementations.get(sha)
+        if implementation is None:
+            raise redis.exceptions.NoScriptError("No matching script. Please use EVAL.")
+        keys_and_args = [encode(arg) for arg in keys_and_args]
+        numkeys = int(numkeys)
+        return _reply(implementation(self, keys_and_args[:numkeys], keys_and_args[numkeys:]))
+
+    def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        return self.evalsha(self.script_load(script), numkeys, *keys_and_args)
+
+    # Pub/sub
+
+    @command
+    def publish(self, channel: str, message: str) -> int:
+        channel = encode(channel)
+        subscribers = self._subscribers.get(channel, ())
+        for subscriber in subscribers:
+            subscriber._deliver({"type": "message", "pattern": None, "channel": channel, "data": encode(message)})
+        return len(subscribers)
+
+    def pubsub(self, **kwargs) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+    # Connection
+
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> "MemoryPipeline":
+        return MemoryPipeline(self, transaction)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryPipeline:
+    """
+    Queues commands, run at once on execute() - as a whole, with the backend locked.
+    Like redis-py's, replies are returned in order, and errors raised after every command ran.
+    """
+
+    def __init__(self, backend: MemoryBackend, transaction: bool = True):
+        self.backend = backend
+        self.transaction = transaction
+        self.command_stack: List[Tuple[Callable, tuple, dict]] = []
+
+    def __getattr__(self, name: str) -> Callable:
+        method = getattr(self.backend, name)
+        if not getattr(method, "command", False):
+            raise AttributeError(f"'{self.__class__.__name__}' cannot queue '{name}'")
+
+        def queue_command(*args, **kwargs) -> "MemoryPipeline":
+            self.command_stack.append((method, args, kwargs))
+            return self
+
+        return queue_command
+
+    def __enter__(self) -> "MemoryPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def __bool__(self) -> bool:
+        return True  # even when empty, as redis-py's: "client or default" idioms must keep the pipeline
+
+    def multi(self) -> None:
+        pass  # pipelines run as a whole anyway
+
+    def watch(self, *names: str) -> None:
+        pass  # nothing can change a watched key while the pipeline runs
+
+    def reset(self) -> None:
+        self.command_stack = []
+
+    def register_script(self, script: str) -> MemoryScript:
+        return self.backend.register_script(script)
+
+    def script_load(self, script: str) -> str:
+        return self.backend.script_load(script)  # immediate, as redis-py's: scripts are loaded before they are queued
+
+    def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> "MemoryPipeline":
+        if sha not in _implementations:
+            raise redis.exceptions.NoScriptError("No matching script. Please use EVAL.")
+        self.command_stack.append((self.backend.evalsha, (sha, numkeys, *keys_and_args), {}))
+        return self
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        stack, self.command_stack = self.command_stack, []
+        replies = []
+        with self.backend._lock:
+            usage = accounting.current()
+            if usage is None or self.backend._running or not stack:
+                self._run(stack, replies)
+            else:
+                shapes = [accounting.shape((method.__name__.upper(), *args)) for method, args, _ in stack]
+                self.backend._run(usage, shapes, self._run, stack, replies)
+
+        if raise_on_error:
+            for reply in replies:
+                if isinstance(reply, redis.ResponseError):
+                    raise reply
+        return replies
+
+    @staticmethod
+    def _run(stack: List[Tuple[Callable, tuple, dict]], replies: List[Any]) -> None:
+        for method, args, kwargs in stack:
+            try:
+                replies.append(method(*args, **kwargs))
+            except redis.ResponseError as e:
+                replies.append(e)
+
+
+class MemoryPubSub:
+    """Subscriptions to memory backend channels - a subset of redis-py's PubSub."""
+
+    def __init__(self, backend: MemoryBackend):
+        self.backend = backend
+        self.channels: Set[str] = set()
+        self._messages: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def __enter__(self) -> "MemoryPubSub":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels)
+
+    def _deliver(self, message: Dict[str, Any]) -> None:
+        self._messages.put(message)
+
+    def subscribe(self, *channels: str) -> None:
+        with self.backend._lock:
+            for channel in map(encode, channels):
+                self.backend._subscribers[channel].add(self)
+                self.channels.add(channel)
+                self._deliver({"type": "subscribe", "pattern": None, "channel": channel, "data": len(self.channels)})
+
+    def unsubscribe(self, *channels: str) -> None:
+        with self.backend._lock:
+            for channel in list(map(encode, channels)) or list(self.channels):
+                self.backend._subscribers[channel].discard(self)
+                self.channels.discard(channel)
+                self._deliver({"type": "unsubscribe", "pattern": None, "channel": channel, "data": len(self.channels)})
+
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[Dict[str, Any]]:
+        """The next message, waiting up to timeout seconds for one - None if there is none."""
+        deadline = _monotonic() + (timeout or 0.0)
+        while True:
+            try:
+                remaining = deadline - _monotonic()
+                message = self._messages.get(timeout=remaining) if remaining > 0 else self._messages.get_nowait()
+            except queue.Empty:
+                return None
+            if not (ignore_subscribe_messages and message["type"] != "message"):
+                return message
+
+    def listen(self) -> Iterator[Dict[str, Any]]:
+        while self.channels:
+            yield self._messages.get()
+
+    def close(self) -> None:
+        if self.channels:
+            self.unsubscribe()
+
+    reset = close
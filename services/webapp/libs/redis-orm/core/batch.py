@@ -0,0 +1,217 @@
+"""
+Batches of independent ORM operations, sent in a single round trip.
+
+    with batch() as b:
+        room = b.get_by_id(Room, room_id)
+        member = b.exists(UsersRooms, (user_id, room_id))
+    room.result(), member.result()
+
+Operations are queued on a (non-transactional) pipeline, in order, and each returns a Future, resolved
+once the with block exits - that's when the pipeline is executed. Nothing is sent if the block raises.
+
+Read-then-write: results are not available within the block, so a write cannot depend on a read of
+the same batch. Either:
+    - read in a first batch, decide, then write in a second one (two round trips instead of one per call),
+      keeping in mind the state may change in between, or
+    - rely on the guards writes check atomically, on the server: patch() and update() skip missing or
+      deleted objects, add() fails if the relation exists or if any of its objects is missing.
+Reads queued after a write of the same batch do see the write, as the pipeline runs in order.
+Each write is atomic on its own, the batch as a whole is not.
+"""
+
+from typing import Any, Callable, List, Optional, Tuple, Type, Union
+
+from . import scripts
+from .connection import get_redis_client
+from .mixins import RedisMixin, RelationManager, tracer
+from .utils import get_logger
+
+log = get_logger(__name__)
+
+# An object id, or the (left_id, right_id) pair of a relation
+Id = Union[str, Tuple[str, str]]
+
+
+class Future:
+    """The deferred result of an operation queued in a Batch - available once the batch is executed."""
+
+    __slots__ = ("_value", "_error", "_done")
+
+    def __init__(self):
+        self._value = None
+        self._error = None
+        self._done = False
+
+    def done(self) -> bool:
+        """Whether the batch holding the operation was executed."""
+        return self._done
+
+    def result(self) -> Any:
+        """
+        The result of the operation.
+
+        Raises:
+            RuntimeError: the batch was not executed (yet)
+            the operation's error, if it failed - e.g. ConflictError
+        """
+        if not self._done:
+            raise RuntimeError("Batch not executed yet: results are available once the with block exits.")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class Batch:
+    """Queues ORM operations into a single pipeline - see batch()."""
+
+    def __init__(self, client=None):
+        self.client = client or get_redis_client()
+        self.pipe = self.client.pipeline(transaction=False)
+        self._queue: List[Tuple[Future, int, Callable[[List[Any]], Any], bool]] = []
+
+    def __enter__(self) -> "Batch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.pipe.reset()
+            return
+        self.execute()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _queue_op(self, size: int, resolve: Callable[[List[Any]], Any], script: bool = False) -> Future:
+        """Registers an operation spanning the last size pipeline commands, resolved out of their replies."""
+        future = Future()
+        self._queue.append((future, size, resolve, script))
+        return future
+
+    @staticmethod
+    def _key(model: Type[RedisMixin], id: Id) -> str:
+        return model._key(*id) if isinstance(id, tuple) else model._key(id)
+
+    @tracer.wrap("Batch.execute")
+    def execute(self) -> None:
+        """
+        Sends all queued operations in one round trip, and resolves their futures.
+        Called on exit of the with block.
+
+        Raises:
+            The first error of the operations, once all futures are resolved
+        """
+        if not self._queue:
+            return
+
+        log.info(f"Executing a batch of {len(self._queue)} operations")
+        replies = self.pipe.execute(raise_on_error=False)
+
+        first_error = None
+        position = 0
+        for future, size, resolve, script in self._queue:
+            op_replies = replies[position:position + size]
+            position += size
+
+            errors = [reply for reply in op_replies if isinstance(reply, Exception)]
+            if errors:
+                future._error = scripts.write_error(errors[0]) if script else errors[0]
+                first_error = first_error or future._error
+            else:
+                try:
+                    future._value = resolve(op_replies)
+                except Exception as e:
+                    future._error = e
+                    first_error = first_error or e
+            future._done = True
+
+        self._queue = []
+
+        if first_error is not None:
+            raise first_error
+
+    # Reads
+
+    def get_by_id(self, model: Type[RedisMixin], id: Id) -> Future:
+        """Queues the retrieval of an object (or relation) - resolved to None if missing or deleted."""
+        key = self._key(model, id)
+        self.pipe.hgetall(key)
+        return self._queue_op(1, lambda replies: model._from_raw(key, replies[0]))
+
+    def exists(self, model: Type[RedisMixin], id: Id) -> Future:
+        """Queues an existence check of an object (or relation) - resolved to False if missing or deleted."""
+        key = self._key(model, id)
+        self.pipe.exists(key)
+        self.pipe.hexists(key, "_deleted")
+        return self._queue_op(2, lambda replies: bool(replies[0]) and not replies[1])
+
+    # Writes
+
+    def _write(self, operations: List[dict], resolve: Callable[[List[Optional[dict]]], Any]) -> Future:
+        """Queues write operations, applied atomically through the WRITE script - resolved out of their results."""
+        self._queue_script(operations)
+        return self._queue_op(1, lambda replies: resolve(scripts.write_results(replies[0])), script=True)
+
+    def _queue_script(self, operations: List[dict]) -> None:
+        keys, args = scripts.write_args(operations)
+        scripts.run(scripts.WRITE, keys, args, client=self.pipe)
+
+    def patch(self, model: Type[RedisMixin], id: Id, field: str, value: Any) -> Future:
+        """
+        Queues an upsert of a single (sub)field - unlike RedisMixin.patch(), the field needs not exist.
+        Resolved to whether the object was patched: missing or deleted objects are skipped.
+        """
+        operation = model._patch_op(self._key(model, id), field, value)
+        return self._write([operation], lambda results: results[0] is not None)
+
+    def update(self, model: Type[RedisMixin], id: Id, **kwargs) -> Future:
+        """Queues an update of whole fields - resolved to the updated object, or None if missing or deleted."""
+        key = self._key(model, id)
+        operation = model._update_op(key, **kwargs)
+        return self._write([operation], lambda results: model._from_raw(key, results[0]) if results[0] else None)
+
+    def add(self, manager: RelationManager, related_id: str, **data) -> Future:
+        """
+        Queues the creation of a relation, as manager.add() - resolved to the relation.
+        The relation must not exist yet (ConflictError), and both objects must (ValueError).
+        """
+        relation_class = manager.relation_class
+        key = manager.relation_key(related_id)
+        operation = relation_class._create_op(key, **data)
+        return self._write([operation], lambda results: relation_class._from_raw(key, results[0]))
+
+    def set(self, manager: RelationManager, related_id: str, **kwargs) -> Future:
+        """
+        Queues an update of a relation and the retrieval of the related object, as manager.set() -
+        resolved to (related object, relation), or (None, None) if the relation is missing or deleted.
+        """
+        relation_class, related_class = manager.relation_class, manager.related_class
+        key = manager.relation_key(related_id)
+        related_key = related_class._key(related_id)
+
+        self._queue_script([relation_class._update_op(key, **kwargs)])
+        self.pipe.hgetall(related_key)
+
+        def resolve(replies: List[Any]) -> Tuple[Optional[RedisMixin], Optional[RedisMixin]]:
+            raw, = scripts.write_results(replies[0])
+            if raw is None:
+                return None, None
+            return related_class._from_raw(related_key, replies[1]), relation_class._from_raw(key, raw)
+
+        return self._queue_op(2, resolve, script=True)
+
+    # Messaging
+
+    def publish(self, channel: str, message: str) -> Future:
+        """Queues a pub/sub message - resolved to the number of subscribers which received it."""
+        self.pipe.publish(channel, message)
+        return self._queue_op(1, lambda replies: replies[0])
+
+
+def batch(client=None) -> Batch:
+    """
+    Groups independent ORM operations into one round trip - see this module.
+
+    Args:
+        client: Redis client to send the batch with (defaults to the global client)
+    """
+    return Batch(client)
@@ -0,0 +1,190 @@
+"""
+Typed field codecs for Redis ORM models.
+
+Hash fields are strings in Redis. Codecs convert field values to a compact string on save, and back
+to their Python type on load, once, within the ORM. They are declared on FIELDS:
+
+    class Player(ObjectMixin):
+        FIELDS = {
+            "name": str,                           # as is (same as a FIELDS set entry)
+            "round": dict,                         # as is, flattened into subfields
+            "score": int,                          # shorthand for Integer()
+            "joined": Timestamp(),
+            "settings": Json(),                    # stored as a single hash field
+            "cards": {"*": {"flipped": bool}},     # nested subfields - "*" matches any key
+        }
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+from .exceptions import ValidationError
+
+# Optional msgpack support
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    msgpack = None
+    HAS_MSGPACK = False
+
+
+class Codec:
+    """Converts a field value to its Redis string representation, and back."""
+
+    def encode(self, value: Any) -> str:
+        raise TypeError("Codec.encode() is abstract. Call subclass' instead.")
+
+    def decode(self, raw: str) -> Any:
+        raise TypeError("Codec.decode() is abstract. Call subclass' instead.")
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+class Integer(Codec):
+    """Integers, stored in base 10."""
+
+    def encode(self, value: Any) -> str:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValidationError(f"Integer field expects an int, got {type(value).__name__}: {value!r}")
+        try:
+            return str(int(value))
+        except ValueError:
+            raise ValidationError(f"Integer field expects an int, got {value!r}")
+
+    def decode(self, raw: str) -> int:
+        return int(raw)
+
+
+class Float(Codec):
+    """Floats, stored with their shortest round-tripping representation."""
+
+    def encode(self, value: Any) -> str:
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValidationError(f"Float field expects a float, got {type(value).__name__}: {value!r}")
+        try:
+            return repr(float(value))
+        except ValueError:
+            raise ValidationError(f"Float field expects a float, got {value!r}")
+
+    def decode(self, raw: str) -> float:
+        return float(raw)
+
+
+class Boolean(Codec):
+    """Booleans, stored as "1"/"0". Also reads the legacy "True"/"False" strings."""
+
+    TRUE = {"1", "True", "true"}
+    FALSE = {"0", "False", "false"}
+
+    def encode(self, value: Any) -> str:
+        if isinstance(value, bool):
+            return "1" if value else "0"
+        if value in self.TRUE:
+            return "1"
+        if value in self.FALSE:
+            return "0"
+        raise ValidationError(f"Boolean field expects a bool, got {value!r}")
+
+    def decode(self, raw: str) -> bool:
+        if raw in self.TRUE:
+            return True
+        if raw in self.FALSE:
+            return False
+        raise ValueError(f"not a boolean: {raw!r}")
+
+
+class Json(Codec):
+    """Any JSON-serializable value, stored as a single compact JSON hash field (i.e. not flattened)."""
+
+    def encode(self, value: Any) -> str:
+        try:
+            return json.dumps(value, separators=(",", ":"))
+        except TypeError as e:
+            raise ValidationError(f"Json field expects a JSON-serializable value: {e}")
+
+    def decode(self, raw: str) -> Any:
+        return json.loads(raw)
+
+
+class Msgpack(Codec):
+    """
+    Any msgpack-serializable value, stored as a single hash field. Requires the msgpack package.
+    Redis clients decode responses as text, hence the base85 armor - still more compact than JSON
+    for number-heavy payloads.
+    """
+
+    def __init__(self):
+        if not HAS_MSGPACK:
+            raise ImportError("Msgpack codec requires the msgpack package: pip install msgpack")
+
+    def encode(self, value: Any) -> str:
+        try:
+            return base64.b85encode(msgpack.packb(value, use_bin_type=True)).decode()
+        except TypeError as e:
+            raise ValidationError(f"Msgpack field expects a msgpack-serializable value: {e}")
+
+    def decode(self, raw: str) -> Any:
+        return msgpack.unpackb(base64.b85decode(raw), raw=False)
+
+
+class Timestamp(Codec):
+    """
+    ISO 8601 timestamps (see utils.now()), stored as epoch seconds - half their size.
+    Also reads timestamps stored in ISO 8601.
+    """
+
+    FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+    def encode(self, value: Any) -> str:
+        if isinstance(value, datetime):
+            return str(int(value.timestamp()))
+        if isinstance(value, str):
+            try:
+                return str(int(datetime.strptime(value, self.FORMAT).replace(tzinfo=timezone.utc).timestamp()))
+            except ValueError:
+                pass
+        raise ValidationError(f"Timestamp field expects a datetime or a {self.FORMAT} string, got {value!r}")
+
+    def decode(self, raw: str) -> str:
+        if not raw.isdigit():
+            return raw  # already ISO 8601
+        return datetime.fromtimestamp(int(raw), timezone.utc).strftime(self.FORMAT)
+
+
+# FIELDS shorthands
+TYPES = {int: Integer, float: Float, bool: Boolean}
+
+# A FIELDS declaration: None, str or dict (as is), a type shorthand, a Codec, or a {subfield: declaration} dict
+Declaration = Union[None, type, Codec, Dict[str, Any]]
+
+
+def compile_codec(declaration: Declaration) -> Union[None, Codec, Dict[str, Any]]:
+    """
+    Compiles a FIELDS declaration into a Codec, a {subfield: compiled} tree for nested fields,
+    or None when values are stored as is.
+    """
+    if declaration is None or declaration is str or declaration is dict:
+        return None
+    if isinstance(declaration, Codec):
+        return declaration
+    if isinstance(declaration, dict):
+        tree = {k: compile_codec(v) for k, v in declaration.items()}
+        tree = {k: v for k, v in tree.items() if v is not None}
+        return tree or None
+    if declaration in TYPES:
+        return TYPES[declaration]()
+    raise TypeError(f"Invalid field declaration: {declaration!r}")
+
+
+def resolve(tree: Dict[str, Any], field: str, path: tuple) -> Optional[Codec]:
+    """Finds the codec of a flattened key, given its field's compiled tree and the key's remaining parts."""
+    node = tree.get(field)
+    for part in path:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part, node.get("*"))
+    return node if isinstance(node, Codec) else None
@@ -1,32 +1,267 @@
 """
 Redis connection management for Redis ORM.
-Supports both real Redis and fakeredis for testing.
+Supports both real Redis and fakeredis for testing, as well as the in-process memory backend (see backends).
+
+Services share one client per role - see ROLES - out of a process-wide registry:
+
+    get_client("data")    # the ORM's, also returned by get_redis_client()
+    get_client("pubsub")  # room events
+
+Each client has its own blocking connection pool, bounded by max_connections: once all connections are in
+use, callers wait for one to be released (up to the pool timeout) instead of opening more. Pool settings
+come from the environment (see pool_options()), and pool usage is reported by pool_stats().
+
+The ORM reads from read replicas (REDIS_REPLICAS) when it can - see get_read_client(): a context which wrote
+to the primary reads from the primary, so that it reads its own writes, until the end of its read_scope().
+
+With REDIS_CLUSTER set, the data and cache roles get Redis Cluster clients instead, routing each command to the
+node owning its keys' slot - see create_redis_client(). Clusters require the "tagged" key layout (see key_layout()),
+which keeps the keys written together by one script in one slot.
 """
 
+import contextlib
 import os
-from typing import Optional
+import random
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Union
 import redis
+from redis.backoff import ExponentialBackoff
+from redis.cluster import RedisCluster
+from redis.retry import Retry
+from . import accounting
+from .backends import MemoryBackend
 from .utils import get_logger
 
 log = get_logger(__name__)
 
-# Global Redis client instance
-_redis_client: Optional[redis.Redis] = None
+BACKENDS = ("redis", "memory")
+
+# Key layouts: "flat" keys (room:42), or "tagged" ones (room:{42}) grouping an object's data in one cluster slot -
+# see ObjectMixin.KEY_LAYOUT
+KEY_LAYOUTS = ("flat", "tagged")
+
+# Client roles, and the environment variable holding the database of each - REDIS_DATA_DB's when unset
+ROLES = {
+    "data": "REDIS_DATA_DB",  # ORM models
+    "pubsub": "REDIS_PUBSUB_DB",  # pub/sub channels are server-wide: the database only matters to SELECT
+    "cache": "REDIS_CACHE_DB",
+}
+
+# Roles served by a Redis Cluster client with REDIS_CLUSTER set: published messages reach every node of a cluster,
+# so the pubsub role keeps a plain client, connected to the configured node.
+CLUSTER_ROLES = ("data", "cache")
+
+# Pool settings: option -> (environment variable, default, type). Each can be set per role, e.g.
+# REDIS_PUBSUB_MAX_CONNECTIONS, which takes precedence over REDIS_MAX_CONNECTIONS.
+POOL_OPTIONS = {
+    "max_connections": ("MAX_CONNECTIONS", "50", int),
+    "timeout": ("POOL_TIMEOUT", "10", float),  # seconds to wait for a free connection, before ConnectionError
+    "socket_timeout": ("SOCKET_TIMEOUT", None, float),  # none by default: pub/sub reads block until a message
+    "socket_connect_timeout": ("CONNECT_TIMEOUT", "5", float),
+    "socket_keepalive": ("SOCKET_KEEPALIVE", "true", lambda value: value.lower() in ("1", "true", "yes")),
+    "health_check_interval": ("HEALTH_CHECK_INTERVAL", "30", int),  # seconds idle before a PING on checkout
+    "retries": ("RETRIES", "3", int),  # on connection errors, e.g. an idle connection closed by the server
+}
+
+# Client registry: role -> client, and role -> read replica clients
+_clients: Dict[str, Any] = {}
+_replicas: Dict[str, List[Any]] = {}
+_lock = threading.Lock()
+
+# Whether the current context reads from the primary - set once it accesses the primary, see read_scope()
+_pinned: ContextVar[bool] = ContextVar("redis_pinned", default=False)
 
 
 def get_redis_client() -> redis.Redis:
-    """Get the current Redis client instance."""
-    global _redis_client
-    if _redis_client is None:
-        _redis_client = create_redis_client()
-    return _redis_client
+    """
+    Get the current Redis client instance - the registry's data client, i.e. the primary.
+    Reads of the current context go to the primary from then on, see get_read_client().
+    """
+    _pinned.set(True)
+    client = _clients.get("data")
+    if client is None:
+        client = get_client("data")
+    return client
+
+
+def get_read_client(role: str = "data") -> redis.Redis:
+    """
+    Get a client for reads: one of the role's read replicas (see get_replica_clients()), picked at random - or the
+    primary's, when the role has none, or when the current context accessed the primary (e.g. to write), so that
+    it reads its own writes (see read_scope()).
+
+    Reads from replicas may lag behind the primary: what they return may be missing recent writes of other contexts.
+    """
+    if not _pinned.get():
+        replicas = _replicas.get(role)
+        if replicas is None:
+            replicas = get_replica_clients(role)
+        if replicas:
+            return random.choice(replicas)
+    return _clients.get(role) or get_client(role)
+
+
+@contextlib.contextmanager
+def read_scope(primary: bool = False) -> Iterator[None]:
+    """
+    Delimits a scope of reads - e.g. a web request: reads go to replicas until the scope accesses the primary,
+    then to the primary for the rest of the scope. Outside any scope, reads stick to the primary from the first
+    access to the primary of the context (thread or asyncio task) on.
+
+    Args:
+        primary: whether all reads of the scope go to the primary - e.g. for reads followed by writes
+            depending on them, which would otherwise conflict on lagging replicas
+    """
+    token = _pinned.set(primary)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def start_read_scope(primary: bool = False) -> None:
+    """Starts a new scope of reads in the current context, see read_scope() - e.g. on a request hook."""
+    _pinned.set(primary)
+
+
+def get_replica_clients(role: str = "data") -> List[redis.Redis]:
+    """
+    Get the shared read replica clients of a role, created on first use out of the REDIS_REPLICAS env var
+    - "host:port" addresses, comma separated. Replicas hold all databases: they serve every role.
+    """
+    replicas = _replicas.get(role)
+    if replicas is not None:
+        return replicas
+
+    with _lock:
+        replicas = _replicas.get(role)
+        if replicas is None:
+            addresses = [address.strip() for address in os.environ.get("REDIS_REPLICAS", "").split(",") if address.strip()]
+            db = os.environ.get(ROLES.get(role, ""))
+            replicas = _replicas[role] = [
+                create_redis_client(host=host, port=int(port), db=int(db) if db else None, **pool_options(role))
+                for host, _, port in (address.rpartition(":") for address in addresses)
+            ]
+    return replicas
 
 
-def set_redis_client(client: redis.Redis) -> None:
-    """Set a custom Redis client (useful for testing with fakeredis)."""
-    global _redis_client
-    _redis_client = client
-    log.info("Custom Redis client configured")
+def set_replica_clients(clients: List[Any], role: str = "data") -> None:
+    """Set custom read replica clients for a role (e.g. for testing) - none, to read from the primary only."""
+    _replicas[role] = list(clients)
+    log.info(f"{len(clients)} custom replica clients configured for {role}")
+
+
+def set_redis_client(client: redis.Redis, role: str = "data") -> None:
+    """Set a custom Redis client (useful for testing with fakeredis), for a role - the ORM's by default."""
+    _clients[role] = client
+    log.info(f"Custom Redis client configured for {role}")
+
+
+def get_client(role: str = "data") -> Union[redis.Redis, MemoryBackend]:
+    """
+    Get the shared client of a role, created for the configured backend on first use.
+
+    Args:
+        role: one of ROLES
+
+    Raises:
+        ValueError: unknown role
+    """
+    client = _clients.get(role)
+    if client is not None:
+        return client
+
+    if role not in ROLES:
+        raise ValueError(f"Unknown client role '{role}': expected one of {', '.join(ROLES)}")
+
+    with _lock:
+        client = _clients.get(role)
+        if client is None:
+            db = os.environ.get(ROLES[role])
+            client = _clients[role] = create_client(
+                db=int(db) if db else None, cluster=cluster_enabled(role), **pool_options(role)
+            )
+    return client
+
+
+def cluster_enabled(role: Optional[str] = None) -> bool:
+    """Whether a role (see CLUSTER_ROLES) is served by a Redis Cluster client - per the REDIS_CLUSTER env var."""
+    if role is not None and role not in CLUSTER_ROLES:
+        return False
+    return os.environ.get("REDIS_CLUSTER", "").lower() in ("1", "true", "yes")
+
+
+def key_layout() -> str:
+    """
+    The key layout of models which do not declare one (see ObjectMixin.KEY_LAYOUT), per the REDIS_KEY_LAYOUT env var
+    - "flat" by default, "tagged" under REDIS_CLUSTER.
+
+    Raises:
+        ValueError: unknown layout
+    """
+    layout = os.environ.get("REDIS_KEY_LAYOUT") or ("tagged" if cluster_enabled() else "flat")
+    if layout not in KEY_LAYOUTS:
+        raise ValueError(f"Unknown key layout '{layout}': expected one of {', '.join(KEY_LAYOUTS)}")
+    return layout
+
+
+def pool_options(role: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Connection pool settings, from the environment - see POOL_OPTIONS.
+
+    Args:
+        role: the role whose specific settings (REDIS_{ROLE}_...) take precedence, if any
+    """
+    options = {}
+    for option, (name, default, cast) in POOL_OPTIONS.items():
+        value = os.environ.get(f"REDIS_{role.upper()}_{name}") if role else None
+        if not value:
+            value = os.environ.get(f"REDIS_{name}") or default  # empty stands for unset
+        if value is not None:
+            options[option] = cast(value)
+    return options
+
+
+def pool_usage(pool: Any) -> Dict[str, Any]:
+    """
+    The usage of a connection pool - sync or asyncio, blocking or not.
+
+    Returns:
+        {"max": max connections, "created": connections opened, "in_use": connections checked out,
+         "idle": connections open and available, "utilization": in_use / max}
+    """
+    if hasattr(pool, "_in_use_connections"):
+        # ConnectionPool (and asyncio's BlockingConnectionPool in recent redis-py)
+        in_use, idle = len(pool._in_use_connections), len(pool._available_connections)
+    else:
+        # BlockingConnectionPool: a queue of idle connections, padded with None for those not opened yet
+        queued = getattr(pool.pool, "queue", None)
+        if queued is None:
+            queued = pool.pool._queue  # asyncio queue
+        idle = sum(1 for connection in list(queued) if connection is not None)
+        in_use = len(pool._connections) - idle
+
+    return {
+        "max": pool.max_connections,
+        "created": in_use + idle,
+        "in_use": in_use,
+        "idle": idle,
+        "utilization": round(in_use / pool.max_connections, 3),
+    }
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """The usage of the connection pool of each registered client (see pool_usage()), by role - "data:replica0"... for replicas."""
+    clients = dict(_clients)
+    for role, replicas in list(_replicas.items()):
+        clients.update({f"{role}:replica{i}": replica for i, replica in enumerate(replicas)})
+
+    return {
+        name: pool_usage(client.connection_pool)
+        for name, client in clients.items()
+        if getattr(client, "connection_pool", None) is not None  # e.g. not the memory backend
+    }
 
 
 def create_redis_client(
@@ -34,39 +269,84 @@ def create_redis_client(
     port: Optional[int] = None,
     db: Optional[int] = None,
     decode_responses: bool = True,
+    cluster: bool = False,
     **kwargs
-) -> redis.Redis:
+) -> Union[redis.Redis, RedisCluster]:
     """
-    Create a new Redis client with configuration from environment or parameters.
-    
+    Create a new Redis client with configuration from environment or parameters, on its own blocking
+    connection pool.
+
     Args:
         host: Redis host (defaults to REDIS_HOST env var or 'localhost')
         port: Redis port (defaults to REDIS_PORT env var or 6379)
         db: Redis database number (defaults to REDIS_DATA_DB env var or 0)
         decode_responses: Whether to decode Redis responses as strings
-        **kwargs: Additional Redis client parameters
-    
+        cluster: whether to connect to a Redis Cluster, host and port being any of its nodes - with one
+            (non-blocking) pool per node, and no database but 0
+        **kwargs: Additional Redis connection or pool parameters (e.g. password, max_connections),
+            taking precedence over pool_options()
+
     Returns:
-        Configured Redis client instance
+        Configured Redis client instance - its usage counted in accounting scopes, unless REDIS_ACCOUNTING is false
     """
     host = host or os.environ.get("REDIS_HOST", "localhost")
     port = port or int(os.environ.get("REDIS_PORT", "6379"))
-    db = db or int(os.environ.get("REDIS_DATA_DB", "0"))
-    
-    client = redis.Redis(
+    db = db if db is not None else int(os.environ.get("REDIS_DATA_DB", "0"))
+
+    options = {**pool_options(), **kwargs}
+    retries = options.pop("retries", 0)
+    if retries and "retry" not in options:
+        options["retry"] = Retry(ExponentialBackoff(), retries)
+    if accounting.enabled():
+        options.setdefault("connection_class", accounting.MeteredConnection)
+
+    if cluster:
+        if db:
+            log.warning(f"Redis Cluster only has database 0: database {db} ignored")
+        options.pop("timeout", None)  # cluster node pools do not block
+        client = RedisCluster(host=host, port=port, decode_responses=decode_responses, **options)
+        log.info(f"Redis Cluster client created: {host}:{port} (max {options.get('max_connections')} connections per node)")
+        return client
+
+    pool = redis.BlockingConnectionPool(
         host=host,
         port=port,
         db=db,
         decode_responses=decode_responses,
-        **kwargs
+        **options
     )
-    
-    log.info(f"Redis client created: {host}:{port}/{db}")
+    client = redis.Redis(connection_pool=pool)
+
+    log.info(f"Redis client created: {host}:{port}/{db} (max {pool.max_connections} connections)")
     return client
 
 
 def reset_connection() -> None:
-    """Reset the global Redis connection (useful for testing)."""
-    global _redis_client
-    _redis_client = None
-    log.info("Redis connection reset") 
\ No newline at end of file
+    """Reset the registered clients (useful for testing) - each role gets a new one on next use."""
+    _clients.clear()
+    _replicas.clear()
+    log.info("Redis connection reset")
+
+
+def create_client(backend: Optional[str] = None, **kwargs) -> Union[redis.Redis, RedisCluster, MemoryBackend]:
+    """
+    Create a new client for a storage backend.
+
+    Args:
+        backend: "redis" or "memory" (defaults to REDIS_BACKEND env var or "redis")
+        **kwargs: create_redis_client() parameters, e.g. cluster - ignored by the memory backend
+
+    Returns:
+        A Redis client, or a new (empty) MemoryBackend
+
+    Raises:
+        ValueError: unknown backend
+    """
+    backend = backend or os.environ.get("REDIS_BACKEND", "redis")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}': expected one of {', '.join(BACKENDS)}")
+
+    if backend == "memory":
+        log.info("Memory backend created")
+        return MemoryBackend()
+    return create_redis_client(**kwargs)
@@ -5,13 +5,15 @@ Provides ObjectMixin and RelationMixin for building Redis-based models
 with support for relationships, optimistic locking, and automatic key management.
 """
 
+import functools
 import importlib
 import redis
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
-from .connection import get_redis_client
+from . import codecs, scripts
+from .connection import KEY_LAYOUTS, get_read_client, get_redis_client, key_layout, read_scope
 from .exceptions import ConflictError, ValidationError, RelationError
-from .utils import get_logger, now, new_id, flatten, unflatten
+from .utils import get_logger, now, new_id, flatten, unflatten, PATHS_CACHE_SIZE
 
 log = get_logger(__name__)
 
@@ -32,13 +34,39 @@ except ImportError:
 
 # After how many seconds objects set for deletion actually get deleted
 DEL_EXPIRE = 60  # 1 min
+CREATE_CANDIDATES = 3  # IDs tried server side by ObjectMixin.create() - collisions are rare, all 3 even more
 
 
-class RedisMixin:
+class RedisMixinMeta(type):
+    """
+    Metaclass compiling the declared fields of RedisMixin subclasses once, at class creation:
+        - FIELDS & META_FIELDS become __slots__, i.e. plain attribute descriptors - no per-access interception,
+          and no per-instance __dict__
+        - the class precomputes what it derives from its declaration (see _compile() methods), e.g. key prefixes
+    """
+
+    def __new__(cls, name, bases, dct):
+        if "__slots__" not in dct:
+            inherited = {slot for base in bases for klass in base.__mro__ for slot in getattr(klass, "__slots__", ())}
+            fields = dct.get("FIELDS", getattr(bases[0], "FIELDS", {}) if bases else {})
+            meta_fields = dct.get("META_FIELDS", getattr(bases[0], "META_FIELDS", set()) if bases else set())
+            # names already bound in the class body (e.g. properties) keep precedence over fields
+            dct["__slots__"] = tuple(sorted((set(fields) | set(meta_fields)) - inherited - set(dct)))
+
+        new_cls = super().__new__(cls, name, bases, dct)
+        new_cls._compile()
+        return new_cls
+
+
+class RedisMixin(metaclass=RedisMixinMeta):
     """A Redis ORM Mixin that manipulates hash map (HSET) objects"""
 
-    FIELDS: Dict[str, Any] = {}
+    __slots__ = ("key", "_created", "_edited", "_version")
+
+    FIELDS: Dict[str, Any] = {}  # a set of field names, or {field: type or codec} - see codecs
     META_FIELDS = {"_created", "_edited", "_version"}  # metadata fields
+    META_CODECS = {"_version": int}
+    KEY_LAYOUT: Optional[str] = None  # "flat" or "tagged" - connection.key_layout() by default, see ObjectMixin.tag()
 
     def __init__(self, key: str, data: Dict[str, Any], meta: Dict[str, Any]):
         if type(self) is RedisMixin:
@@ -46,33 +74,75 @@ class RedisMixin:
 
         self.key = key
 
-        self.data = {}
-        for field in self.FIELDS:
-            self.__setattr__(field, data.get(field, None))
+        for field in self._FIELDS:
+            setattr(self, field, data.get(field))
+
+        for field in self._META_FIELDS:
+            setattr(self, field, meta.get(field))
+
+    @classmethod
+    def _compile(cls) -> None:
+        """Precomputes class-level constants out of the class declaration - called by RedisMixinMeta."""
+        cls._FIELDS = tuple(sorted(cls.FIELDS))
+        cls._META_FIELDS = tuple(sorted(cls.META_FIELDS))
+        cls._PATHS = {}  # split flattened keys, see unflatten()
+
+        declarations = cls.FIELDS if isinstance(cls.FIELDS, dict) else {}
+        cls._CODECS = {
+            field: codec for field, codec in
+            ((field, codecs.compile_codec(declaration)) for field, declaration in declarations.items())
+            if codec is not None
+        }
+        cls._META_CODECS = {field: codecs.compile_codec(declaration) for field, declaration in cls.META_CODECS.items()}
+        cls._KEY_CODECS = {}  # codecs of flattened keys, see _codec()
+
+        layout = cls.KEY_LAYOUT or key_layout()
+        if layout not in KEY_LAYOUTS:
+            raise ValueError(f"{cls.__name__}: unknown key layout '{layout}', expected one of {', '.join(KEY_LAYOUTS)}")
+        cls._TAGGED = layout == "tagged"
+
+    @classmethod
+    def _in_layout(cls, layout: str) -> type:
+        """The class, compiled for another key layout - e.g. to read the keys of that layout, see migrate()."""
+        return type(cls)(cls.__name__, (cls,), {"KEY_LAYOUT": layout, "__slots__": (), "__module__": cls.__module__})
+
+    @classmethod
+    def _codec(cls, key: str) -> Optional[codecs.Codec]:
+        """The codec of a (flattened) hash field, if any. Memoized, as the keys of nested fields are open-ended."""
+        try:
+            return cls._KEY_CODECS[key]
+        except KeyError:
+            field, _, path = key.partition(":")
+            codec = codecs.resolve(cls._CODECS, field, tuple(path.split(":")) if path else ())
+            if len(cls._KEY_CODECS) >= PATHS_CACHE_SIZE:
+                cls._KEY_CODECS.clear()
+            cls._KEY_CODECS[key] = codec
+            return codec
 
-        self.meta = {}
-        for field in self.META_FIELDS:
-            self.__setattr__(field, meta.get(field, None))
+    @classmethod
+    def _decode(cls, key: str, raw: Dict[str, str]) -> None:
+        """Decodes typed hash fields of a raw reply, in place. Undecodable values are left as stored."""
+        for k, v in raw.items():
+            codec = cls._META_CODECS.get(k) or (cls._codec(k) if cls._CODECS else None)
+            if codec is not None:
+                try:
+                    raw[k] = codec.decode(v)
+                except (ValueError, TypeError) as e:
+                    log.warning(f"{cls.__name__} {key}: cannot decode {k}={v!r} with {codec}: {e}")
 
     def __getattr__(self, field: str) -> Any:
-        """Intercepts attribute access for keys in FIELDS & META_FIELDS."""
-        if field in self.FIELDS:
-            return self.data.get(field)
-        elif field in self.META_FIELDS:
-            return self.meta.get(field)
-        else:
-            raise AttributeError(f"{self.__class__.__name__}.{field} does not exist.")
-
-    def __setattr__(self, field: str, value: Any) -> None:
-        """Intercepts attribute setting for keys in FIELDS & META_FIELDS."""
-        if field in self.FIELDS:
-            self.data[field] = value
-        elif field in self.META_FIELDS:
-            self.meta[field] = value
-        elif field in {"key", "data", "meta"}:
-            return super().__setattr__(field, value)
-        else:
-            raise AttributeError(f"{self.__class__.__name__}.{field} does not exist.")
+        """Only reached for attributes which are neither declared nor set."""
+        raise AttributeError(f"{self.__class__.__name__}.{field} does not exist.")
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """The data fields (FIELDS) of the instance, as a new dict."""
+        return {field: getattr(self, field) for field in self._FIELDS}
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """The metadata fields (META_FIELDS) of the instance, as a new dict."""
+        return {field: getattr(self, field) for field in self._META_FIELDS}
 
     @classmethod
     @tracer.wrap("RedisMixin.create")
@@ -98,10 +168,7 @@ class RedisMixin:
         instance._created = now()
         instance._version = -1
 
-        redis_client = get_redis_client()
-        if redis_client.exists(key):
-            raise ConflictError(f"{cls.__name__}.create: {key} already exists")
-
+        # saving version -1 fails (ConflictError) if the key already exists - no need to check it first
         instance.save()
         return instance
 
@@ -109,7 +176,7 @@ class RedisMixin:
     @tracer.wrap("RedisMixin.exists")
     def exists(cls, key: str) -> bool:
         """Assesses whether the instance with key exists, or isn't marked for deletion."""
-        redis_client = get_redis_client()
+        redis_client = get_read_client()
         
         with redis_client.pipeline() as pipe:
             pipe.exists(key)
@@ -130,13 +197,99 @@ class RedisMixin:
         Returns:
             The object, or None if not found
         """
-        redis_client = get_redis_client()
+        redis_client = get_read_client()
         
         log.info(f"Loading {cls.__name__} with key {key}")
         
         # retrieve data from Redis
         raw = redis_client.hgetall(key)
         
+        return cls._from_raw(key, raw)
+
+    @classmethod
+    @tracer.wrap("RedisMixin.get_many")
+    def get_many(cls, keys: List[str]) -> Dict[str, "RedisMixin"]:
+        """
+        Retrieves several objects from Redis in a single pipelined round trip.
+
+        Args:
+            keys: The Redis keys of the objects to retrieve
+
+        Returns:
+            The objects indexed by key - missing or deleted objects are left out
+        """
+        if not keys:
+            return {}
+
+        log.info(f"Loading {len(keys)} {cls.__name__} in one pipeline")
+
+        instances = {}
+        for key, raw in zip(keys, RedisMixin._hgetall_many(keys)):
+            instance = cls._from_raw(key, raw)
+            if instance is not None:
+                instances[key] = instance
+
+        return instances
+
+    @classmethod
+    def _mapping(cls, data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Flattens and encodes data fields into the hash fields to write - through their codecs, if typed.
+        None, empty strings and empty dictionaries are not stored: they all read back as missing (None).
+        """
+        if not cls._CODECS:
+            return {k: scripts.encode(v) for k, v in flatten(data).items() if v != ''}
+
+        # whole field codecs (e.g. Json) encode before flattening
+        data = {
+            k: cls._CODECS[k].encode(v) if v is not None and isinstance(cls._CODECS.get(k), codecs.Codec) else v
+            for k, v in data.items()
+        }
+
+        mapping = {}
+        for k, v in flatten(data).items():
+            if v == '':
+                continue
+            codec = cls._codec(k) if ":" in k else None
+            mapping[k] = codec.encode(v) if codec is not None else scripts.encode(v)
+        return mapping
+
+    @classmethod
+    def _indexes(cls, key: str) -> Dict[str, Any]:
+        """Index maintenance entries for write operations on the object at key (see scripts.WRITE) - none by default."""
+        return {}
+
+    @classmethod
+    def _register(cls, key: str, created: str) -> Dict[str, Any]:
+        """Registration entry of the write operation creating the object at key (see scripts.WRITE) - none by default."""
+        return {}
+
+    @classmethod
+    def _unindex(cls, key: str, pipe: redis.client.Pipeline) -> None:
+        """Queues the removal of the object at key from its indexes - nothing to do by default."""
+        pass
+
+    @staticmethod
+    def _hgetall_many(keys: List[str]) -> List[Dict[str, Any]]:
+        """Fetches the raw hashes of several keys, whatever their class, in a single pipeline."""
+        if not keys:
+            return []
+
+        redis_client = get_read_client()
+
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            return pipe.execute()
+
+    @classmethod
+    def _from_raw(cls, key: str, raw: Dict[str, Any]) -> Optional["RedisMixin"]:
+        """
+        Builds an instance out of a raw HGETALL reply.
+
+        Returns:
+            The object, or None if the reply is empty or the object is marked for deletion
+        """
         # check if object (still) exists
         if not raw:
             log.warning(f"No match for {cls.__name__} with key {key}")
@@ -145,106 +298,108 @@ class RedisMixin:
             log.warning(f"{cls.__name__} with key {key} marked for deletion. Returning None")
             return None
 
+        raw = dict(raw)
+        cls._decode(key, raw)
+
         # retrieve data
         non_meta_data = {k: v for k, v in raw.items() if k not in cls.META_FIELDS}
         
         try:
-            data = unflatten(non_meta_data)
+            data = unflatten(non_meta_data, cls._PATHS)
         except Exception as e:
             log.error(f"Unflatten failed for {cls.__name__} {key}: {e}")
             raise
         
-        meta = {}
-        for k, v in raw.items():
-            if k in cls.META_FIELDS:
-                # Convert version field back to int
-                if k == "_version" and isinstance(v, str) and v.isdigit():
-                    meta[k] = int(v)
-                else:
-                    meta[k] = v
+        meta = {k: v for k, v in raw.items() if k in cls.META_FIELDS}
 
         return cls(key=key, data=data, meta=meta)
     
     @tracer.wrap("RedisMixin.save")
-    def save(self) -> "RedisMixin":
+    def save(self, *operations: Dict[str, Any], drop: Sequence[str] = ()) -> "RedisMixin":
         """
         Saves the instance (data and metadata fields) to Redis using optimistic locking.
-        Raises an exception if concurrent edits have been made (version change), or are being made (watch)
+        Raises an exception if concurrent edits have been made (version change).
+
+        The version check, the write and the reload happen atomically, in a single scripted round trip.
+
+        Args:
+            *operations: further write operations to apply atomically alongside the save - either all
+                of them are applied, or none (see RelationManager.updates)
+            drop: keys to delete atomically alongside the save - e.g. state kept beside the object, reset with it
         """
-        redis_client = get_redis_client()
+        version = int(self._version)
+        edited = now()
+
+        # prepare data
+        data = self.data
+        mapping = self._mapping(data)
+
+        # prepare metadata
+        meta = {**self.meta, "_edited": edited, "_version": version + 1}
+        mapping.update({k: scripts.encode(v) for k, v in meta.items() if v is not None})
+
+        # flush existing fields first - specifically matters for dictionary values
+        operation = {"key": self.key, "version": version, "flush": list(self._FIELDS), "set": mapping}
+        operation.update(self._indexes(self.key))
+        if version == -1:
+            operation.update(self._register(self.key, self._created))
+        if drop:
+            operation["drop"] = list(drop)
 
         try:
-            with redis_client.pipeline() as pipe:
-                # watch for concurrent edits
-                pipe.watch(self.key)
-                pipe.multi()
-
-                # fetch current version within the pipeline
-                version_ref = redis_client.hget(self.key, "_version")
-                version_ref = int(version_ref) if version_ref else -1
-                version_self = int(self._version)
-
-                if version_ref != version_self:
-                    raise ConflictError(f"Version mismatch: on server {version_ref}, on instance {version_self}.")
-
-                # flush existing fields - specifically matters for dictionary values
-                existing_fields = redis_client.hkeys(self.key)
-                
-                for field in self.FIELDS:
-                    subkeys = [k for k in existing_fields if k.startswith(f"{field}:")]
-                    if subkeys:
-                        pipe.hdel(self.key, *subkeys)
-            
-                # data & metadata update
-                mapping = {}
-
-                # prepare data
-                flattened = flatten(self.data)
-                
-                for k, v in flattened.items():
-                    v = '' if v is None else v
-                    if v != '':  # Skip empty markers to prevent unflatten corruption
-                        mapping[k] = v
-
-                # prepare metadata
-                self._edited = now()
-                self._version = int(self._version) + 1
-                mapping.update(self.meta)
-                
-                pipe.hset(self.key, mapping=mapping)
-
-                # push the update - this is where Redis DataError can occur
-                try:
-                    result = pipe.execute()
-                except Exception as e:
-                    log.error(f"Redis execution failed for {self.key}: {e}")
-                    log.error(f"Mapping data types: {[(k, type(v).__name__, str(v)[:50]) for k, v in mapping.items()]}")
-                    raise
-
-        except redis.WatchError:
-            raise ConflictError("Concurrent edit detected, aborting.")
-        except ConflictError:
+            results = scripts.write([operation, *operations])
+        except redis.DataError as e:
+            log.error(f"Redis execution failed for {self.key}: {e}")
+            log.error(f"Mapping data types: {[(k, type(v).__name__, str(v)[:50]) for k, v in flatten(data).items()]}")
             raise
 
+        self._edited = edited
+        self._version = version + 1
+
         log.info(f"{self.__class__.__name__} with key {self.key} saved: {self.data} (metadata {self.meta})")
-        return self.get(self.key)
+        return self._from_raw(self.key, results[0])
 
     @tracer.wrap("RedisMixin.delete")
-    def delete(self) -> bool:
+    def delete(self) -> int:
         """
-        Deletes the object and all its related relations from Redis using a pipeline.
+        Deletes the object from Redis using a pipeline.
         Soft delete, to absorb concurrent changes (that would revive the Redis key otherwise)
         Hard delete after a buffer period of time (through Redis Expire), when no concurrent changes may happen anymore
+
+        Returns:
+            The number of keys deleted
+        """
+        count = RedisMixin._tombstone({self.key: type(self)})
+
+        log.info(f"{self.__class__.__name__} with key {self.key} deleted.")
+        return count
+
+    @staticmethod
+    def _tombstone(plan: Dict[str, type]) -> int:
         """
+        Soft deletes several keys, whatever their class, and removes them from their indexes - atomically,
+        in a single MULTI pipeline.
+
+        Args:
+            plan: the classes of the objects to delete, indexed by key
+
+        Returns:
+            The number of keys deleted
+        """
+        if not plan:
+            return 0
+
         redis_client = get_redis_client()
-        
+        deleted = now()
+
         with redis_client.pipeline() as pipe:
-            pipe.expire(self.key, DEL_EXPIRE)
-            pipe.hset(self.key, "_deleted", now())
+            for key, cls in plan.items():
+                pipe.expire(key, DEL_EXPIRE)
+                pipe.hset(key, "_deleted", deleted)
+                cls._unindex(key, pipe)
             pipe.execute()
 
-        log.info(f"{self.__class__.__name__} with key {self.key} and all related relations deleted.")
-        return True
+        return len(plan)
 
     @classmethod
     @tracer.wrap("RedisMixin.patch")
@@ -276,6 +431,10 @@ class RedisMixin:
             if not add and not redis_client.hexists(key, field):
                 raise ConflictError(f"'{cls.__name__}' object has no attribute '{field}'")
 
+            codec = cls._codec(field)
+            if codec is not None:
+                value = codec.encode(value)
+
             # For add=True (upsert), always proceed regardless of existence
             pipe.hset(key, field, value)
             pipe.hincrby(key, "_version", 1)
@@ -286,6 +445,69 @@ class RedisMixin:
 
         return True
 
+    @classmethod
+    @tracer.wrap("RedisMixin.update")
+    def update(cls, key: str, **kwargs) -> Optional["RedisMixin"]:
+        """
+        Lower-latency update of whole fields, in a single atomic round trip (scripted).
+        Unlike save(), neither watches nor reloads the object, and does not require to load it first.
+
+        Args:
+            key: The Redis key of the object to update
+            **kwargs: field (within FIELDS) to update with their values - None removes the field
+
+        Returns:
+            The updated object, or None if it does not exist or is marked for deletion
+        """
+        raw, = scripts.write([cls._update_op(key, **kwargs)])
+
+        if raw is None:
+            log.warning(f"{cls.__name__} > {key} missing or deleted, skipping update")
+            return None
+
+        log.info(f"Updated {kwargs} for {key}")
+        return cls._from_raw(key, raw)
+
+    @classmethod
+    def _update_op(cls, key: str, **kwargs) -> Dict[str, Any]:
+        """Prepares the write operation of update(), so that it can be batched with others."""
+        invalid_fields = {k for k in kwargs if k not in cls.FIELDS}
+        if invalid_fields:
+            raise AttributeError(f"Invalid fields for {cls.__name__}: {invalid_fields}")
+
+        operation = {"key": key, "live": True, "flush": list(kwargs), "set": cls._mapping(kwargs), "bump": True}
+        operation.update(cls._indexes(key))
+
+        return operation
+
+    @classmethod
+    def _create_op(cls, key: str, **kwargs) -> Dict[str, Any]:
+        """Prepares the write operation creating the object at key, so that it can be batched - fails if the key exists."""
+        invalid_fields = {k for k in kwargs if k not in cls.FIELDS}
+        if invalid_fields:
+            raise AttributeError(f"Invalid fields for {cls.__name__}: {invalid_fields}")
+
+        created = now()
+        mapping = cls._mapping(kwargs)
+        mapping.update({"_created": created, "_edited": created, "_version": "0"})
+
+        operation = {"key": key, "version": -1, "set": mapping}
+        operation.update(cls._indexes(key))
+        operation.update(cls._register(key, created))
+
+        return operation
+
+    @classmethod
+    def _patch_op(cls, key: str, field: str, value: Any) -> Dict[str, Any]:
+        """Prepares an upsert of a single (sub)field of a live object, so that it can be batched."""
+        codec = cls._codec(field)
+        value = codec.encode(value) if codec is not None else scripts.encode(value)
+
+        operation = {"key": key, "live": True, "set": {field: value}, "bump": True}
+        operation.update(cls._indexes(key))
+
+        return operation
+
     @classmethod
     def delete_field(cls, key: str, field: str) -> bool:
         """
@@ -320,6 +542,7 @@ class RedisMixin:
     def search(cls, pattern: str = "*", cursor: int = 0, count: int = 1000) -> Tuple[List["RedisMixin"], int]:
         """
         Retrieves a batch of objects matching key pattern, using pagination.
+        See search_iter() to go through all of them.
         
         Args:
             pattern: The search pattern for Redis keys
@@ -329,36 +552,62 @@ class RedisMixin:
         Returns:
             A list of RedisMixins in the current batch and the cursor for the next batch (0 if all results have been retrieved).
         """
-        if type(cls) is RedisMixin:
+        if cls is RedisMixin:
             raise TypeError("RedisMixin.search() is abstract. Call subclass' instead.")
 
-        redis_client = get_redis_client()
-        instances = []
+        redis_client = get_read_client()
 
-        cursor, keys = redis_client.scan(cursor=cursor, match=pattern, count=count)
+        cursor, keys = redis_client.scan(cursor=cursor, match=pattern, count=count, _type="hash")
+        keys = [key for key in keys if cls._owns(key)]
 
-        for key in keys:
-            raw = redis_client.hgetall(key)
+        instances = list(cls.get_many(keys).values())
 
-            if not raw:
-                log.warning(f"No match for {cls.__name__} with key {key}")
-                continue
+        return instances, cursor
 
-            if raw.get("_deleted"):
-                log.warning(f"{cls.__name__} with key {key} marked for deletion. Skipping")
-                continue
+    @classmethod
+    @tracer.wrap("RedisMixin.search_iter")
+    def search_iter(cls, pattern: str = "*", count: int = 1000) -> Iterator["RedisMixin"]:
+        """
+        Lazily yields all objects matching key pattern, walking the SCAN cursor to completion (on every node of a
+        cluster). Each page of keys is hydrated in a single pipelined round trip, and only one page is held in memory
+        at a time.
 
-            data = {k: v for k, v in raw.items() if k in cls.FIELDS}
-            meta = {k: v for k, v in raw.items() if k in cls.META_FIELDS}
+        Args:
+            pattern: The search pattern for Redis keys
+            count: How many keys to scan, and hydrate, per page
 
-            instances.append(cls(key, data, meta))
+        Yields:
+            The objects, in no particular order - missing or deleted objects are left out
+        """
+        if cls is RedisMixin:
+            raise TypeError("RedisMixin.search_iter() is abstract. Call subclass' instead.")
 
-        return instances, cursor
+        for keys in RedisMixin._scan_pages(pattern, count):
+            yield from cls.get_many([key for key in keys if cls._owns(key)]).values()
+
+    @staticmethod
+    def _scan_pages(pattern: str, count: int = 1000) -> Iterator[List[str]]:
+        """Yields the hash keys matching pattern, by pages of up to count keys - across all nodes of a cluster."""
+        redis_client = get_read_client()
+
+        page = []
+        for key in redis_client.scan_iter(match=pattern, count=count, _type="hash"):
+            page.append(key)
+            if len(page) >= count:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    @classmethod
+    def _owns(cls, key: str) -> bool:
+        """Whether a key matching the class' search pattern actually holds an object of the class - any key by default."""
+        return True
 
 
 ## OBJECTS ############################################################################
 
-class ObjectMixinMeta(type):
+class ObjectMixinMeta(RedisMixinMeta):
     """Metaclass to dynamically generate relation methods for ObjectMixin subclasses."""
 
     def __new__(cls, name, bases, dct):
@@ -383,7 +632,15 @@ class ObjectMixinMeta(type):
     def _create_manager(relation_name, relation_class_path, manager_class):
         """Helper to create and return a manager function with captured variables."""
         def named_manager(self):
-            return manager_class(self, relation_class_path)
+            # managers only hold the instance and the relation class: build them once per instance
+            try:
+                return self._managers[relation_name]
+            except AttributeError:
+                self._managers = {}
+            except KeyError:
+                pass
+            manager = self._managers[relation_name] = manager_class(self, self._relation_class(relation_class_path))
+            return manager
         named_manager.__name__ = relation_name
         named_manager.__doc__ = f"Returns a manager for the {relation_name} relation."
         return named_manager
@@ -400,37 +657,212 @@ class ObjectMixin(RedisMixin, metaclass=ObjectMixinMeta):
     ID_GENERATOR = new_id  # The ID generator to use for the class
     LEFTS: Dict[str, str] = {}  # Leftwards relations {"relation_name": "relation_class_path", ...}
     RIGHTS: Dict[str, str] = {}  # Rightwards relations {"relation_name": "relation_class_path", ...}
+    CASCADE: set = set()  # Relation names whose related objects are deleted along with the object, see delete_plan()
+
+    __slots__ = ("_id", "_managers")
+
+    @classmethod
+    def _compile(cls) -> None:
+        super()._compile()
+        cls._PREFIX = f"{cls.__name__.lower()}:"
+        cls._ID_SLICE = slice(len(cls._PREFIX) + 1, -1) if cls._TAGGED else slice(len(cls._PREFIX), None)
+        cls._REGISTRY = f"registry:{cls.__name__.lower()}"  # {id: _created} sorted set, see page()
+        cls._RELATION_CLASSES = {}
+
+    @classmethod
+    def _relation_class(cls, path: str) -> type:
+        """
+        Resolves a relation class path of LEFTS or RIGHTS - e.g. "models.UsersRooms".
+        Paths are resolved lazily, as relation classes are usually declared after the classes they link,
+        then cached on the class.
+        """
+        try:
+            return cls._RELATION_CLASSES[path]
+        except KeyError:
+            module_name, class_name = path.rsplit(".", 1)
+            relation_class = cls._RELATION_CLASSES[path] = getattr(importlib.import_module(module_name), class_name)
+            return relation_class
 
     @classmethod
     def _prefix(cls) -> str:
         """Returns the Redis key prefix for this object type"""
-        return f"{cls.__name__.lower()}:"
+        return cls._PREFIX
     
+    @classmethod
+    def tag(cls, id: str) -> str:
+        """
+        The object id, as it appears in the object's keys: wrapped in a hash tag - {id} - in the tagged layout,
+        so that a Redis Cluster stores the keys tagged alike in the same slot (e.g. the object's, and those of the
+        relations anchored on it, see RelationMixin.ANCHOR), where scripts can write them together.
+        """
+        return f"{{{id}}}" if cls._TAGGED else id
+
     @classmethod
     def _key(cls, id: str) -> str:
         """Returns the Redis key of an object given its id"""
-        return f"{cls._prefix()}{id}"
+        return f"{cls._PREFIX}{cls.tag(id)}"
 
-    def __getattr__(self, name: str) -> Any:
-        """Intercepts attribute access for id."""
-        if name == "id":
-            return self.key[len(self._prefix()):]
-        else:
-            return super().__getattr__(name)
+    @classmethod
+    def _id_of(cls, key: str) -> str:
+        """Returns the id of an object given its key"""
+        return key[cls._ID_SLICE]
+
+    @property
+    def id(self) -> str:
+        """The object id, parsed out of its key on first access."""
+        try:
+            return self._id
+        except AttributeError:
+            self._id = self._id_of(self.key)
+            return self._id
 
     @classmethod
     @tracer.wrap("ObjectMixin.create")
     def create(cls, **kwargs) -> "ObjectMixin":
-        """Create a new object with auto-generated ID"""
-        # Generate a unique ID and create the instance
+        """
+        Create a new object with auto-generated ID, in a single scripted round trip: the script writes
+        the object under the first free one of several candidate IDs, and registers it.
+
+        In the tagged layout, candidates and the registry each live in their own cluster slot: candidates
+        are tried one script at a time, then the object is registered - a round trip later, not atomically.
+        """
+        log.info(f"Creating {cls.__name__} with kwargs {kwargs}")
+
+        # Check for invalid fields
+        invalid_fields = {k for k in kwargs if k not in cls.FIELDS}
+        if invalid_fields:
+            raise AttributeError(f"Invalid fields for {cls.__name__}: {invalid_fields}")
+
+        created = now()
+        mapping = cls._mapping(kwargs)
+        mapping.update({"_created": created, "_edited": created, "_version": "0"})
+
+        candidates = [cls._key(cls.ID_GENERATOR()) for _ in range(CREATE_CANDIDATES)]
+        if not cls._TAGGED:
+            key = scripts.create(candidates, mapping, cls._REGISTRY, cls._score(created), len(cls._PREFIX))
+        else:
+            for candidate in candidates:
+                try:
+                    key = scripts.create([candidate], mapping, None, cls._score(created), len(cls._PREFIX))
+                    break
+                except ConflictError:
+                    continue
+            else:
+                raise ConflictError(f"All {len(candidates)} candidate keys are taken.")
+            get_redis_client().zadd(cls._REGISTRY, {cls._id_of(key): cls._score(created)}, nx=True)
+
+        return cls(key=key, data=dict(kwargs), meta={"_created": created, "_edited": created, "_version": 0})
+
+    @classmethod
+    def _score(cls, created: str) -> int:
+        """The registry score of an object: its creation time, in epoch seconds."""
+        return int(codecs.Timestamp().encode(created))
+
+    @classmethod
+    def _register(cls, key: str, created: str) -> Dict[str, Any]:
+        """
+        Adds the object to the class registry, along with its creation - except in the tagged layout, the registry
+        living in another cluster slot than the object: create() registers objects itself, reindex() any other.
+        """
+        if cls._TAGGED:
+            return {}
+        return {"register": {"zset": cls._REGISTRY, "score": cls._score(created), "member": cls._id_of(key)}}
+
+    @classmethod
+    def _unindex(cls, key: str, pipe: redis.client.Pipeline) -> None:
+        """Removes the object from the class registry."""
+        super()._unindex(key, pipe)
+        pipe.zrem(cls._REGISTRY, cls._id_of(key))
+
+    @classmethod
+    @tracer.wrap("ObjectMixin.count")
+    def count(cls) -> int:
+        """The number of objects of this type, out of the class registry."""
+        redis_client = get_read_client()
+        return redis_client.zcard(cls._REGISTRY)
+
+    @classmethod
+    @tracer.wrap("ObjectMixin.page")
+    def page(cls, after: Optional[str] = None, limit: int = 100, score: Optional[float] = None) -> List["ObjectMixin"]:
+        """
+        Retrieves a page of objects of this type, oldest first, out of the class registry - without scanning
+        the keyspace. Costs two round trips whatever the number of objects.
+
+        Args:
+            after: the id of the last object of the previous page - None for the first page
+            limit: the maximum number of objects in the page
+            score: the registry score of the after object, to resume from its place should it have left
+                the registry meanwhile (see pages())
+
+        Returns:
+            The objects of the page - an empty list past the last one, but also when all of its objects are gone
+
+        Raises:
+            ValueError: the after object is not registered (anymore), e.g. deleted in the meantime, and no score is given
+        """
+        entries = cls._page_entries(after, limit, score)
+        return list(cls.get_many([cls._key(id) for id, _ in entries]).values())
+
+    @classmethod
+    @tracer.wrap("ObjectMixin.pages")
+    def pages(cls, limit: int = 100) -> Iterator[List["ObjectMixin"]]:
+        """
+        Goes through all objects of this type, page by page, oldest first, out of the class registry. Pages follow
+        each other by registry entry rather than by object: objects deleted meanwhile - the last of a page included -
+        neither interrupt nor end the iteration. Pages may hold fewer objects than limit, but are never empty.
+        """
+        after = score = None
+        while entries := cls._page_entries(after, limit, score):
+            instances = list(cls.get_many([cls._key(id) for id, _ in entries]).values())
+            if instances:
+                yield instances
+            after, score = entries[-1]
+
+    @classmethod
+    def _page_entries(cls, after: Optional[str], limit: int, score: Optional[float]) -> List[Tuple[str, float]]:
+        """The (id, score) registry entries of a page - see page()."""
+        args = [after or "", limit, "" if score is None else f"{score:.17g}"]
+        try:
+            raw = scripts.run(scripts.PAGE, keys=[cls._REGISTRY], args=args, client=get_read_client())
+        except redis.ResponseError as e:
+            if str(e).startswith("MISSING "):
+                raise ValueError(f"{cls.__name__}.page: {str(e)[len('MISSING '):]}")
+            raise
+        return [(id, float(score)) for id, score in zip(raw[::2], raw[1::2])]
+
+    @classmethod
+    @tracer.wrap("ObjectMixin.reindex")
+    def reindex(cls) -> int:
+        """
+        Rebuilds the class registry out of a full keyspace scan - e.g. for objects created before registries existed.
+
+        Returns:
+            The number of objects registered
+        """
         redis_client = get_redis_client()
-        
-        while True:
-            id = cls.ID_GENERATOR()
-            if not redis_client.exists(cls._key(id)):
-                break  # Unique ID found
 
-        return super().create(cls._key(id), **kwargs)
+        scores = {}
+        for instance in cls.search_iter():
+            try:
+                scores[instance.id] = cls._score(instance._created)
+            except ValidationError:
+                log.warning(f"{cls.__name__} {instance.id}: invalid _created {instance._created!r}, registered first")
+                scores[instance.id] = 0
+
+        # only unregister what is gone for good: objects may be created while scanning
+        unseen = [id for id in redis_client.zrange(cls._REGISTRY, 0, -1) if id not in scores]
+        alive = cls.get_many([cls._key(id) for id in unseen])
+        gone = [id for id in unseen if cls._key(id) not in alive]
+
+        with redis_client.pipeline(transaction=False) as pipe:
+            if scores:
+                pipe.zadd(cls._REGISTRY, scores)
+            if gone:
+                pipe.zrem(cls._REGISTRY, *gone)
+            pipe.execute()
+
+        log.info(f"Reindexed {len(scores)} {cls.__name__} objects, unregistered {len(gone)}")
+        return len(scores)
 
     @classmethod
     def exists(cls, id: str) -> bool:
@@ -451,37 +883,84 @@ class ObjectMixin(RedisMixin, metaclass=ObjectMixinMeta):
         return super().get(cls._key(id))
 
     @tracer.wrap("ObjectMixin.delete")
-    def delete(self) -> bool:
-        """Deletes the object and all its related relations from Redis using a pipeline."""
-        # Delete all left-relations
-        if self.LEFTS:
-            log.info(f"Deleting left relations for {self.__class__.__name__} with ID {self.id}")
-            for relation_name, relation_class in self.LEFTS.items():
-                manager = LeftwardsRelationManager(self, relation_class)
-                manager.remove_all()
+    def delete(self) -> int:
+        """
+        Deletes the object, all its relations and, through CASCADE relations, the related objects (and theirs)
+        - all at once and atomically, see delete_plan().
 
-        # Delete all right-relations
-        if self.RIGHTS:
-            log.info(f"Deleting right relations for {self.__class__.__name__} with ID {self.id}")
-            for relation_name, relation_class in self.RIGHTS.items():
-                manager = RightwardsRelationManager(self, relation_class)
-                manager.remove_all()
+        Returns:
+            The number of keys deleted
+        """
+        with read_scope(primary=True):  # no relation created lately is left behind
+            plan = self.delete_plan()
+        count = RedisMixin._tombstone(plan)
 
-        return super().delete()
+        log.info(f"{self.__class__.__name__} with ID {self.id} deleted, along with {count - 1} relations and related objects.")
+        return count
+
+    @tracer.wrap("ObjectMixin.delete_plan")
+    def delete_plan(self) -> Dict[str, type]:
+        """
+        Collects what deleting the object entails: the object, all its relations, and the objects related through
+        CASCADE relations, recursively. Relations are listed by key, without loading them.
+
+        Returns:
+            The classes of the objects and relations to delete, indexed by key
+        """
+        plan = {}
+        pending = [(type(self), self.id)]
+
+        while pending:
+            cls, id = pending.pop()
+            key = cls._key(id)
+            if key in plan:
+                continue
+            plan[key] = cls
+
+            for relation_name, relation_class_path in cls.LEFTS.items():
+                relation_class = cls._relation_class(relation_class_path)
+                for relation_key in relation_class._lefts_keys(id):
+                    plan[relation_key] = relation_class
+                    if relation_name in cls.CASCADE:
+                        pending.append((relation_class.L_CLASS, relation_class._left_id(relation_key)))
+
+            for relation_name, relation_class_path in cls.RIGHTS.items():
+                relation_class = cls._relation_class(relation_class_path)
+                for relation_key in relation_class._rights_keys(id):
+                    plan[relation_key] = relation_class
+                    if relation_name in cls.CASCADE:
+                        pending.append((relation_class.R_CLASS, relation_class._right_id(relation_key)))
+
+        return plan
 
     @classmethod
     def patch(cls, id: str, field: str, value: Any, add: bool = False) -> bool:
         """Patch object by ID"""
         return super().patch(cls._key(id), field, value, add)
 
+    @classmethod
+    def update(cls, id: str, **kwargs) -> Optional["ObjectMixin"]:
+        """Update object fields by ID, in a single round trip"""
+        return super().update(cls._key(id), **kwargs)
+
     @classmethod
     def delete_field(cls, id: str, field: str) -> bool:
         """Delete field from object by ID"""
         return super().delete_field(cls._key(id), field)
 
     @tracer.wrap("ObjectMixin.to_dict")
-    def to_dict(self, include_related: bool = False) -> Dict[str, Any]:
-        """Converts the object to a dictionary for JSON serialization."""
+    def to_dict(self, include_related: bool = False, prefetch: bool = True) -> Dict[str, Any]:
+        """
+        Converts the object to a dictionary for JSON serialization.
+
+        Args:
+            include_related: whether to embed related objects (and their relation) under each relation name
+            prefetch: eager-load relations and related objects in two pipelined batches (see to_dicts),
+                rather than loading each of them one by one
+        """
+        if include_related and prefetch:
+            return self.to_dicts([self], include_related=True)
+
         base = {**self.data, **self.meta}
 
         if include_related:
@@ -513,10 +992,127 @@ class ObjectMixin(RedisMixin, metaclass=ObjectMixinMeta):
 
         return {str(self.id): base}
 
+    @classmethod
+    @tracer.wrap("ObjectMixin.to_dicts")
+    def to_dicts(cls, instances: List["ObjectMixin"], include_related: bool = False) -> Dict[str, Any]:
+        """
+        Converts several objects to a single dictionary for JSON serialization, indexed by object ID.
+
+        With include_related, relations are eager-loaded: the relation keys of all instances are found
+        with one keyspace scan per relation (see RelationMixin._keys_many), then all relations are fetched
+        in one pipeline, and all related objects in a second one, regardless of the number of instances.
+        Related objects that no longer exist are left out.
+        """
+        result = {str(instance.id): {**instance.data, **instance.meta} for instance in instances}
+
+        if not include_related:
+            return result
+
+        # Collect the relation keys of every (instance, relation) pair
+        managers = []
+        for instance in instances:
+            for relation_name, relation_class in instance.LEFTS.items():
+                managers.append((instance, relation_name, LeftwardsRelationManager(instance, relation_class)))
+            for relation_name, relation_class in instance.RIGHTS.items():
+                managers.append((instance, relation_name, RightwardsRelationManager(instance, relation_class)))
+
+        # One scan per relation class and side, for all instances
+        sides = ["lefts" if isinstance(manager, LeftwardsRelationManager) else "rights" for _, _, manager in managers]
+        ids = {}
+        for (instance, _, manager), side in zip(managers, sides):
+            ids.setdefault((manager.relation_class, side), {})[str(instance.id)] = None
+        found = {
+            (relation_class, side): relation_class._keys_many(side, list(object_ids))
+            for (relation_class, side), object_ids in ids.items()
+        }
+        relation_keys = [
+            found[manager.relation_class, side][str(instance.id)]
+            for (instance, _, manager), side in zip(managers, sides)
+        ]
+
+        # 1st batch: all relations
+        raws = iter(RedisMixin._hgetall_many([key for keys in relation_keys for key in keys]))
+        relations = []
+        for (_, _, manager), keys in zip(managers, relation_keys):
+            loaded = {}
+            for key in keys:
+                relation = manager.relation_class._from_raw(key, next(raws))
+                if relation is not None:
+                    loaded[manager.related_id(relation)] = relation
+            relations.append(loaded)
+
+        # 2nd batch: all related objects
+        related_keys = [
+            manager.related_class._key(related_id)
+            for (_, _, manager), loaded in zip(managers, relations)
+            for related_id in loaded
+        ]
+        raws = iter(RedisMixin._hgetall_many(related_keys))
+
+        for (instance, relation_name, manager), loaded in zip(managers, relations):
+            embedded = {}
+            for related_id, relation in loaded.items():
+                related = manager.related_class._from_raw(manager.related_class._key(related_id), next(raws))
+                if related is None:
+                    continue
+                embedded[str(related_id)] = {**related.data, **related.meta, "relation": relation.meta | relation.data}
+            result[str(instance.id)][relation_name] = embedded
+
+        return result
+
     @classmethod
     def search(cls, cursor: int = 0, count: int = 1000) -> Tuple[List["ObjectMixin"], int]:
         """Search for objects of this type"""
-        return super().search(f"{cls._prefix()}*", cursor, count)
+        return super().search(f"{cls._PREFIX}*", cursor, count)
+
+    @classmethod
+    def search_iter(cls, count: int = 1000) -> Iterator["ObjectMixin"]:
+        """Lazily yields all objects of this type, see RedisMixin.search_iter()"""
+        return super().search_iter(f"{cls._PREFIX}*", count)
+
+    @classmethod
+    def _owns(cls, key: str) -> bool:
+        """
+        Ids hold no colon: longer keys sharing the prefix belong to others - e.g. "user:posts:..." relations.
+        Neither do keys of the other key layout, see migrate().
+        """
+        id = key[len(cls._PREFIX):]
+        return ":" not in id and id.startswith("{") == cls._TAGGED and id.endswith("}") == cls._TAGGED
+
+    @classmethod
+    @tracer.wrap("ObjectMixin.migrate")
+    def migrate(cls, source: str = "flat") -> int:
+        """
+        Moves the objects of this type stored in another key layout to the class' own - e.g. "flat" ones, before
+        running on a Redis Cluster. The registry holds ids: it is left as is. Objects marked for deletion are left
+        to expire. Objects are moved (copied, then deleted) one pipeline per page of keys, not atomically:
+        migrate with writers stopped.
+
+        Args:
+            source: the key layout to move objects from
+
+        Returns:
+            The number of objects moved
+        """
+        origin = cls._in_layout(source)
+        if origin._TAGGED == cls._TAGGED:
+            return 0
+
+        redis_client = get_redis_client()
+        count = 0
+
+        for keys in RedisMixin._scan_pages(f"{cls._PREFIX}*"):
+            keys = [key for key in keys if origin._owns(key)]
+            with redis_client.pipeline(transaction=False) as pipe:
+                for key, raw in zip(keys, RedisMixin._hgetall_many(keys)):
+                    if raw and not raw.get("_deleted"):
+                        pipe.hset(cls._key(origin._id_of(key)), mapping=raw)
+                        pipe.delete(key)
+                        count += 1
+                pipe.execute()
+
+        log.info(f"Moved {count} {cls.__name__} objects from the {source} key layout")
+        return count
 
 
 ## RELATIONS ##########################################################################
@@ -531,46 +1127,313 @@ class RelationMixin(RedisMixin):
     L_CLASS: Optional[type] = None   # Left-side class (e.g., Room)
     R_CLASS: Optional[type] = None   # Right-side class (e.g., User)
     NAME: str = "left:linksto:right"  # Name of the relation for key generation
+    LOOKUPS: set = set()  # FIELDS mirrored into a {related_id: value} hash per object, see RelationManager.lookup()
+    INDEXES: set = set()  # FIELDS indexed into a set of related ids per object and value, see RelationManager.filter()
+    ANCHOR: str = "right"  # the side whose object id tags the relation keys in the tagged layout, see _compile()
+
+    __slots__ = ("_ids",)
+
+    @classmethod
+    def _compile(cls) -> None:
+        """
+        In the tagged layout, the relation key, the parent pointer, and the anchor object's lookup hashes and index
+        sets are tagged with the anchor object id - i.e. stored in the anchor object's cluster slot, where a script
+        can write them together. The other side's lookup hashes and index sets would live in another slot: they are
+        not kept, and its managers read relations instead (see RelationManager.indexed).
+        """
+        super()._compile()
+        if cls.ANCHOR not in ("left", "right"):
+            raise ValueError(f"{cls.__name__}.ANCHOR: expected 'left' or 'right', got '{cls.ANCHOR}'")
+        if cls.RELATION_TYPE == "one_to_many" and cls.ANCHOR != "right":
+            raise ValueError(f"{cls.__name__}.ANCHOR: one-to-many relations are anchored on their (right-side) children")
+
+        cls._NAME_LENGTH = len(cls.NAME) + 1  # "{NAME}:"
+        cls._L_PREFIX = f"{cls.L_CLASS.__name__.lower()}_" if cls.L_CLASS else None
+        cls._R_PREFIX = f"{cls.R_CLASS.__name__.lower()}_" if cls.R_CLASS else None
+        cls._L_TAGGED = cls._TAGGED and cls.ANCHOR == "left"
+        cls._R_TAGGED = cls._TAGGED and cls.ANCHOR == "right"
+        cls._L_INDEXED = not cls._R_TAGGED  # whether the left-side objects' lookup hashes and index sets are kept
+        cls._R_INDEXED = not cls._L_TAGGED
+        cls._L_SLICE = slice(len(cls._L_PREFIX or "") + cls._L_TAGGED, -1 if cls._L_TAGGED else None)
+        cls._R_SLICE = slice(len(cls._R_PREFIX or "") + cls._R_TAGGED, -1 if cls._R_TAGGED else None)
 
     @classmethod
     def _L_prefix(cls) -> str:
         """Returns the lowercased class name for the left-side class."""
-        return f"{cls.L_CLASS.__name__.lower()}_"
+        return cls._L_PREFIX
 
     @classmethod
     def _R_prefix(cls) -> str:
         """Returns the lowercased class name for the right-side class."""
-        return f"{cls.R_CLASS.__name__.lower()}_"
+        return cls._R_PREFIX
+
+    @classmethod
+    def _left_part(cls, left_id: str) -> str:
+        """The left-side object, as it appears in keys - hash-tagged if it is the anchor, in the tagged layout."""
+        return f"{cls._L_PREFIX}{{{left_id}}}" if cls._L_TAGGED else f"{cls._L_PREFIX}{left_id}"
+
+    @classmethod
+    def _right_part(cls, right_id: str) -> str:
+        """The right-side object, as it appears in keys - hash-tagged if it is the anchor, in the tagged layout."""
+        return f"{cls._R_PREFIX}{{{right_id}}}" if cls._R_TAGGED else f"{cls._R_PREFIX}{right_id}"
 
     @classmethod
     def _key(cls, left_id: str, right_id: str) -> str:
         """Generate the Redis key for a relation between two objects."""
-        return f"{cls.NAME}:{cls._L_prefix()}{left_id}:{cls._R_prefix()}{right_id}"
+        return f"{cls.NAME}:{cls._left_part(left_id)}:{cls._right_part(right_id)}"
     
+    @classmethod
+    def _parents_key(cls, right_id: str) -> str:
+        """
+        Returns the key of the {right_id: left_id} hash pointing one-to-many children to their parent - one hash
+        for all children, or one per child in the tagged layout.
+        """
+        return f"{cls.NAME}:parents:{{{right_id}}}" if cls._TAGGED else f"{cls.NAME}:parents"
+
+    @classmethod
+    def _parent(cls, right_id: str) -> Optional[str]:
+        """Retrieve the left-side object ID for a given right-side object (used in one-to-many)."""
+        redis_client = get_read_client()
+        return redis_client.hget(cls._parents_key(right_id), right_id)
+
     @classmethod
     def _exist_parent(cls, right_id: str) -> bool:
-        """Retrieve the relation for a given right-side object (used in one-to-many)."""
+        """Whether a given right-side object is already linked to a left-side object (used in one-to-many)."""
+        redis_client = get_read_client()
+        return bool(redis_client.hexists(cls._parents_key(right_id), right_id))
+
+    @classmethod
+    def _split_key(cls, key: str) -> Tuple[str, str]:
+        """Extracts the left-side and right-side object IDs from a relation key."""
+        left, right = key[cls._NAME_LENGTH:].split(":")  # strip "{NAME}:"
+        return left[cls._L_SLICE], right[cls._R_SLICE]
+
+    @classmethod
+    def _owns(cls, key: str) -> bool:
+        """Relation keys of the other key layout (see migrate()) match the class' search patterns, but are not the class'."""
+        left, _, right = key[cls._NAME_LENGTH:].partition(":")
+        return left.endswith("}") == cls._L_TAGGED and right.endswith("}") == cls._R_TAGGED
+
+    @classmethod
+    def _left_id(cls, key: str) -> str:
+        """Extracts the left-side object ID from a relation key."""
+        return cls._split_key(key)[0]
+
+    @classmethod
+    def _right_id(cls, key: str) -> str:
+        """Extracts the right-side object ID from a relation key."""
+        return cls._split_key(key)[1]
+
+    @classmethod
+    def _left_lookup_key(cls, left_id: str, field: str) -> str:
+        """Returns the key of the {right_id: value} lookup hash of a left-side object for a LOOKUPS field."""
+        return f"{cls.NAME}:lookup:{cls._left_part(left_id)}:{field}"
+
+    @classmethod
+    def _right_lookup_key(cls, right_id: str, field: str) -> str:
+        """Returns the key of the {left_id: value} lookup hash of a right-side object for a LOOKUPS field."""
+        return f"{cls.NAME}:lookup:{cls._right_part(right_id)}:{field}"
+
+    @classmethod
+    def _left_index_prefix(cls, left_id: str, field: str) -> str:
+        """Returns the prefix of the keys of the sets of right_ids of a left-side object, per value of an INDEXES field."""
+        return f"{cls.NAME}:index:{cls._left_part(left_id)}:{field}:"
+
+    @classmethod
+    def _right_index_prefix(cls, right_id: str, field: str) -> str:
+        """Returns the prefix of the keys of the sets of left_ids of a right-side object, per value of an INDEXES field."""
+        return f"{cls.NAME}:index:{cls._right_part(right_id)}:{field}:"
+
+    @classmethod
+    def _index_value(cls, field: str, value: Any) -> str:
+        """Encodes a value of an INDEXES field the way it is stored, hence indexed."""
+        codec = cls._codec(field)
+        return codec.encode(value) if codec is not None else scripts.encode(value)
+
+    @classmethod
+    def _index_entries(cls, key: str) -> List[Dict[str, str]]:
+        """Both sides' index sets (the anchor's only, in the tagged layout), for each INDEXES field of the relation at key."""
+        if not cls.INDEXES:
+            return []
+
+        left_id, right_id = cls._left_id(key), cls._right_id(key)
+        entries = []
+        for field in sorted(cls.INDEXES):
+            if cls._L_INDEXED:
+                entries.append({"field": field, "prefix": cls._left_index_prefix(left_id, field), "member": right_id})
+            if cls._R_INDEXED:
+                entries.append({"field": field, "prefix": cls._right_index_prefix(right_id, field), "member": left_id})
+        return entries
+
+    @classmethod
+    def _lookups(cls, key: str) -> List[Dict[str, str]]:
+        """Both sides' lookup hashes (the anchor's only, in the tagged layout), for each LOOKUPS field of the relation at key."""
+        if not cls.LOOKUPS:
+            return []
+
+        left_id, right_id = cls._left_id(key), cls._right_id(key)
+        lookups = []
+        for field in sorted(cls.LOOKUPS):
+            if cls._L_INDEXED:
+                lookups.append({"field": field, "hash": cls._left_lookup_key(left_id, field), "member": right_id})
+            if cls._R_INDEXED:
+                lookups.append({"field": field, "hash": cls._right_lookup_key(right_id, field), "member": left_id})
+        return lookups
+
+    @classmethod
+    def _indexes(cls, key: str) -> Dict[str, Any]:
+        """Lookup hashes, index sets, and the parent pointer of one-to-many relations."""
+        indexes = {}
+
+        lookups = cls._lookups(key)
+        if lookups:
+            indexes["lookups"] = lookups
+
+        entries = cls._index_entries(key)
+        if entries:
+            indexes["indexes"] = entries
+
+        if cls.RELATION_TYPE == "one_to_many":
+            right_id = cls._right_id(key)
+            indexes["claim"] = {"hash": cls._parents_key(right_id), "field": right_id, "value": cls._left_id(key)}
+
+        return indexes
+
+    @classmethod
+    def _unindex(cls, key: str, pipe: redis.client.Pipeline) -> None:
+        """Removes the relation from the lookup hashes, the index sets, and the parent pointers of one-to-many relations."""
+        for lookup in cls._lookups(key):
+            pipe.hdel(lookup["hash"], lookup["member"])
+
+        entries = cls._index_entries(key)
+        if entries:
+            scripts.run(scripts.UNINDEX, keys=[key], args=[scripts.dumps(entries)], client=pipe)
+
+        if cls.RELATION_TYPE == "one_to_many":
+            right_id = cls._right_id(key)
+            pipe.hdel(cls._parents_key(right_id), right_id)
+
+    @classmethod
+    @tracer.wrap("RelationMixin.reindex")
+    def reindex(cls) -> int:
+        """
+        Rebuilds the lookup hashes, index sets (and parent pointers) of all relations of this type - e.g. after
+        adding a field to LOOKUPS or INDEXES, or for relations created before indexes existed.
+
+        Returns:
+            The number of relations indexed
+        """
+        if not cls.LOOKUPS and not cls.INDEXES and cls.RELATION_TYPE != "one_to_many":
+            return 0
+
         redis_client = get_redis_client()
-        pattern = f"{cls.NAME}:*:{cls._R_prefix()}{right_id}"
+        count = 0
 
-        for key in redis_client.scan_iter(pattern):
-            raw = redis_client.hgetall(key)
-            if raw:
-                return True
-        return False
+        pattern = f"{cls.NAME}:{cls._L_PREFIX}*:{cls._R_PREFIX}*"
+        keys = [key for key in redis_client.scan_iter(pattern) if cls._owns(key)]
+        stale = list(redis_client.scan_iter(f"{cls.NAME}:index:*")) if cls.INDEXES else []
+        if cls.RELATION_TYPE == "one_to_many":
+            stale += redis_client.scan_iter(f"{cls.NAME}:parents*")
+        with redis_client.pipeline(transaction=False) as pipe:
+            for stale_key in stale:
+                pipe.delete(stale_key)  # one by one: keys of several cluster slots
+
+            for key, raw in zip(keys, RedisMixin._hgetall_many(keys)):
+                if not raw or raw.get("_deleted"):
+                    for lookup in cls._lookups(key):
+                        pipe.hdel(lookup["hash"], lookup["member"])
+                    continue
+                for lookup in cls._lookups(key):
+                    value = raw.get(lookup["field"])
+                    if value is None:
+                        pipe.hdel(lookup["hash"], lookup["member"])
+                    else:
+                        pipe.hset(lookup["hash"], lookup["member"], value)
+                for entry in cls._index_entries(key):
+                    value = raw.get(entry["field"])
+                    if value is not None:
+                        pipe.sadd(entry["prefix"] + value, entry["member"])
+                if cls.RELATION_TYPE == "one_to_many":
+                    right_id = cls._right_id(key)
+                    pipe.hset(cls._parents_key(right_id), right_id, cls._left_id(key))
+                count += 1
+            pipe.execute()
 
-    def __getattr__(self, name: str) -> Any:
-        """Intercepts attribute access for left_id and right_id."""
-        if name == "left_id":
-            suffix = self.key[len(self.NAME) + 1:]  # strip "{NAME}:"
-            left_id = suffix.split(":")[0].split("_", 1)[1]
-            return left_id
-        elif name == "right_id":
-            suffix = self.key[len(self.NAME) + 1:]  # strip "{NAME}:"
-            right_id = suffix.split(":")[1].split("_", 1)[1]
-            return right_id
-        else:
-            return super().__getattr__(name)
+        log.info(f"Reindexed {count} {cls.__name__} relations")
+        return count
+
+    @classmethod
+    def _lefts_keys(cls, right_id: str) -> List[str]:
+        """Retrieves the keys of all relations with a given right-side object."""
+        if cls.RELATION_TYPE == "one_to_many":
+            # At most one parent, pointed to directly - no need to scan
+            left_id = cls._parent(right_id)
+            return [cls._key(left_id, right_id)] if left_id else []
+
+        redis_client = get_read_client()
+        pattern = f"{cls.NAME}:{cls._L_PREFIX}*:{cls._right_part(right_id)}"
+        return [key for key in redis_client.scan_iter(pattern) if cls._owns(key)]
+
+    @classmethod
+    def _rights_keys(cls, left_id: str) -> List[str]:
+        """Retrieves the keys of all relations with a given left-side object."""
+        redis_client = get_read_client()
+        pattern = f"{cls.NAME}:{cls._left_part(left_id)}:{cls._R_PREFIX}*"
+        return [key for key in redis_client.scan_iter(pattern) if cls._owns(key)]
+
+    @classmethod
+    def _keys_many(cls, side: str, ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Retrieves the keys of all relations of several objects at once, indexed by object ID - with one keyspace
+        scan for them all, rather than one each (or one pipeline of parent pointers, for one-to-many children).
+
+        Args:
+            side: "lefts" for the relations with right-side objects of ids, "rights" for left-side ones
+            ids: the object IDs
+        """
+        if len(ids) == 1:
+            keys = cls._lefts_keys(ids[0]) if side == "lefts" else cls._rights_keys(ids[0])
+            return {ids[0]: keys}
+
+        if side == "lefts" and cls.RELATION_TYPE == "one_to_many":
+            with get_read_client().pipeline(transaction=False) as pipe:
+                for right_id in ids:
+                    pipe.hget(cls._parents_key(right_id), right_id)
+                parents = pipe.execute()
+            return {
+                right_id: [cls._key(left_id, right_id)] if left_id else []
+                for right_id, left_id in zip(ids, parents)
+            }
+
+        keys = {id: [] for id in ids}
+        redis_client = get_read_client()
+        pattern = f"{cls.NAME}:{cls._L_PREFIX}*:{cls._R_PREFIX}*"
+        for key in redis_client.scan_iter(pattern):
+            if not cls._owns(key):
+                continue
+            left_id, right_id = cls._split_key(key)
+            bucket = keys.get(right_id if side == "lefts" else left_id)
+            if bucket is not None:
+                bucket.append(key)
+        return keys
+
+    @property
+    def left_id(self) -> str:
+        """The left-side object id, parsed out of the key on first access."""
+        return self._parsed_ids()[0]
+
+    @property
+    def right_id(self) -> str:
+        """The right-side object id, parsed out of the key on first access."""
+        return self._parsed_ids()[1]
+
+    def _parsed_ids(self) -> Tuple[str, str]:
+        """Both object ids, parsed once per instance."""
+        try:
+            return self._ids
+        except AttributeError:
+            ids = self._ids = self._split_key(self.key)
+            return ids
 
     @classmethod
     @tracer.wrap("RelationMixin.create")
@@ -578,21 +1441,43 @@ class RelationMixin(RedisMixin):
         """Creates a relation instance."""
         log.info(f"Creating relation between {cls.L_CLASS.__name__}:{left_id} and {cls.R_CLASS.__name__}:{right_id} with kwargs {kwargs}")
 
-        if cls.L_CLASS.get_by_id(left_id) is None:
+        # Check both objects exist (and the child is free, for one-to-many relations) in a single round trip
+        redis_client = get_redis_client()
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in (cls.L_CLASS._key(left_id), cls.R_CLASS._key(right_id)):
+                pipe.exists(key)
+                pipe.hexists(key, "_deleted")
+            if cls.RELATION_TYPE == "one_to_many":
+                pipe.hexists(cls._parents_key(right_id), right_id)
+            left_exists, left_deleted, right_exists, right_deleted, *parent = pipe.execute()
+
+        if not left_exists or left_deleted:
             raise ValueError(f"{cls.L_CLASS.__name__}:{left_id} does not exist.")
         
-        if cls.R_CLASS.get_by_id(right_id) is None:
+        if not right_exists or right_deleted:
             raise ValueError(f"{cls.R_CLASS.__name__}:{right_id} does not exist.")
 
-        # Enforce cardinality constraints
-        if cls.RELATION_TYPE == "one_to_many":
-            if cls._exist_parent(right_id):
-                raise ValueError(
-                    f"{cls.R_CLASS.__name__}:{right_id} is already linked to a {cls.L_CLASS.__name__} - skipping association"
-                )
+        # Enforce cardinality constraints - also guarded atomically by the write itself, see _indexes()
+        if parent and parent[0]:
+            raise ValueError(
+                f"{cls.R_CLASS.__name__}:{right_id} is already linked to a {cls.L_CLASS.__name__} - skipping association"
+            )
 
         return super().create(cls._key(left_id, right_id), **kwargs)
 
+    @classmethod
+    def _create_op(cls, key: str, **kwargs) -> Dict[str, Any]:
+        """
+        Prepares the creation of the relation at key - which requires both objects to exist, atomically.
+        In the tagged layout, only the anchor object's existence is checked atomically: the other one lives
+        in another cluster slot (create() still checks it beforehand).
+        """
+        operation = super()._create_op(key, **kwargs)
+        left_id, right_id = cls._split_key(key)
+        required = {"left": cls.L_CLASS._key(left_id), "right": cls.R_CLASS._key(right_id)}
+        operation["requires"] = [required[cls.ANCHOR]] if cls._TAGGED else list(required.values())
+        return operation
+
     @classmethod
     def exists(cls, left_id: str, right_id: str) -> bool:
         """Check if relation exists"""
@@ -605,14 +1490,68 @@ class RelationMixin(RedisMixin):
     
     @classmethod
     def patch(cls, left_id: str, right_id: str, field: str, value: Any, add: bool = False) -> bool:
-        """Patch relation by IDs"""
+        """Patch relation by IDs - LOOKUPS and INDEXES fields go through update(), to keep indexes in sync"""
+        if field in cls.LOOKUPS or field in cls.INDEXES:
+            return cls.update(left_id, right_id, **{field: value}) is not None
         return super().patch(cls._key(left_id, right_id), field, value, add)
 
+    @classmethod
+    def update(cls, left_id: str, right_id: str, **kwargs) -> Optional["RelationMixin"]:
+        """Update relation fields by IDs, in a single round trip"""
+        return super().update(cls._key(left_id, right_id), **kwargs)
+
     @classmethod
     def search(cls, cursor: int = 0, count: int = 1000) -> Tuple[List["RelationMixin"], int]:
         """Search for relations of this type"""
-        pattern = f"{cls.NAME}:{cls._L_prefix()}*:{cls._R_prefix()}*"
+        pattern = f"{cls.NAME}:{cls._L_PREFIX}*:{cls._R_PREFIX}*"
         return super().search(pattern, cursor, count)
+
+    @classmethod
+    def search_iter(cls, count: int = 1000) -> Iterator["RelationMixin"]:
+        """Lazily yields all relations of this type, see RedisMixin.search_iter()"""
+        pattern = f"{cls.NAME}:{cls._L_PREFIX}*:{cls._R_PREFIX}*"
+        return super().search_iter(pattern, count)
+
+    @classmethod
+    @tracer.wrap("RelationMixin.migrate")
+    def migrate(cls, source: str = "flat") -> int:
+        """
+        Moves the relations of this type stored in another key layout to the class' own (see ObjectMixin.migrate()),
+        then rebuilds their lookup hashes, index sets and parent pointers in the new layout - see reindex().
+        Migrate with writers stopped.
+
+        Args:
+            source: the key layout to move relations from
+
+        Returns:
+            The number of relations moved
+        """
+        origin = cls._in_layout(source)
+        if origin._TAGGED == cls._TAGGED:
+            return 0
+
+        redis_client = get_redis_client()
+        count = 0
+
+        for keys in RedisMixin._scan_pages(f"{cls.NAME}:{cls._L_PREFIX}*:{cls._R_PREFIX}*"):
+            keys = [key for key in keys if origin._owns(key)]
+            with redis_client.pipeline(transaction=False) as pipe:
+                for key, raw in zip(keys, RedisMixin._hgetall_many(keys)):
+                    if raw and not raw.get("_deleted"):
+                        pipe.hset(cls._key(*origin._split_key(key)), mapping=raw)
+                        pipe.delete(key)
+                        count += 1
+                pipe.execute()
+
+        # lookup hashes are refreshed by reindex(), not cleared: those of the old layout go first
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in redis_client.scan_iter(f"{cls.NAME}:lookup:*"):
+                pipe.delete(key)
+            pipe.execute()
+        cls.reindex()
+
+        log.info(f"Moved {count} {cls.__name__} relations from the {source} key layout")
+        return count
     
     @tracer.wrap("RelationMixin.left")
     def left(self) -> Optional["ObjectMixin"]:
@@ -642,55 +1581,15 @@ class RelationMixin(RedisMixin):
     @tracer.wrap("RelationMixin.lefts")
     def lefts(cls, right_id: str) -> Dict[str, "RelationMixin"]:
         """Retrieve all leftwards relations with a given right-side object."""
-        redis_client = get_redis_client()
-        lefts = {}
-
-        pattern = f"{cls.NAME}:{cls._L_prefix()}*:{cls._R_prefix()}{right_id}"
-        for key in redis_client.scan_iter(pattern):
-            raw = redis_client.hgetall(key)
-            if not raw:
-                log.warning(f"No match for {cls.__name__} with key {key}")
-                continue
-
-            if raw.get("_deleted"):
-                log.warning(f"{cls.__name__} with key {key} marked for deletion. Skipping")
-                continue
-
-            data = {k: v for k, v in raw.items() if k in cls.FIELDS}
-            meta = {k: v for k, v in raw.items() if k in cls.META_FIELDS}
-            relation = cls(key, data=data, meta=meta)
-
-            left_id = key[len(cls.NAME) + 1:].split(":")[0].split("_", 1)[1]
-            lefts[left_id] = relation
-
-        return lefts
+        relations = cls.get_many(cls._lefts_keys(right_id))
+        return {cls._left_id(key): relation for key, relation in relations.items()}
 
     @classmethod
     @tracer.wrap("RelationMixin.rights")
     def rights(cls, left_id: str) -> Dict[str, "RelationMixin"]:
         """Retrieve all rightwards relations with a given left-side object."""
-        redis_client = get_redis_client()
-        rights = {}
-
-        pattern = f"{cls.NAME}:{cls._L_prefix()}{left_id}:{cls._R_prefix()}*"
-        for key in redis_client.scan_iter(pattern):
-            raw = redis_client.hgetall(key)
-            if not raw:
-                log.warning(f"No match for {cls.__name__} with key {key}")
-                continue
-
-            if raw.get("_deleted"):
-                log.warning(f"{cls.__name__} with key {key} marked for deletion. Skipping")
-                continue
-
-            data = {k: v for k, v in raw.items() if k in cls.FIELDS}
-            meta = {k: v for k, v in raw.items() if k in cls.META_FIELDS}
-            relation = cls(key, data=data, meta=meta)
-
-            right_id = key[len(cls.NAME) + 1:].split(":")[1].split("_", 1)[1]
-            rights[right_id] = relation
-
-        return rights
+        relations = cls.get_many(cls._rights_keys(left_id))
+        return {cls._right_id(key): relation for key, relation in relations.items()}
 
 
 ## RELATION MANAGERS ##################################################################
@@ -698,20 +1597,32 @@ class RelationMixin(RedisMixin):
 class RelationManager:
     """An abstract manager for handling relations between two ObjectMixin classes."""
 
-    def __init__(self, instance: ObjectMixin, relation_class: str):
+    __slots__ = ("instance", "relation_class")
+
+    def __init__(self, instance: ObjectMixin, relation_class: Union[str, type]):
         if type(self) is RelationManager:
             raise TypeError("RelationManager cannot be instantiated directly. Call subclass' instead.")
 
         self.instance = instance
-
-        module_name, class_name = relation_class.rsplit(".", 1)
-        module = importlib.import_module(module_name)
-        self.relation_class = getattr(module, class_name)
+        self.relation_class = instance._relation_class(relation_class) if isinstance(relation_class, str) else relation_class
 
     def all(self) -> Dict[str, RelationMixin]:
         """Retrieves all relations for the instance, indexed with their object ID"""
         raise TypeError("RelationManager.all() is abstract. Call subclass' instead.")
 
+    def keys(self) -> List[str]:
+        """Retrieves the Redis keys of all relations for the instance"""
+        raise TypeError("RelationManager.keys() is abstract. Call subclass' instead.")
+
+    @property
+    def related_class(self) -> type:
+        """The class of the objects on the other side of the relation"""
+        raise TypeError("RelationManager.related_class is abstract. Call subclass' instead.")
+
+    def related_id(self, relation: RelationMixin) -> str:
+        """Returns the ID of the object on the other side of a relation"""
+        raise TypeError("RelationManager.related_id() is abstract. Call subclass' instead.")
+
     def add(self, related_id: str, **data) -> ObjectMixin:
         """Adds a relation between the instance and a related object."""
         raise TypeError("RelationManager.add() is abstract. Call subclass' instead.")
@@ -743,15 +1654,211 @@ class RelationManager:
         """Retrieves the first related object and its relation to the instance."""
         raise TypeError("RelationManager.first() is abstract. Call subclass' instead.")
 
+    def relation_key(self, related_id: str) -> str:
+        """Returns the Redis key of the relation between the instance and a related object"""
+        raise TypeError("RelationManager.relation_key() is abstract. Call subclass' instead.")
+
+    def __getattr__(self, name: str) -> Any:
+        """Exposes lookup() as {field}_of() for LOOKUPS fields - e.g. room.users().role_of(user_id)"""
+        if name.endswith("_of") and name[:-3] in self.relation_class.LOOKUPS:
+            return functools.partial(self.lookup, name[:-3])
+        raise AttributeError(f"{self.__class__.__name__}.{name} does not exist.")
+
+    def lookup_key(self, field: str) -> str:
+        """Returns the key of the instance's lookup hash for a LOOKUPS field"""
+        raise TypeError("RelationManager.lookup_key() is abstract. Call subclass' instead.")
+
+    @property
+    def indexed(self) -> bool:
+        """
+        Whether the instance's lookup hashes and index sets are kept - always, but in the tagged layout for objects
+        which are not the relation's anchor: lookup() and filter() (and the like) read their relations instead.
+        """
+        raise TypeError("RelationManager.indexed is abstract. Call subclass' instead.")
+
+    def _relations(self, related_ids: Optional[List[str]] = None) -> Dict[str, RelationMixin]:
+        """The relations with several related objects (all of them if None), indexed by related object ID."""
+        if related_ids is None:
+            return self.all()
+
+        keys = {related_id: self.relation_key(related_id) for related_id in related_ids}
+        relations = self.relation_class.get_many(list(keys.values()))
+        return {related_id: relations[key] for related_id, key in keys.items() if key in relations}
+
+    @tracer.wrap("RelationManager.lookup")
+    def lookup(self, field: str, related_id: str) -> Optional[Any]:
+        """
+        Retrieves a LOOKUPS field of the relation with a related object, with a single HGET.
+
+        Returns:
+            The field value, or None if there is no such (live) relation or the field is not set
+        """
+        if field not in self.relation_class.LOOKUPS:
+            raise AttributeError(f"{self.relation_class.__name__}.{field} is not a lookup field.")
+
+        if not self.indexed:
+            relation = self._relations([related_id]).get(related_id)
+            return getattr(relation, field) if relation is not None else None
+
+        redis_client = get_read_client()
+        value = redis_client.hget(self.lookup_key(field), related_id)
+
+        codec = self.relation_class._codec(field)
+        return codec.decode(value) if codec is not None and value is not None else value
+
+    @tracer.wrap("RelationManager.lookup_many")
+    def lookup_many(self, field: str, related_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Retrieves a LOOKUPS field of the relations with several related objects, in a single round trip.
+
+        Args:
+            field: the LOOKUPS field
+            related_ids: the related object IDs - all related objects if None
+
+        Returns:
+            The field values indexed by related object ID - related objects without relation are left out
+        """
+        if field not in self.relation_class.LOOKUPS:
+            raise AttributeError(f"{self.relation_class.__name__}.{field} is not a lookup field.")
+
+        if not self.indexed:
+            relations = self._relations(None if related_ids is None else list(related_ids))
+            return {
+                related_id: getattr(relation, field)
+                for related_id, relation in relations.items() if getattr(relation, field) is not None
+            }
+
+        redis_client = get_read_client()
+
+        if related_ids is None:
+            values = redis_client.hgetall(self.lookup_key(field))
+        else:
+            related_ids = list(related_ids)
+            if not related_ids:
+                return {}
+            values = redis_client.hmget(self.lookup_key(field), related_ids)
+            values = {related_id: value for related_id, value in zip(related_ids, values) if value is not None}
+
+        codec = self.relation_class._codec(field)
+        if codec is not None:
+            values = {related_id: codec.decode(value) for related_id, value in values.items()}
+        return values
+
+    def index_prefix(self, field: str) -> str:
+        """Returns the prefix of the keys of the instance's index sets for an INDEXES field"""
+        raise TypeError("RelationManager.index_prefix() is abstract. Call subclass' instead.")
+
+    def _index_keys(self, criteria: Dict[str, Any]) -> List[str]:
+        """The keys of the index sets matching {field: value} criteria on INDEXES fields."""
+        if not criteria:
+            raise ValueError("At least one criterion is required - see all() otherwise.")
+
+        not_indexed = set(criteria) - set(self.relation_class.INDEXES)
+        if not_indexed:
+            raise AttributeError(f"{self.relation_class.__name__}: {not_indexed} are not index fields.")
+
+        return [
+            self.index_prefix(field) + self.relation_class._index_value(field, value)
+            for field, value in sorted(criteria.items())
+        ]
+
+    @tracer.wrap("RelationManager.ids")
+    def ids(self, **criteria) -> List[str]:
+        """
+        Retrieves the IDs of the related objects whose relation matches all criteria, out of the index sets,
+        in a single round trip - e.g. room.users().ids(role="player").
+
+        Args:
+            **criteria: INDEXES fields with the value to match
+        """
+        keys = self._index_keys(criteria)
+        if not self.indexed:
+            return sorted(self._matching(criteria))
+
+        redis_client = get_read_client()
+        members = redis_client.smembers(keys[0]) if len(keys) == 1 else redis_client.sinter(keys)
+        return sorted(members)
+
+    def _matching(self, criteria: Dict[str, Any]) -> List[str]:
+        """The IDs of the related objects whose relation matches all criteria, out of the relations themselves."""
+        values = {field: self.relation_class._index_value(field, value) for field, value in criteria.items()}
+        return [
+            related_id for related_id, relation in self.all().items()
+            if all(
+                getattr(relation, field) is not None
+                and self.relation_class._index_value(field, getattr(relation, field)) == value
+                for field, value in values.items()
+            )
+        ]
+
+    @tracer.wrap("RelationManager.filter")
+    def filter(self, **criteria) -> Dict[str, RelationMixin]:
+        """
+        Retrieves the relations matching all criteria, indexed with their object ID - loading matching relations only,
+        in two round trips whatever the number of relations.
+
+        Args:
+            **criteria: INDEXES fields with the value to match
+        """
+        keys = {related_id: self.relation_key(related_id) for related_id in self.ids(**criteria)}
+        relations = self.relation_class.get_many(list(keys.values()))
+        return {related_id: relations[key] for related_id, key in keys.items() if key in relations}
+
+    @tracer.wrap("RelationManager.count")
+    def count(self, **criteria) -> int:
+        """Counts the relations matching all criteria, out of the index sets - a single SCARD for one criterion."""
+        keys = self._index_keys(criteria)
+        if not self.indexed:
+            return len(self._matching(criteria))
+
+        redis_client = get_read_client()
+        return redis_client.scard(keys[0]) if len(keys) == 1 else len(redis_client.sinter(keys))
+
+    def update(self, related_id: str, **kwargs) -> Optional[RelationMixin]:
+        """Updates properties of the relation with related object, without loading the related object."""
+        raise TypeError("RelationManager.update() is abstract. Call subclass' instead.")
+
+    def updates(self, updates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Prepares updates of several relations, to be applied by update_many(), or atomically alongside
+        a save() - e.g. room.save(*room.users().updates({user_id: {"role": "player"}})).
+
+        Args:
+            updates: the fields to update, indexed by related object ID
+        """
+        return [
+            self.relation_class._update_op(self.relation_key(related_id), **fields)
+            for related_id, fields in updates.items()
+        ]
+
+    @tracer.wrap("RelationManager.update_many")
+    def update_many(self, updates: Dict[str, Dict[str, Any]]) -> Dict[str, RelationMixin]:
+        """
+        Updates several relations at once, atomically and in a single round trip.
+
+        Args:
+            updates: the fields to update, indexed by related object ID
+
+        Returns:
+            The updated relations, indexed by related object ID - missing or deleted relations are left out
+        """
+        raws = scripts.write(self.updates(updates))
+
+        relations = {}
+        for related_id, raw in zip(updates, raws):
+            if raw is not None:
+                relations[related_id] = self.relation_class._from_raw(self.relation_key(related_id), raw)
+
+        return relations
+
     @tracer.wrap("RelationManager.set")
     def set(self, related_id: str, **kwargs) -> Tuple[Optional[ObjectMixin], Optional[RelationMixin]]:
-        """Sets properties of the relation with related object."""
-        obj, rel = self.get_by_id(related_id)
-        if rel:
-            for key, value in kwargs.items():
-                rel.__setattr__(key, value)
-                log.debug(f"setting {key}:{value}")
-            rel.save()
+        """
+        Sets properties of the relation with related object.
+        Prefer update() when the related object is not needed: set() loads it on top.
+        """
+        rel = self.update(related_id, **kwargs)
+        obj = self.related_class.get_by_id(related_id) if rel else None
 
         return obj, rel
 
@@ -759,19 +1866,44 @@ class RelationManager:
 class RightwardsRelationManager(RelationManager):
     """Manages relations where the instance is the left-side object."""
 
-    def __init__(self, instance: ObjectMixin, relation_class: str):
-        log.debug(f"Initializing RightwardsRelationManager with instance {instance.key} and relation_class {relation_class}")
-        super().__init__(instance, relation_class)
+    __slots__ = ()
 
     @tracer.wrap("RightwardsRelationManager.all")
     def all(self) -> Dict[str, RelationMixin]:
         return self.relation_class.rights(self.instance.id)
 
+    def keys(self) -> List[str]:
+        return self.relation_class._rights_keys(self.instance.id)
+
+    @property
+    def related_class(self) -> type:
+        return self.relation_class.R_CLASS
+
+    def related_id(self, relation: RelationMixin) -> str:
+        return relation.right_id
+
     @tracer.wrap("RightwardsRelationManager.add")
     def add(self, related_id: str, **data) -> ObjectMixin:
         self.relation_class.create(self.instance.id, related_id, **data)
         return self.instance
 
+    def relation_key(self, related_id: str) -> str:
+        return self.relation_class._key(self.instance.id, related_id)
+
+    def lookup_key(self, field: str) -> str:
+        return self.relation_class._left_lookup_key(self.instance.id, field)
+
+    @property
+    def indexed(self) -> bool:
+        return self.relation_class._L_INDEXED
+
+    def index_prefix(self, field: str) -> str:
+        return self.relation_class._left_index_prefix(self.instance.id, field)
+
+    @tracer.wrap("RightwardsRelationManager.update")
+    def update(self, related_id: str, **kwargs) -> Optional[RelationMixin]:
+        return self.relation_class.update(self.instance.id, related_id, **kwargs)
+
     @tracer.wrap("RightwardsRelationManager.remove")
     def remove(self, related_id: str) -> ObjectMixin:
         relation = self.relation_class.get_by_ids(self.instance.id, related_id)
@@ -802,19 +1934,44 @@ class RightwardsRelationManager(RelationManager):
 class LeftwardsRelationManager(RelationManager):
     """Manages relations where the instance is the right-side object."""
 
-    def __init__(self, instance: ObjectMixin, relation_class: str):
-        log.debug(f"Initializing LeftwardsRelationManager with instance {instance} and relation_class {relation_class}")
-        super().__init__(instance, relation_class)
+    __slots__ = ()
 
     @tracer.wrap("LeftwardsRelationManager.all")
     def all(self) -> Dict[str, RelationMixin]:
         return self.relation_class.lefts(self.instance.id)
 
+    def keys(self) -> List[str]:
+        return self.relation_class._lefts_keys(self.instance.id)
+
+    @property
+    def related_class(self) -> type:
+        return self.relation_class.L_CLASS
+
+    def related_id(self, relation: RelationMixin) -> str:
+        return relation.left_id
+
     @tracer.wrap("LeftwardsRelationManager.add")
     def add(self, related_id: str, **data) -> ObjectMixin:
         self.relation_class.create(related_id, self.instance.id, **data)
         return self.instance
 
+    def relation_key(self, related_id: str) -> str:
+        return self.relation_class._key(related_id, self.instance.id)
+
+    def lookup_key(self, field: str) -> str:
+        return self.relation_class._right_lookup_key(self.instance.id, field)
+
+    @property
+    def indexed(self) -> bool:
+        return self.relation_class._R_INDEXED
+
+    def index_prefix(self, field: str) -> str:
+        return self.relation_class._right_index_prefix(self.instance.id, field)
+
+    @tracer.wrap("LeftwardsRelationManager.update")
+    def update(self, related_id: str, **kwargs) -> Optional[RelationMixin]:
+        return self.relation_class.update(related_id, self.instance.id, **kwargs)
+
     @tracer.wrap("LeftwardsRelationManager.remove")
     def remove(self, related_id: str) -> ObjectMixin:
         relation = self.relation_class.get_by_ids(related_id, self.instance.id)
@@ -0,0 +1,468 @@
+"""
+Lua scripts for Redis ORM.
+
+Scripts run atomically on the Redis server: they let the ORM check and write
+an object in a single round trip, without WATCH/MULTI retries.
+
+Each script comes with its Python implementation, run in its place by the memory
+backend (see backends.emulate()) - keep both in step.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from . import backends
+from .connection import get_redis_client
+from .exceptions import ConflictError, RelationError
+from .utils import now
+
+
+# Applies a batch of write operations atomically - one operation per key:
+# KEYS:    the keys written to, one per operation
+# ARGV[1]: timestamp, for _edited
+# ARGV[2]: JSON list of operations, aligned with KEYS. Each operation may hold:
+#   version: expected _version (-1 when the key does not exist yet) - any mismatch aborts the whole batch
+#   live:    skip the operation if the key is missing or marked for deletion
+#   requires: keys which must exist and not be marked for deletion - any missing one aborts the whole batch
+#   flush:   top-level fields whose stored value and subfields (field:*) are removed before writing
+#   set:     flattened field -> value to write
+#   bump:    increment _version and refresh _edited
+#   lookups: [{field, hash, member}] - mirrors the resulting value of field into hash[member] (removed
+#            when the field is unset, or the key marked for deletion)
+#   claim:   {hash, field, value} - sets hash[field] to value, unless already set to another value,
+#            which aborts the whole batch (e.g. a one-to-many child already linked to another parent)
+#   register: {zset, score, member} - adds member to the zset, unless already there (e.g. a class registry)
+#   drop:    keys to delete along with the operation (e.g. state kept beside the object, reset with it)
+#   indexes: [{field, prefix, member}] - keeps member in the set prefix .. value, value being the resulting value
+#            of field, and out of the set of its previous value (out of both when the key is marked for deletion)
+# Guards are all checked before anything is written: a conflict leaves every key untouched.
+# Index sets are named after field values, unknown beforehand: unlike other keys, they are not declared.
+# Returns, per operation, the resulting hash as a flat [field, value, ...] list - nil if skipped.
+WRITE = """
+local ops = cjson.decode(ARGV[2])
+
+local skipped = {}
+for i, op in ipairs(ops) do
+    local key = KEYS[i]
+    if op.version ~= nil then
+        local current = tonumber(redis.call('HGET', key, '_version')) or -1
+        if current ~= op.version then
+            return redis.error_reply('CONFLICT Version mismatch on ' .. key .. ': on server ' .. current .. ', on instance ' .. op.version .. '.')
+        end
+    end
+    if op.live and (redis.call('EXISTS', key) == 0 or redis.call('HEXISTS', key, '_deleted') == 1) then
+        skipped[i] = true
+    end
+    if op.requires then
+        for _, required in ipairs(op.requires) do
+            if redis.call('EXISTS', required) == 0 or redis.call('HEXISTS', required, '_deleted') == 1 then
+                return redis.error_reply('MISSING ' .. required .. ' does not exist.')
+            end
+        end
+    end
+    if op.claim and not skipped[i] then
+        local owner = redis.call('HGET', op.claim.hash, op.claim.field)
+        if owner and owner ~= op.claim.value then
+            return redis.error_reply('TAKEN ' .. op.claim.field .. ' is already linked to ' .. owner .. '.')
+        end
+    end
+end
+
+local results = {}
+for i, op in ipairs(ops) do
+    local key = KEYS[i]
+    if skipped[i] then
+        results[i] = false
+    else
+        local previous = {}
+        if op.indexes then
+            local was_deleted = redis.call('HEXISTS', key, '_deleted') == 1
+            for j, index in ipairs(op.indexes) do
+                previous[j] = not was_deleted and redis.call('HGET', key, index.field)
+            end
+        end
+        if op.flush and #op.flush > 0 then
+            for _, existing in ipairs(redis.call('HKEYS', key)) do
+                for _, field in ipairs(op.flush) do
+                    if existing == field or string.sub(existing, 1, #field + 1) == field .. ':' then
+                        redis.call('HDEL', key, existing)
+                        break
+                    end
+                end
+            end
+        end
+        if op.set then
+            for field, value in pairs(op.set) do
+                redis.call('HSET', key, field, value)
+            end
+        end
+        if op.bump then
+            redis.call('HINCRBY', key, '_version', 1)
+            redis.call('HSET', key, '_edited', ARGV[1])
+        end
+        if op.claim then
+            redis.call('HSET', op.claim.hash, op.claim.field, op.claim.value)
+        end
+        if op.register then
+            redis.call('ZADD', op.register.zset, 'NX', op.register.score, op.register.member)
+        end
+        if op.drop and #op.drop > 0 then
+            redis.call('DEL', unpack(op.drop))
+        end
+        if op.lookups then
+            local deleted = redis.call('HEXISTS', key, '_deleted') == 1
+            for _, lookup in ipairs(op.lookups) do
+                local value = redis.call('HGET', key, lookup.field)
+                if value and not deleted then
+                    redis.call('HSET', lookup.hash, lookup.member, value)
+                else
+                    redis.call('HDEL', lookup.hash, lookup.member)
+                end
+            end
+        end
+        if op.indexes then
+            local deleted = redis.call('HEXISTS', key, '_deleted') == 1
+            for j, index in ipairs(op.indexes) do
+                local value = not deleted and redis.call('HGET', key, index.field)
+                if previous[j] and previous[j] ~= value then
+                    redis.call('SREM', index.prefix .. previous[j], index.member)
+                end
+                if value then
+                    redis.call('SADD', index.prefix .. value, index.member)
+                end
+            end
+        end
+        results[i] = redis.call('HGETALL', key)
+    end
+end
+
+return results
+"""
+
+
+def _live(r: backends.MemoryBackend, key: str) -> bool:
+    return bool(r.exists(key)) and not r.hexists(key, "_deleted")
+
+
+@backends.emulate(WRITE)
+def _write(r: backends.MemoryBackend, keys: List[str], args: List[str]) -> List[Any]:
+    ops = json.loads(args[1])
+
+    skipped = set()
+    for i, op in enumerate(ops):
+        key = keys[i]
+        if op.get("version") is not None:
+            current = r.hget(key, "_version")
+            current = int(current) if current is not None else -1
+            if current != op["version"]:
+                raise redis.ResponseError(
+                    f"CONFLICT Version mismatch on {key}: on server {current}, on instance {op['version']}."
+                )
+        if op.get("live") and not _live(r, key):
+            skipped.add(i)
+        for required in op.get("requires") or []:
+            if not _live(r, required):
+                raise redis.ResponseError(f"MISSING {required} does not exist.")
+        claim = op.get("claim")
+        if claim and i not in skipped:
+            owner = r.hget(claim["hash"], claim["field"])
+            if owner is not None and owner != claim["value"]:
+                raise redis.ResponseError(f"TAKEN {claim['field']} is already linked to {owner}.")
+
+    results = []
+    for i, op in enumerate(ops):
+        key = keys[i]
+        if i in skipped:
+            results.append(False)
+            continue
+
+        indexes = op.get("indexes") or []
+        was_deleted = r.hexists(key, "_deleted")
+        previous = [None if was_deleted else r.hget(key, index["field"]) for index in indexes]
+
+        flush = op.get("flush")
+        if flush:
+            stale = [
+                existing for existing in r.hkeys(key)
+                if any(existing == field or existing.startswith(field + ":") for field in flush)
+            ]
+            if stale:
+                r.hdel(key, *stale)
+        if op.get("set"):
+            r.hset(key, mapping=op["set"])
+        if op.get("bump"):
+            r.hincrby(key, "_version", 1)
+            r.hset(key, "_edited", args[0])
+        if op.get("claim"):
+            r.hset(op["claim"]["hash"], op["claim"]["field"], op["claim"]["value"])
+        if op.get("register"):
+            r.zadd(op["register"]["zset"], {op["register"]["member"]: op["register"]["score"]}, nx=True)
+        if op.get("drop"):
+            r.delete(*op["drop"])
+
+        deleted = r.hexists(key, "_deleted")
+        for lookup in op.get("lookups") or []:
+            value = r.hget(key, lookup["field"])
+            if value is not None and not deleted:
+                r.hset(lookup["hash"], lookup["member"], value)
+            else:
+                r.hdel(lookup["hash"], lookup["member"])
+        for index, before in zip(indexes, previous):
+            value = None if deleted else r.hget(key, index["field"])
+            if before is not None and before != value:
+                r.srem(index["prefix"] + before, index["member"])
+            if value is not None:
+                r.sadd(index["prefix"] + value, index["member"])
+
+        results.append([item for pair in r.hgetall(key).items() for item in pair])
+
+    return results
+
+
+# Creates an object under the first free key among candidates - id collisions are retried server side:
+# KEYS:    the candidate keys, then the class registry sorted set - unless ARGV[2] is empty
+# ARGV[1]: JSON {field: value} flat mapping of the object
+# ARGV[2]: registry score - empty not to register the object, e.g. when the registry lives in another cluster slot
+# ARGV[3]: length of the key prefix, stripped from the key to get the registry member (the id)
+# Returns the 1-based index of the key used.
+CREATE = """
+local registered = ARGV[2] ~= ''
+local candidates = registered and #KEYS - 1 or #KEYS
+local mapping = cjson.decode(ARGV[1])
+
+for i = 1, candidates do
+    local key = KEYS[i]
+    if redis.call('EXISTS', key) == 0 then
+        for field, value in pairs(mapping) do
+            redis.call('HSET', key, field, value)
+        end
+        if registered then
+            redis.call('ZADD', KEYS[#KEYS], 'NX', ARGV[2], string.sub(key, tonumber(ARGV[3]) + 1))
+        end
+        return i
+    end
+end
+
+return redis.error_reply('TAKEN All ' .. candidates .. ' candidate keys are taken.')
+"""
+
+
+@backends.emulate(CREATE)
+def _create(r: backends.MemoryBackend, keys: List[str], args: List[str]) -> int:
+    registered, mapping = args[1] != "", json.loads(args[0])
+    candidates = keys[:-1] if registered else keys
+
+    for i, key in enumerate(candidates, 1):
+        if not r.exists(key):
+            if mapping:
+                r.hset(key, mapping=mapping)
+            if registered:
+                r.zadd(keys[-1], {key[int(args[2]):]: args[1]}, nx=True)
+            return i
+
+    raise redis.ResponseError(f"TAKEN All {len(candidates)} candidate keys are taken.")
+
+
+# Removes a key from its indexes (see WRITE's), according to the current values of its fields:
+# KEYS[1]: the key
+# ARGV[1]: JSON list of indexes [{field, prefix, member}]
+UNINDEX = """
+for _, index in ipairs(cjson.decode(ARGV[1])) do
+    local value = redis.call('HGET', KEYS[1], index.field)
+    if value then
+        redis.call('SREM', index.prefix .. value, index.member)
+    end
+end
+return true
+"""
+
+
+@backends.emulate(UNINDEX)
+def _unindex(r: backends.MemoryBackend, keys: List[str], args: List[str]) -> bool:
+    for index in json.loads(args[0]):
+        value = r.hget(keys[0], index["field"])
+        if value is not None:
+            r.srem(index["prefix"] + value, index["member"])
+    return True
+
+
+# Pages through a sorted set in rank order, resuming after a given member:
+# KEYS[1]: the sorted set
+# ARGV[1]: the member to resume after - empty to start from the beginning
+# ARGV[2]: the page size
+# Returns the members of the page - an error if the member to resume after is not in the set (anymore).
+PAGE = """
+local start = 0
+if ARGV[1] ~= '' then
+    local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+    if rank then
+        start = rank + 1
+    elseif ARGV[3] ~= '' then
+        -- the after object left the registry: resume from its place, past lower scores then lower ids of its score
+        start = redis.call('ZCOUNT', KEYS[1], '-inf', '(' .. ARGV[3])
+        for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[3], ARGV[3])) do
+            if id < ARGV[1] then
+                start = start + 1
+            end
+        end
+    else
+        return redis.error_reply('MISSING ' .. ARGV[1] .. ' is not in ' .. KEYS[1] .. '.')
+    end
+end
+return redis.call('ZRANGE', KEYS[1], start, start + tonumber(ARGV[2]) - 1, 'WITHSCORES')
+"""
+
+
+@backends.emulate(PAGE)
+def _page(r: backends.MemoryBackend, keys: List[str], args: List[str]) -> List[str]:
+    start = 0
+    if args[0] != "":
+        rank = r.zrank(keys[0], args[0])
+        if rank is not None:
+            start = rank + 1
+        elif args[2] != "":
+            start = r.zcount(keys[0], "-inf", f"({args[2]}")
+            start += sum(1 for id in r.zrangebyscore(keys[0], args[2], args[2]) if id < args[0])
+        else:
+            raise redis.ResponseError(f"MISSING {args[0]} is not in {keys[0]}.")
+    entries = r.zrange(keys[0], start, start + int(args[1]) - 1, withscores=True)
+    return [value for id, score in entries for value in (id, f"{score:.17g}")]
+
+
+_scripts: Dict[str, redis.commands.core.Script] = {}
+
+
+def run(source: str, keys: List[str], args: List[Any], client=None) -> Any:
+    """
+    Runs a script through EVALSHA, loading it on the server the first time.
+
+    Args:
+        source: the Lua source, e.g. one of the constants of this module
+        keys: the Redis keys the script touches
+        args: the script arguments
+        client: Redis client or pipeline to run the script with (defaults to the global client)
+    """
+    client = client or get_redis_client()
+
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = client.register_script(source)
+
+    return script(keys=keys, args=args, client=client)
+
+
+def write(operations: List[Dict[str, Any]], client=None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Applies write operations atomically, in a single round trip, through the WRITE script.
+
+    Args:
+        operations: the operations to apply, each with its target "key" (see WRITE for the other entries)
+        client: Redis client to run the script with (defaults to the global client)
+
+    Returns:
+        The resulting hash of each operation, or None for skipped ones
+
+    Raises:
+        ConflictError: an operation's expected version did not match - nothing was written
+        RelationError: an operation's claim was already taken - nothing was written
+        ValueError: a key required by an operation does not exist - nothing was written
+    """
+    if not operations:
+        return []
+
+    try:
+        replies = run(WRITE, *write_args(operations), client=client)
+    except redis.ResponseError as e:
+        raise write_error(e)
+
+    return write_results(replies)
+
+
+def write_args(operations: List[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+    """The keys and arguments of the WRITE script applying operations - see write()."""
+    # Keys written to on top of the operations' own (indexes) are declared after them
+    keys = [operation["key"] for operation in operations]
+    keys += [lookup["hash"] for operation in operations for lookup in operation.get("lookups", [])]
+    keys += [operation["claim"]["hash"] for operation in operations if "claim" in operation]
+    keys += [operation["register"]["zset"] for operation in operations if "register" in operation]
+    keys += [required for operation in operations for required in operation.get("requires", [])]
+    keys += [dropped for operation in operations for dropped in operation.get("drop", [])]
+    ops = [{k: v for k, v in operation.items() if k != "key"} for operation in operations]
+
+    return keys, [now(), dumps(ops)]
+
+
+def write_results(replies: List[Any]) -> List[Optional[Dict[str, Any]]]:
+    """The resulting hashes of a WRITE script reply - see write()."""
+    return [hash_reply(reply) if reply else None for reply in replies]
+
+
+def write_error(e: redis.ResponseError) -> Exception:
+    """Translates a WRITE script error into the ORM exception to raise - see write()."""
+    message = str(e)
+    if message.startswith("CONFLICT "):
+        return ConflictError(message[len("CONFLICT "):])
+    if message.startswith("TAKEN "):
+        return RelationError(message[len("TAKEN "):])
+    if message.startswith("MISSING "):
+        return ValueError(message[len("MISSING "):])
+    return e
+
+
+def create(
+    candidates: List[str], mapping: Dict[str, str], registry: Optional[str], score: int, prefix_length: int,
+    client=None
+) -> str:
+    """
+    Creates an object atomically, in a single round trip, through the CREATE script.
+
+    Args:
+        candidates: the keys to try, in order - the first free one is used
+        mapping: the flat hash fields of the object, encoded
+        registry: the key of the class registry, see ObjectMixin.page() - None not to register the object
+        score: the registry score of the object
+        prefix_length: the length of the candidates' prefix - what follows is the id
+        client: Redis client to run the script with (defaults to the global client)
+
+    Returns:
+        The key used
+
+    Raises:
+        ConflictError: all candidate keys are taken - nothing was written
+    """
+    try:
+        if registry is None:
+            index = run(CREATE, keys=candidates, args=[dumps(mapping), "", prefix_length], client=client)
+        else:
+            index = run(CREATE, keys=[*candidates, registry], args=[dumps(mapping), score, prefix_length], client=client)
+    except redis.ResponseError as e:
+        if str(e).startswith("TAKEN "):
+            raise ConflictError(str(e)[len("TAKEN "):])
+        raise
+
+    return candidates[index - 1]
+
+
+def encode(value: Any) -> str:
+    """Encodes a field value the way redis-py would, so that it can travel within a JSON script argument."""
+    if isinstance(value, bool) or not isinstance(value, (str, bytes, int, float)):
+        raise redis.DataError(
+            f"Invalid input of type: '{type(value).__name__}'. Convert to a bytes, string, int or float first."
+        )
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def dumps(value: Any) -> str:
+    """Serializes a script argument to JSON."""
+    return json.dumps(value, separators=(",", ":"))
+
+
+def hash_reply(reply: List[Any]) -> Dict[str, Any]:
+    """Converts a flat [field, value, ...] script reply, such as HGETALL's, into a dict."""
+    return dict(zip(reply[::2], reply[1::2]))
@@ -5,7 +5,7 @@ Self-contained implementations without external dependencies.
 
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 from nanoid import generate as nanoid_generate
 
 
@@ -28,7 +28,8 @@ def new_id(size=10) -> str:
 
 def flatten(data: Dict[str, Any], prefix: str = "", out: Dict[str, Any] = None) -> Dict[str, Any]:
     """
-    Recursively flattens a nested dictionary.
+    Flattens a nested dictionary.
+    None values and empty dictionaries hold nothing to store: they are left out, at any depth.
 
     Args:
         data: The dictionary to flatten.
@@ -40,36 +41,91 @@ def flatten(data: Dict[str, Any], prefix: str = "", out: Dict[str, Any] = None)
     """
     if out is None:
         out = {}
-        
-    if isinstance(data, dict):
-        for k, v in data.items():
-            new_key = f"{prefix}:{k}".strip(":")
-            flatten(v, new_key, out)
-    else:
-        out[prefix] = data
-        
+
+    if not isinstance(data, dict):
+        if data is not None:
+            out[prefix] = data
+        return out
+
+    # depth-first, without recursion - keys are only joined once per nesting level
+    stack = [(prefix, data)]
+    while stack:
+        prefix, node = stack.pop()
+        for k, v in node.items():
+            key = f"{prefix}:{k}" if prefix else str(k)
+            if isinstance(v, dict):
+                stack.append((key, v))
+            elif v is not None:
+                out[key] = v
+
     return out
 
 
-def unflatten(d: Dict[str, Any]) -> Dict[str, Any]:
+# Bound of each split paths cache - flattened keys embed object ids, so their number is open-ended
+PATHS_CACHE_SIZE = 50_000
+_PATHS: Dict[str, Tuple[Tuple[str, ...], str]] = {}
+
+
+def split_path(key: str, paths: Dict[str, Tuple[Tuple[str, ...], str]] = None) -> Tuple[Tuple[str, ...], str]:
+    """
+    Splits a flattened key into its parent keys and its leaf key, e.g. "a:b:c" -> (("a", "b"), "c").
+    Siblings share the very same parents tuple, which lets unflatten() skip walking down to their parent again.
+
+    Args:
+        key: The flattened key.
+        paths: The cache memoizing splits - a module-wide one by default. Cleared once it holds PATHS_CACHE_SIZE keys.
+    """
+    if paths is None:
+        paths = _PATHS
+
+    try:
+        return paths[key]
+    except KeyError:
+        if len(paths) >= PATHS_CACHE_SIZE:
+            paths.clear()
+        *parents, leaf = key.split(":")
+        parents = tuple(parents)
+        # parents tuples are cached as well, under their own (colon-free) tuple key
+        parents = paths.setdefault(parents, parents)
+        split = paths[key] = (parents, leaf)
+        return split
+
+
+def unflatten(d: Dict[str, Any], paths: Dict[str, Tuple[Tuple[str, ...], str]] = None) -> Dict[str, Any]:
     """
     Reconstructs a nested dictionary from a flattened dictionary.
+    Whatever the keys order, nested keys take precedence over a flat value at the same path - e.g. a legacy
+    empty marker "email": "" next to "email:provider".
 
     Args:
         d: The flattened dictionary where keys are concatenated with colons.
+        paths: The cache memoizing key splits, see split_path() - e.g. a model class' own.
 
     Returns:
         A nested dictionary reconstructed from the flattened dictionary.
     """
+    if paths is None:
+        paths = _PATHS
+
     result = {}
+    last_parents, node = None, result
     for k, v in d.items():
-        keys = k.split(':')
-        temp = result
-        for key in keys[:-1]:
-            if key not in temp or not isinstance(temp[key], dict):
-                temp[key] = {}
-            temp = temp[key]
-        final_key = keys[-1]
-        temp[final_key] = v
-    
-    return result 
\ No newline at end of file
+        if ":" not in k:
+            if not isinstance(result.get(k), dict):
+                result[k] = v
+            continue
+
+        split = paths.get(k)
+        parents, leaf = split if split is not None else split_path(k, paths)
+        if parents is not last_parents:
+            node = result
+            for key in parents:
+                child = node.get(key)
+                if not isinstance(child, dict):
+                    child = node[key] = {}
+                node = child
+            last_parents = parents
+        if not isinstance(node.get(leaf), dict):
+            node[leaf] = v
+
+    return result
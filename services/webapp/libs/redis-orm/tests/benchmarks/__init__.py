@@ -0,0 +1,9 @@
+"""
+Benchmarks for Redis ORM.
+
+Each module is a standalone script that runs against the Redis instance
+configured through REDIS_HOST/REDIS_PORT/REDIS_DATA_DB, e.g.:
+
+    cd tests/
+    python -m benchmarks.new_round
+"""
@@ -0,0 +1,64 @@
+"""
+Attribute access cost and memory footprint of ORM instances.
+
+Runs in memory only - instances are hydrated from raw data, no Redis needed.
+
+    python -m benchmarks.attributes
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+from .models import Player, Members
+
+N = 10_000
+
+
+def hydrate(count: int) -> list:
+    """Builds count relations, the way a member listing does."""
+    return [
+        Members(
+            f"{Members.NAME}:player_{i:010x}:table_{i:010x}",
+            data={"role": "player", "next": "player", "status": "online"},
+            meta={"_created": "2024-01-01T12:00:00Z", "_edited": "2024-01-01T12:00:00Z", "_version": 3},
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    player = Player("player:0123456789", data={"name": "Alice"}, meta={"_version": 0})
+    relation = hydrate(1)[0]
+
+    timings = {
+        "field read": lambda: player.name,
+        "field write": lambda: setattr(player, "name", "Bob"),
+        "meta read": lambda: player._version,
+        "object id": lambda: player.id,
+        "relation left_id": lambda: relation.left_id,
+        "relation right_id": lambda: relation.right_id,
+    }
+
+    print(f"{'operation':<20} {'ns/op':>8}")
+    for label, func in timings.items():
+        seconds = min(timeit.repeat(func, number=100_000, repeat=5)) / 100_000
+        print(f"{label:<20} {seconds * 1e9:>8.1f}")
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    relations = hydrate(N)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+    # leave out the key strings, whatever the instance layout
+    size -= sum(sys.getsizeof(relation.key) for relation in relations)
+
+    hydration = min(timeit.repeat(lambda: hydrate(1000), number=10, repeat=3)) / 10_000
+    print(f"{'hydration':<20} {hydration * 1e9:>8.1f} ns/instance")
+    print(f"{'memory':<20} {size / N:>8.1f} bytes/instance (excluding key strings)")
+
+
+if __name__ == "__main__":
+    main()
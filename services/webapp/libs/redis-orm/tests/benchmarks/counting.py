@@ -0,0 +1,65 @@
+"""
+Round trip and command accounting for benchmarks.
+
+Counts what actually goes over the wire: a pipeline or a script call is one
+round trip, whatever the number of commands it carries.
+"""
+
+import os
+import redis
+
+
+class Counter:
+    """Round trips and commands sent to Redis since the last reset."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.round_trips = 0
+        self.commands = 0
+
+    def snapshot(self) -> dict:
+        return {"round_trips": self.round_trips, "commands": self.commands}
+
+
+COUNTER = Counter()
+
+
+class CountingConnection(redis.Connection):
+    """A Redis connection which accounts for every round trip and command in COUNTER."""
+
+    def send_packed_command(self, command, check_health=True):
+        COUNTER.round_trips += 1
+        return super().send_packed_command(command, check_health)
+
+    def send_command(self, *args, **kwargs):
+        COUNTER.commands += 1
+        return super().send_command(*args, **kwargs)
+
+    def pack_commands(self, commands):
+        commands = list(commands)
+        COUNTER.commands += len(commands)
+        return super().pack_commands(commands)
+
+
+def counting_client() -> redis.Redis:
+    """Creates a Redis client from the environment, whose traffic is accounted for in COUNTER."""
+    if not os.environ.get("REDIS_HOST"):
+        raise SystemExit("❌ REDIS_HOST environment variable required")
+
+    pool = redis.ConnectionPool(
+        connection_class=CountingConnection,
+        host=os.environ["REDIS_HOST"],
+        port=int(os.environ.get("REDIS_PORT", "6379")),
+        db=int(os.environ.get("REDIS_DATA_DB", "1")),
+        decode_responses=True,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def measure(func, *args, **kwargs) -> dict:
+    """Runs func and returns the round trips and commands it cost."""
+    COUNTER.reset()
+    func(*args, **kwargs)
+    return COUNTER.snapshot()
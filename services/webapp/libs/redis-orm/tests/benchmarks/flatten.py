@@ -0,0 +1,58 @@
+"""
+flatten/unflatten cost over realistic room shapes, whose cards:*:peeked:* fan-out grows as players x members.
+
+Runs in memory only, no Redis needed.
+
+    python -m benchmarks.flatten
+"""
+
+import random
+import timeit
+
+from core.utils import flatten, unflatten
+
+from .models import Table
+
+SIZES = [2, 5, 10, 20, 50]
+
+
+def room(players: int) -> dict:
+    """The data of a room in the middle of a round, with as many members as players."""
+    members = [f"{i:010x}" for i in range(players)]
+    return {
+        "name": f"Table of {players}",
+        "round": {"id": "0123456789", "topic": "Top 10 of the best cheeses", "turn": members[0]},
+        "cards": {
+            f"c{i:09x}": {
+                "flipped": "False",
+                "player_id": user_id,
+                "peeked": {u_id: "False" for u_id in members},
+                "value": str(i + 1),
+            }
+            for i, user_id in enumerate(members)
+        },
+        "messages": {
+            f"m{i:09x}": {"user_id": user_id, "content": "hello", "reactions": {}}
+            for i, user_id in enumerate(members)
+        },
+    }
+
+
+def main():
+    print(f"{'players':>8} {'fields':>8} {'flatten us':>11} {'unflatten us':>13} {'shuffled us':>12}")
+    for size in SIZES:
+        data = room(size)
+        flat = flatten(data)
+        # large hashes come back from HGETALL in no particular order
+        items = list(flat.items())
+        random.shuffle(items)
+        shuffled = dict(items)
+
+        flatten_s = min(timeit.repeat(lambda: flatten(data), number=200, repeat=5)) / 200
+        unflatten_s = min(timeit.repeat(lambda: unflatten(flat, Table._PATHS), number=200, repeat=5)) / 200
+        shuffled_s = min(timeit.repeat(lambda: unflatten(shuffled, Table._PATHS), number=200, repeat=5)) / 200
+        print(f"{size:>8} {len(flat):>8} {flatten_s * 1e6:>11.1f} {unflatten_s * 1e6:>13.1f} {shuffled_s * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
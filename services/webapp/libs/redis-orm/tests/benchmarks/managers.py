@@ -0,0 +1,31 @@
+"""
+Cost of relation accessors - e.g. room.users() - which hot paths call several times per request.
+
+Runs in memory only, no Redis needed.
+
+    python -m benchmarks.managers
+"""
+
+import timeit
+
+from .models import Player, Table
+
+
+def main():
+    table = Table("table:0123456789", data={}, meta={})
+    player = Player("player:0123456789", data={}, meta={})
+
+    timings = {
+        "table.users()": lambda: table.users(),
+        "player.rooms()": lambda: player.rooms(),
+        "relation_key()": lambda: table.users().relation_key(player.id),
+    }
+
+    print(f"{'operation':<20} {'ns/op':>8}")
+    for label, func in timings.items():
+        seconds = min(timeit.repeat(func, number=100_000, repeat=5)) / 100_000
+        print(f"{label:<20} {seconds * 1e9:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark models, shaped like the Tapis Vert game models.
+"""
+
+from core import ObjectMixin, RelationMixin
+
+
+class Player(ObjectMixin):
+    FIELDS = {"name"}
+    RIGHTS = {"rooms": "benchmarks.models.Members"}
+
+
+class Table(ObjectMixin):
+    FIELDS = {"name", "round", "cards", "messages"}
+    LEFTS = {"users": "benchmarks.models.Members"}
+
+
+class Members(RelationMixin):
+    FIELDS = {"role", "next", "status"}
+    L_CLASS = Player
+    R_CLASS = Table
+    NAME = "bench:member"
+    RELATION_TYPE = "many_to_many"
+
+
+def populate(players: int) -> Table:
+    """Creates a table with players members, all of them due for promotion from watcher to player."""
+    table = Table.create(name=f"Table of {players}")
+    for i in range(players):
+        player = Player.create(name=f"Player {i}")
+        table.users().add(player.id, role="watcher", next="player", status="online")
+    return table
+
+
+def deal(table: Table, members: dict) -> None:
+    """Sets a new round on table, with one card per player, peekable by every member."""
+    table.round = {"id": "round", "topic": "Top 10"}
+    table.messages = {}
+    table.cards = {
+        f"c{i}": {
+            "flipped": "True",
+            "player_id": user_id,
+            "peeked": {u_id: "False" for u_id in members},
+            "value": str(i + 1),
+        }
+        for i, user_id in enumerate(members)
+    }
@@ -0,0 +1,60 @@
+"""
+Round trips of a new round: promoting every member's role, then saving the round state.
+
+Compares one update per member followed by the save, as new_round used to do,
+with the promotions batched into the save itself.
+
+    python -m benchmarks.new_round
+"""
+
+from core import set_redis_client
+
+from .counting import counting_client, measure
+from .models import Table, populate, deal
+
+SIZES = [2, 5, 10, 20, 50]
+
+
+def one_by_one(table: Table) -> None:
+    users = table.users().all()
+    for user_id, relation in users.items():
+        if relation.next:
+            table.users().set(user_id, role=relation.next)
+    users = table.users().all()
+    deal(table, users)
+    table.save()
+
+
+def batched(table: Table) -> None:
+    users = table.users().all()
+    promotions = {
+        user_id: {"role": relation.next}
+        for user_id, relation in users.items()
+        if relation.next and relation.next != relation.role
+    }
+    deal(table, users)
+    table.save(*table.users().updates(promotions))
+
+
+def main():
+    client = counting_client()
+    set_redis_client(client)
+
+    print(f"{'members':>8} | {'one by one':>22} | {'batched':>22}")
+    print(f"{'':>8} | {'round trips':>11} {'commands':>10} | {'round trips':>11} {'commands':>10}")
+
+    for size in SIZES:
+        client.flushdb()
+        results = []
+        for scenario in (one_by_one, batched):
+            table = populate(size)
+            table.save()  # warm up: loads scripts on the server
+            results.append(measure(scenario, Table.get_by_id(table.id)))
+
+        print(" | ".join([f"{size:>8}"] + [f"{r['round_trips']:>11} {r['commands']:>10}" for r in results]))
+
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
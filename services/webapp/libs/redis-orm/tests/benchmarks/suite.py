@@ -0,0 +1,335 @@
+"""
+The ORM benchmark suite: latency, round trips and allocations of core operations - create, get, save, patch,
+relation listing, to_dict(True), search, delete and flatten/unflatten - across object sizes and relation fan-outs.
+
+Runs in memory, and on the Redis instance configured through REDIS_HOST/REDIS_PORT/REDIS_DATA_DB when set
+(flushing its database). Results are saved as JSON, to compare runs across commits:
+
+    python -m benchmarks.suite --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite --compare results/before.json results/after.json
+
+Round trips and commands are counted by core.accounting; allocations by tracemalloc, in a pass of their own
+so as not to slow down the timed one.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from core import accounting, create_client, set_redis_client
+from core.utils import flatten, unflatten
+
+from .models import Player, Table
+
+SIZES = [1, 10, 100]  # messages per table, 3 fields each
+FAN_OUTS = [1, 10, 50]  # members per table
+ITERATIONS = 100
+WARMUP = 5
+ALLOCATION_ITERATIONS = 20
+
+Setup = Optional[Callable[[], Any]]
+Run = Callable[[Any], Any]
+
+
+def messages(size: int) -> dict:
+    return {f"m{i:09x}": {"user_id": f"{i:010x}", "content": f"Message {i}", "sent": "2024-01-01T12:00:00Z"} for i in range(size)}
+
+
+class Fixture:
+    """A table of size messages, with fan_out members."""
+
+    def __init__(self, size: int, fan_out: int):
+        self.size = size
+        self.players = [Player.create(name=f"Player {i}") for i in range(fan_out)]
+        self.table = self.copy()
+
+    def copy(self) -> Table:
+        """A new table, with the same data and members."""
+        table = Table.create(name=f"Table of {len(self.players)}", messages=messages(self.size))
+        for player in self.players:
+            table.users().add(player.id, role="player", next="player", status="online")
+        return table
+
+
+# Each operation builds its (untimed) setup, run once per iteration, and the timed run of its result
+def create(fixture: Fixture) -> Tuple[Setup, Run]:
+    data = fixture.table.data
+    return None, lambda _: Table.create(**data)
+
+
+def get(fixture: Fixture) -> Tuple[Setup, Run]:
+    return None, lambda _: Table.get_by_id(fixture.table.id)
+
+
+def save(fixture: Fixture) -> Tuple[Setup, Run]:
+    table = Table.get_by_id(fixture.table.id)
+    return None, lambda _: table.save()
+
+
+def patch(fixture: Fixture) -> Tuple[Setup, Run]:
+    return None, lambda _: Table.patch(fixture.table.id, "name", "Renamed")
+
+
+def relations(fixture: Fixture) -> Tuple[Setup, Run]:
+    return None, lambda _: fixture.table.users().all()
+
+
+def to_dict(fixture: Fixture) -> Tuple[Setup, Run]:
+    return None, lambda _: fixture.table.to_dict(True)
+
+
+def search(fixture: Fixture) -> Tuple[Setup, Run]:
+    return None, lambda _: Table.search()
+
+
+def delete(fixture: Fixture) -> Tuple[Setup, Run]:
+    return fixture.copy, lambda table: table.delete()
+
+
+def flatten_data(fixture: Fixture) -> Tuple[Setup, Run]:
+    data = fixture.table.data
+    return None, lambda _: flatten(data)
+
+
+def unflatten_data(fixture: Fixture) -> Tuple[Setup, Run]:
+    flat = flatten(fixture.table.data)
+    return None, lambda _: unflatten(flat, Table._PATHS)
+
+
+# Operations, with the axes they vary along - and whether they reach the backend
+OPERATIONS = {
+    "create": (create, ("size",), True),
+    "get": (get, ("size",), True),
+    "save": (save, ("size",), True),
+    "patch": (patch, ("size",), True),
+    "users().all()": (relations, ("fan_out",), True),
+    "to_dict(True)": (to_dict, ("size", "fan_out"), True),
+    "search": (search, ("size", "fan_out"), True),
+    "delete": (delete, ("size", "fan_out"), True),
+    "flatten": (flatten_data, ("size",), False),
+    "unflatten": (unflatten_data, ("size",), False),
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile of sorted values, by nearest rank."""
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def median(values: List[float]) -> float:
+    return percentile(sorted(values), 50)
+
+
+def measure(setup: Setup, run: Run, iterations: int, allocations: int) -> dict:
+    """Times run over iterations, counting its Redis usage - then its allocations over a few more."""
+    for _ in range(WARMUP):  # e.g. loads scripts on the server
+        run(setup() if setup else None)
+
+    latencies, round_trips, commands, bytes_out, bytes_in = [], [], [], [], []
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            argument = setup() if setup else None
+            usage = accounting.start()
+            started = time.perf_counter()
+            run(argument)
+            latencies.append(time.perf_counter() - started)
+            accounting.detach()
+            round_trips.append(usage.round_trips)
+            commands.append(usage.commands)
+            bytes_out.append(usage.bytes_out)
+            bytes_in.append(usage.bytes_in)
+    finally:
+        gc.enable()
+
+    allocated, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(allocations):
+            argument = setup() if setup else None
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run(argument)
+            current, peak = tracemalloc.get_traced_memory()
+            allocated.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "latency_us": {
+            "min": latencies[0] * 1e6,
+            "p50": percentile(latencies, 50) * 1e6,
+            "p90": percentile(latencies, 90) * 1e6,
+            "p99": percentile(latencies, 99) * 1e6,
+            "max": latencies[-1] * 1e6,
+            "mean": sum(latencies) / len(latencies) * 1e6,
+        },
+        "round_trips": max(round_trips),
+        "commands": max(commands),
+        "bytes_out": median(bytes_out),
+        "bytes_in": median(bytes_in),
+        "allocated_bytes": median(allocated) if allocated else None,
+        "retained_bytes": median(retained) if retained else None,
+    }
+
+
+def cases(axes: Tuple[str, ...], sizes: List[int], fan_outs: List[int]):
+    """The (size, fan_out) cases of an operation - None along the axes it does not vary along."""
+    return itertools.product(sizes if "size" in axes else [None], fan_outs if "fan_out" in axes else [None])
+
+
+def run_suite(backends: List[str], operations: List[str], sizes: List[int], fan_outs: List[int],
+              iterations: int, allocations: int) -> List[dict]:
+    results = []
+    for backend in backends + ["python"]:
+        if backend != "python":
+            client = create_client(backend)
+            set_redis_client(client)
+
+        for name in operations:
+            build, axes, io = OPERATIONS[name]
+            if io == (backend == "python"):
+                continue
+            for size, fan_out in cases(axes, sizes, fan_outs):
+                if backend != "python":
+                    client.flushdb()
+                fixture = Fixture(size or 0, fan_out or 0)
+                setup, run = build(fixture)
+                result = {"backend": backend, "operation": name, "size": size, "fan_out": fan_out}
+                result.update(measure(setup, run, iterations, allocations))
+                results.append(result)
+                report(result)
+
+        if backend != "python":
+            client.flushdb()
+    return results
+
+
+def metadata(backends: List[str], iterations: int) -> dict:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    redis_version = None
+    if "redis" in backends:
+        try:
+            redis_version = create_client("redis").info("server").get("redis_version")
+        except redis.ResponseError:  # e.g. a Redis stand-in without INFO
+            pass
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "redis": redis_version,
+        "iterations": iterations,
+    }
+
+
+HEADER = f"{'backend':<8} {'operation':<14} {'size':>5} {'fan-out':>7} {'p50 us':>9} {'p99 us':>9} {'trips':>6} {'cmds':>6} {'alloc KB':>9}"
+
+
+def axis(value: Optional[int]) -> str:
+    return "-" if value is None else str(value)
+
+
+def report(result: dict) -> None:
+    latency = result["latency_us"]
+    allocated = "-" if result["allocated_bytes"] is None else f"{result['allocated_bytes'] / 1024:.1f}"
+    print(
+        f"{result['backend']:<8} {result['operation']:<14} {axis(result['size']):>5} {axis(result['fan_out']):>7} "
+        f"{latency['p50']:>9.1f} {latency['p99']:>9.1f} {result['round_trips']:>6} {result['commands']:>6} {allocated:>9}"
+    )
+
+
+def compare(before_path: str, after_path: str) -> int:
+    """Prints the changes between two saved runs - returns 1 if any round trips or commands were added."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    for field in ("python", "redis", "platform"):
+        if before["meta"].get(field) != after["meta"].get(field):
+            print(f"⚠️  {field} differs: {before['meta'].get(field)} -> {after['meta'].get(field)}")
+
+    def index(run: dict) -> Dict[tuple, dict]:
+        return {(r["backend"], r["operation"], r["size"], r["fan_out"]): r for r in run["results"]}
+
+    previous = index(before)
+    regressed = False
+    print(f"{'backend':<8} {'operation':<14} {'size':>5} {'fan-out':>7} {'p50 us':>21} {'trips':>9} {'cmds':>9}")
+    for key, result in index(after).items():
+        old = previous.get(key)
+        if old is None:
+            continue
+        p50, old_p50 = result["latency_us"]["p50"], old["latency_us"]["p50"]
+        change = (p50 - old_p50) / old_p50 * 100 if old_p50 else 0.0
+        flag = ""
+        if result["round_trips"] > old["round_trips"] or result["commands"] > old["commands"]:
+            flag = "  ❌ more Redis traffic"
+            regressed = True
+        backend, operation, size, fan_out = key
+        print(
+            f"{backend:<8} {operation:<14} {axis(size):>5} {axis(fan_out):>7} "
+            f"{old_p50:>8.1f} -> {p50:>8.1f} {change:>+4.0f}% "
+            f"{old['round_trips']:>3} -> {result['round_trips']:<3} {old['commands']:>3} -> {result['commands']:<3}{flag}"
+        )
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", action="append", choices=["memory", "redis"],
+                        help="backends to run on (default: memory, and redis when REDIS_HOST is set)")
+    parser.add_argument("--operation", action="append", choices=list(OPERATIONS), help="operations (default: all)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="messages per table")
+    parser.add_argument("--fan-outs", type=int, nargs="+", default=FAN_OUTS, help="members per table")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="timed iterations per case")
+    parser.add_argument("--allocations", type=int, default=ALLOCATION_ITERATIONS,
+                        help="iterations traced for allocations per case (0 to skip)")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved runs instead")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare))
+
+    backends = args.backend or (["memory", "redis"] if os.environ.get("REDIS_HOST") else ["memory"])
+    if "redis" in backends and not os.environ.get("REDIS_HOST"):
+        raise SystemExit("❌ REDIS_HOST environment variable required")
+    if not accounting.enabled():
+        print("⚠️  REDIS_ACCOUNTING is disabled: round trips and commands will read 0")
+
+    meta = metadata(backends, args.iterations)
+    print(HEADER)
+    results = run_suite(backends, args.operation or list(OPERATIONS), args.sizes, args.fan_outs,
+                        args.iterations, args.allocations)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,30 @@
 """
 Pytest configuration for Redis ORM tests.
-Uses real Redis instance for all testing.
+Uses real Redis instance for all testing - or the memory backend, with REDIS_BACKEND=memory.
 """
 
 import os
 import pytest
 import redis
-from core import set_redis_client, reset_connection
+from core import set_redis_client, reset_connection, create_client
 
 
 def pytest_configure():
-    """Configure pytest to use real Redis."""
-    # Require REDIS_HOST to be set for all tests
-    if not os.environ.get('REDIS_HOST'):
-        pytest.exit("Tests require REDIS_HOST environment variable. Use Docker: ./test.sh")
+    """Configure pytest to use real Redis, unless the memory backend is selected."""
+    # Require REDIS_HOST to be set for all tests on Redis
+    if os.environ.get('REDIS_BACKEND') != 'memory' and not os.environ.get('REDIS_HOST'):
+        pytest.exit("Tests require REDIS_HOST environment variable (or REDIS_BACKEND=memory). Use Docker: ./test.sh")
 
 
 @pytest.fixture(scope="function")
 def redis_client():
-    """Provide a real Redis client for each test."""
+    """Provide a real Redis client (or memory backend) for each test."""
     host = os.environ.get('REDIS_HOST', 'localhost')
     port = int(os.environ.get('REDIS_PORT', '6379'))
     db = int(os.environ.get('REDIS_DATA_DB', '1'))
     
     # Create real Redis client
-    client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+    client = create_client(host=host, port=port, db=db, decode_responses=True)
     
     # Test connection
     try:
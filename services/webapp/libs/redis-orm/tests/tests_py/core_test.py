@@ -2,18 +2,27 @@
 Tests for core Redis ORM functionality.
 """
 
+import asyncio
 import pytest
 import sys
 import os
+import threading
 sys.path.insert(0, '/app')
 # Simple Redis fixture instead of complex conf
 import redis
-from core import ObjectMixin, RelationMixin, ConflictError, ValidationError, set_redis_client, create_redis_client
+from core import ObjectMixin, RelationMixin, ConflictError, ValidationError, set_redis_client, create_client, batch
+from core import get_client, get_redis_client, pool_stats, reset_connection
+from core import accounting, read_scope, set_replica_clients
+from core.aio import Loader, create_async_client
+from core.backends import INTERFACE, SCAN_CURSORS, MemoryBackend
+from core.codecs import Json, Timestamp
+from core.connection import cluster_enabled, key_layout
+from redis.crc import key_slot
 
 # Simple Redis client fixture
 @pytest.fixture(scope="function")
 def redis_client():
-    client = create_redis_client(
+    client = create_client(
         host=os.environ.get('REDIS_HOST', 'localhost'),
         port=int(os.environ.get('REDIS_PORT', '6379')),
         db=int(os.environ.get('REDIS_DATA_DB', '1'))
@@ -38,12 +47,51 @@ class Post(ObjectMixin):
 class UserPosts(RelationMixin):
     """Test relationship model."""
     FIELDS = {"role", "created_at"}
+    LOOKUPS = {"role"}
+    INDEXES = {"role"}
     RELATION_TYPE = "one_to_many"
     L_CLASS = User
     R_CLASS = Post  
     NAME = "user:posts"
 
 
+class Game(ObjectMixin):
+    """Test model for typed fields."""
+    FIELDS = {
+        "name": str,
+        "turn": int,
+        "open": bool,
+        "started": Timestamp(),
+        "settings": Json(),
+        "cards": {"*": {"flipped": bool, "scored": int}},
+    }
+
+
+class Venue(ObjectMixin):
+    """Test model for the tagged key layout."""
+    KEY_LAYOUT = "tagged"
+    FIELDS = {"name"}
+    LEFTS = {"guests": "tests_py.core_test.Attendance"}
+
+
+class Guest(ObjectMixin):
+    """Test model for the tagged key layout."""
+    KEY_LAYOUT = "tagged"
+    FIELDS = {"name"}
+    RIGHTS = {"venues": "tests_py.core_test.Attendance"}
+
+
+class Attendance(RelationMixin):
+    """Test relationship model for the tagged key layout, anchored on venues."""
+    KEY_LAYOUT = "tagged"
+    FIELDS = {"role", "status"}
+    LOOKUPS = {"role"}
+    INDEXES = {"status"}
+    L_CLASS = Guest
+    R_CLASS = Venue
+    NAME = "attends"
+
+
 # Note: RIGHTS is now defined within the User class above
 
 
@@ -68,6 +116,82 @@ class TestObjectMixin:
         
         assert "Invalid fields" in str(exc_info.value)
 
+    def test_slots_backed_fields(self, clean_redis):
+        """Test that fields are compiled into slots, with data and meta still exposed as dicts."""
+        user = User.create(name="Alice", age=25)
+
+        assert not hasattr(user, "__dict__")
+        assert user.email is None
+        assert user.data == {"name": "Alice", "email": None, "age": 25}
+        assert user.meta["_version"] == 0
+
+        user.data["name"] = "Bob"  # a copy
+        assert user.name == "Alice"
+
+        with pytest.raises(AttributeError):
+            user.undeclared = "value"
+
+        relation = UserPosts(f"{UserPosts.NAME}:user_abc:post_d_e", data={}, meta={})
+        assert (relation.left_id, relation.right_id) == ("abc", "d_e")
+
+    def test_flatten_unflatten(self, clean_redis):
+        """Test flatten/unflatten round trips, and their handling of empty values and markers."""
+        from core import flatten, unflatten
+
+        data = {"a": {"b": {"c": "1", "d": "2"}, "e": "3"}, "f": "4", "g": None, "h": {}, "i": {"j": {}}}
+        flat = flatten(data)
+        assert flat == {"a:b:c": "1", "a:b:d": "2", "a:e": "3", "f": "4"}
+
+        paths = {}
+        assert unflatten(flat, paths) == {"a": {"b": {"c": "1", "d": "2"}, "e": "3"}, "f": "4"}
+        assert unflatten(dict(reversed(flat.items())), paths) == unflatten(flat, paths)
+
+        # nested keys take precedence over a flat value, whatever the order
+        assert unflatten({"email": "", "email:provider": "gmail"}) == {"email": {"provider": "gmail"}}
+        assert unflatten({"email:provider": "gmail", "email": ""}) == {"email": {"provider": "gmail"}}
+
+        # empty values are not stored, and read back as missing
+        user = User.create(name="Alice", email={}, age="")
+        assert User.get_by_id(user.id).email is None
+        assert User.get_by_id(user.id).age is None
+
+    def test_typed_fields(self, clean_redis):
+        """Test that typed fields are stored compactly, and read back with their type."""
+        from core import get_redis_client
+
+        game = Game.create(
+            name="Game",
+            turn=3,
+            open=True,
+            started="2024-01-15T10:00:00Z",
+            settings={"max": 4, "tags": ["a", "b"]},
+            cards={"c1": {"flipped": False, "scored": 7, "value": "5"}},
+        )
+
+        raw = get_redis_client().hgetall(game.key)
+        assert raw["open"] == "1"
+        assert raw["started"] == "1705312800"
+        assert raw["settings"] == '{"max":4,"tags":["a","b"]}'
+        assert raw["cards:c1:flipped"] == "0"
+
+        game = Game.get_by_id(game.id)
+        assert game.turn == 3
+        assert game.open is True
+        assert game.started == "2024-01-15T10:00:00Z"
+        assert game.settings == {"max": 4, "tags": ["a", "b"]}
+        assert game.cards == {"c1": {"flipped": False, "scored": 7, "value": "5"}}
+        assert isinstance(game._version, int)
+
+        # legacy string booleans are read, and patches go through codecs too
+        get_redis_client().hset(game.key, "cards:c2:flipped", "True")
+        Game.patch(game.id, "cards:c1:flipped", True)
+        game = Game.get_by_id(game.id)
+        assert game.cards["c1"]["flipped"] is True
+        assert game.cards["c2"]["flipped"] is True
+
+        with pytest.raises(ValidationError):
+            Game.update(game.id, turn="three")
+
     def test_get_by_id(self, clean_redis):
         """Test retrieving object by ID."""
         user = User.create(name="Bob", email="bob@test.com")
@@ -139,6 +263,28 @@ class TestObjectMixin:
         assert User.exists(user_id) is False
         assert User.get_by_id(user_id) is None
 
+    def test_cascade_delete(self, clean_redis, monkeypatch):
+        """Test deleting an object with its relations, and the objects related through CASCADE relations."""
+        user = User.create(name="Author")
+        posts = [Post.create(title=f"Post {i}") for i in range(3)]
+        for post in posts:
+            user.posts().add(post.id, role="author")
+
+        assert user.delete_plan() == {
+            user.key: User,
+            **{UserPosts._key(user.id, post.id): UserPosts for post in posts},
+        }
+
+        monkeypatch.setattr(User, "CASCADE", {"posts"})
+        assert user.delete() == 7  # user, 3 relations, 3 posts
+
+        assert User.get_by_id(user.id) is None
+        assert all(Post.get_by_id(post.id) is None for post in posts)
+        assert all(UserPosts.get_by_ids(user.id, post.id) is None for post in posts)
+        assert user.posts().lookup_many("role") == {}
+        assert User.count() == 0 and Post.count() == 0
+        assert all(clean_redis.ttl(post.key) > 0 for post in posts)
+
     def test_patch(self, clean_redis):
         """Test patching a single field."""
         user = User.create(name="Grace", age="25")  # Use string like current ORM
@@ -224,6 +370,76 @@ class TestObjectMixin:
         names = {user.name for user in results}
         assert names == {"Alice", "Bob"}
 
+    def test_search_iter(self, clean_redis):
+        """Test streaming all objects of a type through several SCAN pages."""
+        names = {f"user{i}" for i in range(25)}
+        for name in names:
+            User.create(name=name, email={"provider": "gmail"})
+        UserPosts.create(User.create(name="author").id, Post.create(title="Post").id)
+
+        results = User.search_iter(count=5)
+        assert iter(results) is results  # lazy
+
+        users = list(results)
+        assert {user.name for user in users} == names | {"author"}
+        assert all(isinstance(user, User) for user in users)  # no user:posts relations
+        assert all(user.email == {"provider": "gmail"} for user in users if user.name != "author")  # unflattened
+
+        relations = list(UserPosts.search_iter(count=5))
+        assert len(relations) == 1
+
+    def test_create_id_collisions(self, clean_redis, monkeypatch):
+        """Test that create() falls back on the next candidate ID when one is taken, server side."""
+        taken = User.create(name="First")
+
+        ids = iter([taken.id, "free", "unused"])
+        monkeypatch.setattr(User, "ID_GENERATOR", lambda: next(ids))
+        user = User.create(name="Second")
+        assert user.id == "free"
+        assert User.get_by_id(taken.id).name == "First"
+        assert User.get_by_id("free").name == "Second"
+        assert User.count() == 2
+
+        monkeypatch.setattr(User, "ID_GENERATOR", lambda: taken.id)
+        with pytest.raises(ConflictError):
+            User.create(name="Third")
+        assert User.get_by_id(taken.id).name == "First"
+
+    def test_registry_pages(self, clean_redis):
+        """Test listing objects out of the class registry, oldest first."""
+        users = [User.create(name=f"user{i}") for i in range(7)]
+        UserPosts.create(users[0].id, Post.create(title="Post").id)
+        assert User.count() == 7
+        assert Post.count() == 1
+
+        ids, after = [], None
+        while page := User.page(after=after, limit=3):
+            assert len(page) <= 3
+            ids += [user.id for user in page]
+            after = page[-1].id
+        assert sorted(ids) == sorted(user.id for user in users)
+        assert len(ids) == len(set(ids))
+
+        users[1].delete()
+        assert User.count() == 6
+        with pytest.raises(ValueError):
+            User.page(after=users[1].id)
+
+        # pages() goes on past objects deleted meanwhile - the last of a page included
+        seen = []
+        for page in User.pages(limit=2):
+            seen += [user.id for user in page]
+            if len(seen) == 2:
+                User.get_by_id(seen[-1]).delete()
+        assert sorted(seen) == sorted(user.id for user in users if user is not users[1])
+        users = [user for user in users if user.id not in (users[1].id, seen[1])]
+
+        # registries can be rebuilt, e.g. for objects created before them
+        clean_redis.delete(User._REGISTRY)
+        assert User.count() == 0
+        assert User.reindex() == 5
+        assert {user.id for user in User.page(limit=10)} == {user.id for user in users}
+
     def test_to_dict(self, clean_redis):
         """Test converting object to dictionary."""
         user = User.create(name="Helen", email="helen@test.com", age=28)
@@ -238,6 +454,48 @@ class TestObjectMixin:
         assert "_created" in user_data
         assert "_version" in user_data
 
+    def test_to_dict_prefetch_related(self, clean_redis):
+        """Test that eager-loaded related objects match the lazily loaded ones."""
+        user = User.create(name="Ivy")
+        post1 = Post.create(title="Post 1")
+        post2 = Post.create(title="Post 2")
+
+        user.posts().add(post1.id, role="author")
+        user.posts().add(post2.id, role="editor")
+
+        eager = user.to_dict(include_related=True)
+        lazy = user.to_dict(include_related=True, prefetch=False)
+
+        assert eager == lazy
+        posts = eager[user.id]["posts"]
+        assert set(posts) == {post1.id, post2.id}
+        assert posts[post1.id]["title"] == "Post 1"
+        assert posts[post2.id]["relation"]["role"] == "editor"
+
+    def test_to_dicts_batch(self, clean_redis):
+        """Test serializing several objects with their relations at once."""
+        alice = User.create(name="Alice")
+        bob = User.create(name="Bob")
+        post = Post.create(title="Shared")
+        orphan = Post.create(title="Orphan")
+
+        alice.posts().add(post.id, role="author")
+        bob.posts().add(orphan.id, role="author")
+        orphan.delete()
+
+        data = User.to_dicts([alice, bob], include_related=True)
+
+        assert data[alice.id]["posts"][post.id]["title"] == "Shared"
+        assert data[bob.id]["posts"] == {}  # deleted related objects are left out
+
+        # relation keys are scanned for once, whatever the number of instances
+        def scans(instances):
+            with accounting.scope() as usage:
+                User.to_dicts(instances, include_related=True)
+            return sum(count for shape, count in usage.shapes.items() if shape.startswith("SCAN"))
+
+        assert scans([alice, bob]) == scans([alice]) > 0
+
 
 class TestRelationMixin:
     """Test RelationMixin functionality."""
@@ -296,6 +554,43 @@ class TestRelationMixin:
         assert right_obj.id == post.id
         assert right_obj.title == "Jane's Post"
 
+    def test_one_to_many_parent_pointer(self, clean_redis):
+        """Test that one-to-many children point to their parent, without scanning."""
+        user = User.create(name="Author")
+        other = User.create(name="Other")
+        post = Post.create(title="Post")
+
+        assert post.author().first() == (None, None)
+
+        user.posts().add(post.id, role="author")
+        assert UserPosts._parent(post.id) == user.id
+
+        author, relation = post.author().first()
+        assert author.id == user.id
+        assert relation.role == "author"
+
+        # Cardinality is enforced through the pointer
+        with pytest.raises(ValueError):
+            other.posts().add(post.id, role="author")
+
+        # Removing the relation frees the child
+        user.posts().remove(post.id)
+        assert UserPosts._parent(post.id) is None
+        other.posts().add(post.id, role="author")
+        assert post.author().first()[0].id == other.id
+
+    def test_one_to_many_reindex(self, clean_redis):
+        """Test rebuilding parent pointers of relations created before they existed."""
+        user = User.create(name="Author")
+        post = Post.create(title="Post")
+        user.posts().add(post.id, role="author")
+
+        clean_redis.delete(UserPosts._parents_key(post.id))
+        assert post.author().first() == (None, None)
+
+        UserPosts.reindex()
+        assert post.author().first()[0].id == user.id
+
     def test_lefts_and_rights_queries(self, clean_redis):
         """Test querying relations by left/right side."""
         user1 = User.create(name="User1")
@@ -338,6 +633,18 @@ class TestRelationManagers:
         assert relation is not None
         assert relation.role == "author"
 
+    def test_manager_reuse(self, clean_redis):
+        """Test that relation classes are resolved once per class, and managers built once per instance."""
+        user = User.create(name="Author")
+
+        assert user.posts() is user.posts()
+        assert user.posts().relation_class is UserPosts
+        assert User._RELATION_CLASSES == {"tests_py.core_test.UserPosts": UserPosts}
+
+        other = User.get(user.key)
+        assert other.posts() is not user.posts()
+        assert other.posts().instance is other
+
     def test_rightwards_manager_all(self, clean_redis):
         """Test getting all relations via rightwards manager."""
         user = User.create(name="Prolific Author")
@@ -418,6 +725,187 @@ class TestRelationManagers:
         assert relation.role == "editor"
         assert relation.created_at == "2024-01-20"
 
+    def test_manager_update(self, clean_redis):
+        """Test updating relation properties in place via manager."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+
+        user.posts().add(post.id, role="author", created_at="2024-01-15")
+        version = UserPosts.get_by_ids(user.id, post.id)._version
+
+        relation = user.posts().update(post.id, role="editor", created_at=None)
+        assert relation.role == "editor"
+        assert relation.created_at is None
+        assert relation._version == version + 1
+
+        # Persisted, and visible from the other side
+        _, relation = post.author().get_by_id(user.id)
+        assert relation.role == "editor"
+
+    def test_manager_update_missing_relation(self, clean_redis):
+        """Test that updating a missing or deleted relation is a no-op."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+
+        assert user.posts().update(post.id, role="editor") is None
+
+        user.posts().add(post.id, role="author")
+        user.posts().remove(post.id)
+        assert user.posts().update(post.id, role="editor") is None
+
+        with pytest.raises(AttributeError):
+            user.posts().update(post.id, invalid_field="value")
+
+    def test_manager_update_many(self, clean_redis):
+        """Test updating several relations in a single batch."""
+        user = User.create(name="User")
+        post1 = Post.create(title="Post 1")
+        post2 = Post.create(title="Post 2")
+        post3 = Post.create(title="Post 3")
+
+        user.posts().add(post1.id, role="author")
+        user.posts().add(post2.id, role="author")
+
+        relations = user.posts().update_many({
+            post1.id: {"role": "editor"},
+            post2.id: {"role": "reviewer"},
+            post3.id: {"role": "editor"},  # no such relation - skipped
+        })
+
+        assert set(relations) == {post1.id, post2.id}
+        assert UserPosts.get_by_ids(user.id, post1.id).role == "editor"
+        assert UserPosts.get_by_ids(user.id, post2.id).role == "reviewer"
+        assert UserPosts.exists(user.id, post3.id) is False
+
+    def test_save_with_relation_updates_is_atomic(self, clean_redis):
+        """Test that relation updates batched with a save are applied all or nothing."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+        user.posts().add(post.id, role="author")
+
+        stale = User.get_by_id(user.id)
+        user.name = "Renamed"
+        user = user.save(*user.posts().updates({post.id: {"role": "editor"}}))
+
+        assert user.name == "Renamed"
+        assert UserPosts.get_by_ids(user.id, post.id).role == "editor"
+
+        # A version conflict on the object aborts the relation updates too
+        stale.name = "Stale"
+        with pytest.raises(ConflictError):
+            stale.save(*stale.posts().updates({post.id: {"role": "reviewer"}}))
+
+        assert User.get_by_id(user.id).name == "Renamed"
+        assert UserPosts.get_by_ids(user.id, post.id).role == "editor"
+
+    def test_save_drops_keys(self, clean_redis):
+        """Test that keys dropped with a save are deleted atomically with it - and kept if it fails."""
+        user = User.create(name="User")
+        stale = User.get_by_id(user.id)
+        clean_redis.sadd("beside:user", "x")
+
+        user.name = "Renamed"
+        with accounting.scope() as usage:
+            user = user.save(drop=["beside:user"])
+        assert usage.round_trips == 1
+        assert not clean_redis.exists("beside:user")
+
+        clean_redis.sadd("beside:user", "x")
+        with pytest.raises(ConflictError):
+            stale.save(drop=["beside:user"])
+        assert clean_redis.exists("beside:user")
+
+    def test_manager_lookup(self, clean_redis):
+        """Test that lookup hashes follow relation creation, updates and deletion."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+
+        assert user.posts().role_of(post.id) is None
+
+        user.posts().add(post.id, role="author")
+        assert user.posts().role_of(post.id) == "author"
+        assert post.author().role_of(user.id) == "author"
+
+        user.posts().update(post.id, role="editor")
+        assert post.author().role_of(user.id) == "editor"
+
+        relation = UserPosts.get_by_ids(user.id, post.id)
+        relation.role = "reviewer"
+        relation.save()
+        assert post.author().lookup("role", user.id) == "reviewer"
+
+        UserPosts.patch(user.id, post.id, "role", "author")
+        assert post.author().role_of(user.id) == "author"
+
+        user.posts().remove(post.id)
+        assert user.posts().role_of(post.id) is None
+        assert post.author().role_of(user.id) is None
+
+        with pytest.raises(AttributeError):
+            user.posts().created_at_of(post.id)  # not a lookup field
+
+    def test_manager_lookup_many(self, clean_redis):
+        """Test retrieving lookup values of several relations at once."""
+        user = User.create(name="User")
+        post1 = Post.create(title="Post 1")
+        post2 = Post.create(title="Post 2")
+        post3 = Post.create(title="Post 3")
+
+        user.posts().add(post1.id, role="author")
+        user.posts().add(post2.id, role="editor")
+
+        assert user.posts().lookup_many("role", [post1.id, post3.id]) == {post1.id: "author"}
+        assert user.posts().lookup_many("role") == {post1.id: "author", post2.id: "editor"}
+
+    def test_manager_filter(self, clean_redis):
+        """Test that index sets follow relation writes, and filtering relations through them."""
+        user = User.create(name="User")
+        posts = [Post.create(title=f"Post {i}") for i in range(4)]
+
+        user.posts().add(posts[0].id, role="author")
+        user.posts().add(posts[1].id, role="author")
+        user.posts().add(posts[2].id, role="editor")
+        user.posts().add(posts[3].id)
+
+        assert user.posts().ids(role="author") == sorted([posts[0].id, posts[1].id])
+        assert user.posts().count(role="author") == 2
+        assert user.posts().count(role="reviewer") == 0
+        assert posts[2].author().ids(role="editor") == [user.id]
+
+        authors = user.posts().filter(role="author")
+        assert set(authors) == {posts[0].id, posts[1].id}
+        assert all(relation.role == "author" for relation in authors.values())
+
+        # moved from a set to another on update, through patch too
+        user.posts().update(posts[0].id, role="editor")
+        UserPosts.patch(user.id, posts[3].id, "role", "editor", add=True)
+        assert user.posts().ids(role="author") == [posts[1].id]
+        assert user.posts().count(role="editor") == 3
+
+        # removed on deletion
+        user.posts().remove(posts[2].id)
+        assert posts[2].id not in user.posts().ids(role="editor")
+        assert posts[2].author().count(role="editor") == 0
+
+        with pytest.raises(AttributeError):
+            user.posts().filter(created_at="today")  # not an index field
+
+    def test_reindex(self, clean_redis):
+        """Test rebuilding lookup hashes from the relations."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+        user.posts().add(post.id, role="author")
+
+        clean_redis.delete(UserPosts._left_lookup_key(user.id, "role"))
+        assert user.posts().role_of(post.id) is None
+
+        assert UserPosts.reindex() == 1
+        assert user.posts().role_of(post.id) == "author"
+
+        clean_redis.delete(UserPosts._left_index_prefix(user.id, "role") + "author")
+        assert UserPosts.reindex() == 1
+        assert user.posts().ids(role="author") == [post.id]
+
     def test_manager_first(self, clean_redis):
         """Test getting first relation via manager."""
         user = User.create(name="User")
@@ -433,9 +921,368 @@ class TestRelationManagers:
         assert first_obj.id in [post1.id, post2.id]
 
 
+class TestKeyLayout:
+    """Test the tagged key layout, and migrations from the flat one."""
+
+    def test_tagged_keys(self, clean_redis):
+        """Test a venue's keys share its cluster slot, and relations are read from both sides."""
+        venue = Venue.create(name="Hall")
+        guest = Guest.create(name="Ann")
+        venue.guests().add(guest.id, role="speaker", status="in")
+
+        assert venue.key == f"venue:{{{venue.id}}}" and Venue.get_by_id(venue.id).id == venue.id
+        assert Venue.count() == 1 and [v.id for v in Venue.page()] == [venue.id]
+
+        # the venue, the relation, and the venue side's lookup hash and index set: all in the venue's slot
+        relation_key = Attendance._key(guest.id, venue.id)
+        assert relation_key == f"attends:guest_{guest.id}:venue_{{{venue.id}}}"
+        venue_keys = [key for key in clean_redis.keys("*") if venue.id in key]
+        assert len(venue_keys) == 4
+        assert {key_slot(key.encode()) for key in venue_keys} == {key_slot(venue.key.encode())}
+        assert not clean_redis.keys(f"attends:*:guest_{guest.id}:*")  # no guest side lookups nor indexes
+
+        assert venue.guests().role_of(guest.id) == "speaker" and venue.guests().ids(status="in") == [guest.id]
+        assert guest.venues().role_of(venue.id) == "speaker"
+        assert guest.venues().lookup_many("role") == {venue.id: "speaker"}
+        assert guest.venues().ids(status="in") == [venue.id] and guest.venues().count(status="out") == 0
+        assert list(Attendance.search_iter())[0].right_id == venue.id
+
+        Attendance.update(guest.id, venue.id, status="out")
+        assert venue.guests().ids(status="out") == [guest.id] and guest.venues().count(status="out") == 1
+
+        guest.delete()
+        assert venue.guests().all() == {} and venue.guests().lookup_many("role") == {}
+
+    def test_migrate(self, clean_redis):
+        """Test objects and relations move from the flat layout, lookups and indexes included."""
+        FlatVenue, FlatGuest = Venue._in_layout("flat"), Guest._in_layout("flat")
+        FlatAttendance = type(Attendance)("Attendance", (Attendance,), {
+            "KEY_LAYOUT": "flat", "L_CLASS": FlatGuest, "R_CLASS": FlatVenue, "__slots__": (),
+        })
+
+        venue = FlatVenue.create(name="Hall")
+        guest = FlatGuest.create(name="Ann")
+        FlatAttendance.create(guest.id, venue.id, role="speaker", status="in")
+        assert venue.key == f"venue:{venue.id}" and Venue.get_by_id(venue.id) is None
+
+        assert (Venue.migrate(), Guest.migrate(), Attendance.migrate()) == (1, 1, 1)
+        assert (Venue.migrate(), Attendance.migrate()) == (0, 0)  # nothing left to move
+
+        assert Venue.get_by_id(venue.id).name == "Hall" and Venue.count() == 1
+        assert clean_redis.keys(f"*{venue.id}*") == clean_redis.keys(f"*{{{venue.id}}}*")
+        migrated = Venue.get_by_id(venue.id)
+        assert migrated.guests().role_of(guest.id) == "speaker" and migrated.guests().ids(status="in") == [guest.id]
+        assert Guest.get_by_id(guest.id).venues().role_of(venue.id) == "speaker"
+
+        with pytest.raises(ValueError):
+            Venue.migrate("unknown")
+
+    def test_layout_settings(self, monkeypatch):
+        """Test the key layout defaults to tagged on clusters, whose pub/sub clients stay plain."""
+        monkeypatch.delenv("REDIS_KEY_LAYOUT", raising=False)
+        monkeypatch.delenv("REDIS_CLUSTER", raising=False)
+        assert key_layout() == "flat" and not cluster_enabled("data")
+
+        monkeypatch.setenv("REDIS_CLUSTER", "true")
+        assert key_layout() == "tagged" and cluster_enabled("data") and not cluster_enabled("pubsub")
+
+        monkeypatch.setenv("REDIS_KEY_LAYOUT", "nested")
+        with pytest.raises(ValueError):
+            key_layout()
+
+
+class TestBatch:
+    """Test grouping operations into one round trip."""
+
+    def test_batch_reads(self, clean_redis):
+        """Test queued reads resolve once the batch exits."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+        user.posts().add(post.id, role="author")
+
+        with batch() as b:
+            loaded = b.get_by_id(User, user.id)
+            missing = b.get_by_id(User, "missing")
+            member = b.exists(UserPosts, (user.id, post.id))
+            stranger = b.exists(UserPosts, (user.id, "missing"))
+            with pytest.raises(RuntimeError):
+                loaded.result()  # not executed yet
+
+        assert loaded.result().name == "User"
+        assert missing.result() is None
+        assert member.result() is True
+        assert stranger.result() is False
+
+    def test_batch_writes(self, clean_redis):
+        """Test queued writes, their server side guards, and publishing."""
+        user = User.create(name="User")
+        post = Post.create(title="Post")
+        other = Post.create(title="Other")
+
+        pubsub = clean_redis.pubsub()
+        pubsub.subscribe("channel")
+
+        with batch() as b:
+            relation = b.add(user.posts(), post.id, role="author")
+            patched = b.patch(User, user.id, "name", "Renamed")
+            skipped = b.patch(User, "missing", "name", "Ghost")
+            updated = b.set(user.posts(), post.id, role="editor")
+            received = b.publish("channel", "user:joined::" + user.id)
+
+        assert relation.result().role == "author"
+        assert patched.result() is True and skipped.result() is False
+        obj, rel = updated.result()
+        assert obj.title == "Post" and rel.role == "editor"
+        assert received.result() == 1
+        pubsub.close()
+        assert User.get_by_id(user.id).name == "Renamed"
+        assert user.posts().role_of(post.id) == "editor"  # lookups maintained
+
+        # failed guards: the relation exists already, or one of its objects is missing
+        with pytest.raises(ConflictError):
+            with batch() as b:
+                fine = b.add(user.posts(), other.id, role="author")
+                again = b.add(user.posts(), post.id, role="author")
+        with pytest.raises(ConflictError):
+            again.result()
+        assert fine.result().role == "author"
+
+        with pytest.raises(ValueError):
+            with batch() as b:
+                b.add(user.posts(), "missing", role="author")
+        assert not UserPosts.exists(user.id, "missing")
+
+        # nothing is sent if the block raises
+        with pytest.raises(KeyError):
+            with batch() as b:
+                b.patch(User, user.id, "name", "Never")
+                raise KeyError()
+        assert User.get_by_id(user.id).name == "Renamed"
+
+
+class TestLoader:
+    """Test coalescing concurrent async loads."""
+
+    @pytest.mark.skipif(os.environ.get("REDIS_BACKEND") == "memory", reason="the async loader needs a Redis server")
+    def test_loads_per_tick(self, clean_redis):
+        """Test concurrent loads of one tick are deduplicated into a single round trip."""
+        users = [User.create(name=f"user{i}") for i in range(3)]
+        post = Post.create(title="Post")
+        users[0].posts().add(post.id, role="author")
+
+        async def main():
+            loader = Loader(create_async_client(
+                host=os.environ.get("REDIS_HOST", "localhost"),
+                port=int(os.environ.get("REDIS_PORT", "6379")),
+                db=int(os.environ.get("REDIS_DATA_DB", "1")),
+            ))
+
+            loads = [loader.get_by_id(User, users[i % 3].id) for i in range(30)]
+            checks = [loader.exists(UserPosts, (user.id, post.id)) for user in users]
+            results = await asyncio.gather(*loads, *checks, loader.get_by_id(User, "missing"))
+            assert loader.round_trips == 1
+
+            loaded, checked, missing = results[:30], results[30:33], results[33]
+            assert [user.name for user in loaded] == [users[i % 3].name for i in range(30)]
+            assert checked == [True, False, False]
+            assert missing is None
+
+            # next tick, next round trip - updates included
+            updated, relation = await asyncio.gather(
+                loader.update(User, users[1].id, name="Renamed"),
+                loader.update(UserPosts, (users[0].id, post.id), role="editor"),
+            )
+            assert loader.round_trips == 2
+            assert updated.name == "Renamed" and relation.role == "editor"
+            assert await loader.update(User, "missing", name="Ghost") is None
+            await asyncio.sleep(0)
+            assert not loader._flushes  # flushes are held while in flight only
+
+            await loader.client.connection_pool.disconnect()
+
+        asyncio.run(main())
+        assert users[0].posts().role_of(post.id) == "editor"
+
+
+class TestMemoryBackend:
+    """Test the in-process memory backend against Redis semantics - no server needed."""
+
+    def test_interface(self):
+        """Test both backends provide the whole storage interface."""
+        for methods in INTERFACE.values():
+            for method in methods:
+                assert callable(getattr(redis.Redis, method, None)), method
+                assert callable(getattr(MemoryBackend, method, None)), method
+
+    def test_commands(self):
+        """Test hash, set and sorted set commands, types and expiry."""
+        r = MemoryBackend()
+        assert r.hset("h", mapping={"a": 1, "b": 2.5}) == 2
+        assert r.hgetall("h") == {"a": "1", "b": "2.5"}
+        assert r.hincrby("h", "a", 2) == 3
+        assert r.hdel("h", "a", "b") == 2
+        assert not r.exists("h")  # empty hashes do not exist
+
+        r.sadd("s", "x", "y")
+        with pytest.raises(redis.ResponseError):
+            r.hget("s", "x")
+        with pytest.raises(redis.DataError):
+            r.hset("h", "flag", True)
+
+        r.zadd("z", {"a": 2, "b": 1, "c": 3})
+        assert r.zrange("z", 0, -1) == ["b", "a", "c"]
+        assert r.zrange("z", 1, 1) == ["a"]
+        assert r.zrank("z", "c") == 2
+        assert r.zadd("z", {"a": 0}, nx=True) == 0 and r.zscore("z", "a") == 2
+
+        assert r.expire("s", 60)
+        assert 0 < r.ttl("s") <= 60 and r.ttl("z") == -1 and r.ttl("missing") == -2
+        r.expire("s", 0)
+        assert not r.exists("s")
+
+    def test_scan(self):
+        """Test SCAN returns every key existing throughout the iteration exactly once."""
+        r = MemoryBackend()
+        for i in range(25):
+            r.hset(f"k{i:02}", "f", i)
+        r.sadd("kset", "x")
+
+        cursor, seen = r.scan(0, match="k*", count=10, _type="hash")
+        r.delete("k00", "k24")
+        r.hset("k99", "f", 99)
+        while cursor:
+            cursor, keys = r.scan(cursor, match="k*", count=10, _type="hash")
+            seen += keys
+
+        assert len(seen) == len(set(seen))
+        assert {f"k{i:02}" for i in range(1, 24)} <= set(seen)
+        assert "kset" not in seen
+
+        # completed iterations release their cursor, abandoned ones are dropped beyond SCAN_CURSORS
+        assert not r._cursors
+        for _ in range(SCAN_CURSORS + 10):
+            r.scan(0, count=1)
+        assert len(r._cursors) == SCAN_CURSORS
+
+    def test_thread_safety(self):
+        """Test concurrent commands and pipelines."""
+        r = MemoryBackend()
+        torn = []
+
+        def work():
+            for _ in range(200):
+                r.hincrby("counter", "n")
+                with r.pipeline() as pipe:
+                    a, b = pipe.hincrby("pair", "a").hincrby("pair", "b").execute()
+                    if a != b:
+                        torn.append((a, b))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert r.hget("counter", "n") == "1600"
+        assert not torn  # pipelines run as a whole
+
+    def test_scripts_and_pubsub(self):
+        """Test the ORM's scripts run in memory, and messages reach subscribers."""
+        r = MemoryBackend()
+        set_redis_client(r)
+
+        user = User.create(name="Alice")
+        post = Post.create(title="Post")
+        user.posts().add(post.id, role="author")
+        user.name = "Renamed"
+        user.save()
+        assert User.get_by_id(user.id).name == "Renamed"
+        assert user.posts().role_of(post.id) == "author"
+        assert [u.id for u in User.page(limit=10)] == [user.id]
+
+        with pytest.raises(redis.ResponseError):
+            r.eval("return 1", 0)  # no Python implementation
+
+        pubsub = r.pubsub()
+        pubsub.subscribe("channel")
+        assert r.publish("channel", "hello") == 1
+        assert pubsub.get_message(ignore_subscribe_messages=True)["data"] == "hello"
+        pubsub.close()
+        assert r.publish("channel", "nobody") == 0
+
+
 class TestRedisOperations:
     """Test Redis-specific functionality."""
+
+    @pytest.mark.skipif(os.environ.get("REDIS_BACKEND") == "memory", reason="the memory backend has no pools")
+    def test_client_registry(self, monkeypatch):
+        """Test clients are shared per role, on bounded pools configured from the environment."""
+        monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "4")
+        monkeypatch.setenv("REDIS_PUBSUB_MAX_CONNECTIONS", "2")
+        reset_connection()
+        try:
+            data = get_redis_client()
+            assert data is get_client("data") and data.connection_pool.max_connections == 4
+            assert get_client("pubsub") is get_client("pubsub")
+            assert get_client("pubsub").connection_pool.max_connections == 2
+            with pytest.raises(ValueError):
+                get_client("unknown")
+
+            data.ping()
+            assert pool_stats()["data"] == {"max": 4, "created": 1, "in_use": 0, "idle": 1, "utilization": 0.0}
+
+            pubsub = data.pubsub()
+            pubsub.subscribe("channel")  # holds a connection until closed
+            assert pool_stats()["data"]["in_use"] == 1
+            pubsub.close()
+            assert pool_stats()["data"]["in_use"] == 0
+        finally:
+            reset_connection()
     
+    def test_replica_reads(self, clean_redis):
+        """Test reads go to replicas, until the scope writes - then to the primary, reading its own writes."""
+        user = User.create(name="Alice")
+        set_replica_clients([MemoryBackend()])  # a replica lagging behind: nothing replicated yet
+        try:
+            with read_scope():
+                assert User.get_by_id(user.id) is None and User.count() == 0
+                User.update(user.id, name="Bob")
+                assert User.get_by_id(user.id).name == "Bob"
+
+            with read_scope():
+                assert not User.exists(user.id)
+            with read_scope(primary=True):
+                assert User.exists(user.id)
+
+            assert User.get_by_id(user.id).name == "Bob"  # outside scopes, the context stuck to the primary
+        finally:
+            set_replica_clients([])
+
+    def test_accounting(self, clean_redis, caplog):
+        """Test scopes count their commands and round trips, and warn of a round trip repeated per item (N+1)."""
+        users = [User.create(name=f"User {i}") for i in range(12)]
+        keys = [user.key for user in users]
+
+        with accounting.scope("one by one") as usage:
+            for key in keys:
+                User.get(key)
+        assert usage.commands == usage.round_trips == 12
+        assert list(usage.repeated()) == [f"HGETALL {accounting.key_pattern(keys[0])}"]
+        assert "N+1" in caplog.text
+
+        with accounting.scope("pipelined") as usage:
+            User.get_many(keys)
+            with accounting.scope("nested") as nested:
+                get_redis_client().exists(keys[0])
+        assert (usage.commands, usage.round_trips) == (12, 1) and usage.repeated() == {}
+        assert (nested.commands, nested.round_trips) == (1, 1)
+        assert usage.elapsed >= usage.redis_time > 0
+
+        assert accounting.current() is None
+        User.get(keys[0])  # outside of any scope: not counted
+        assert accounting.key_pattern("member:lookup:{4f2a}") == "member:lookup:{*}"
+        assert accounting.key_pattern("reactions:room_4f2a:user_0b1c") == "reactions:room_*:user_*"
+
     def test_redis_connection_info(self, clean_redis):
         """Test Redis connection and get version info."""
         info = clean_redis.info()
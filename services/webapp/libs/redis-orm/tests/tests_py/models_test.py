@@ -7,11 +7,11 @@ import sys
 import os
 sys.path.insert(0, '/app')
 # Simple Redis fixture
-from core import set_redis_client, create_redis_client
+from core import set_redis_client, create_client
 
 @pytest.fixture(scope="function") 
 def redis_client():
-    client = create_redis_client(
+    client = create_client(
         host=os.environ.get('REDIS_HOST', 'localhost'),
         port=int(os.environ.get('REDIS_PORT', '6379')),
         db=int(os.environ.get('REDIS_DATA_DB', '1'))
@@ -1,3 +1,3 @@
 from .logs import LOG_LEVEL, get_logger
-from .websocket import publish
+from .websocket import publish, event
 from .time import now
\ No newline at end of file
@@ -1,26 +1,27 @@
 
-import redis
-import os, json
+import json
+
+from core import get_client
 
 import utils
 log = utils.get_logger(__name__)
 
-redis_pubsub = redis.Redis(
-            host=os.environ.get("REDIS_HOST"),
-            db=os.environ.get("REDIS_PUBSUB_DB"),
-            decode_responses=True
-        )
-
 
-def publish(room_id, key, value):
+def event(key, value):
+    """Formats a room event as published - e.g. for ORM batches, see core.batch()"""
 
     # If value is not a string, we assume it's a more complex structure and JSON-encode it
     if not isinstance(value, str):
         value = json.dumps(value)
 
     # Create the message with 'key::value' format
-    message = f"{key}::{value}"
+    return f"{key}::{value}"
+
+
+def publish(room_id, key, value):
+
+    message = event(key, value)
 
-    # Publish the message to the Redis channel (room_id)
-    redis_pubsub.publish(room_id, message)
+    # Publish the message to the Redis channel (room_id) - through the process' shared pubsub client
+    get_client("pubsub").publish(room_id, message)
     log.debug(f"Publishing '{message}' to Room {room_id}")
@@ -0,0 +1,188 @@
+"""
+Redis round trip budgets of the public API and the websocket flow - performance regressions, such as a new
+N+1 query, fail here rather than in production.
+
+Each endpoint declares its budget: upper bounds on its round trips and commands, set or growing with the size
+of the room - a duo, the integration test's 12 and a crowded 50 (see conftest.ROOM_SIZES). Requests run in
+testing mode, which returns their Redis usage as X-Redis-* headers (see core.accounting).
+"""
+
+import asyncio
+import json
+from typing import Callable, NamedTuple, Union
+
+from core import accounting
+
+
+class Budget(NamedTuple):
+    """Upper bounds of the Redis usage of a call - each a number, or a function of the room size (members)."""
+    round_trips: Union[int, Callable[[int], int]]
+    commands: Union[int, Callable[[int], int]]
+
+    def check(self, name: str, usage: dict, members: int) -> None:
+        for measure, bound in zip(("round_trips", "commands"), self):
+            bound = bound(members) if callable(bound) else bound
+            assert usage[measure] <= bound, f"{name}: {usage[measure]} {measure} in a room of {members}, budget {bound}"
+
+
+# Budgets by endpoint (see public/api/routes.py), logged in requests loading their user first. Relation listings
+# (to_dict(True)) scan the keyspace, see the ORM README's known issues: their round trips grow with the data -
+# here with the room, each member adding a user, a code and their relations.
+BUDGETS = {
+    "public_api.room_get": Budget(lambda n: 8 + n, lambda n: 12 + 3 * n),
+    "public_api.round_new": Budget(7, 8),
+    "public_api.room_join": Budget(5, 10),  # a script load on Redis the first time, the membership checking both objects, the announce on the pubsub client
+    "public_api.room_message": Budget(12, 24),
+    "public_api.message_react": Budget(5, 6),
+    "public_api.card_score": Budget(6, 9),
+    "public_api.room_patch": Budget(7, 10),
+    "public_api.card_peekers": Budget(1, 1),
+    "public_api.room_user": Budget(6, 6),
+    "public_api.qr_code": Budget(1, 1),
+    "public_api.auth_login": Budget(lambda n: 14 + 3 * n // 2, lambda n: 16 + 3 * n // 2),
+    "public_api.me": Budget(lambda n: 11 + 3 * n // 2, lambda n: 13 + 3 * n // 2),
+    "public_api.auth_logout": Budget(1, 1),
+    "public_api.auth_ping": Budget(1, 1),
+}
+
+# Budgets of the websocket service, by event - the first connection to a room subscribes to it
+WEBSOCKET_BUDGETS = {
+    "connect": Budget(4, 4),
+    "broadcast": Budget(1, 1),
+    "disconnect": Budget(4, 4),
+}
+
+
+def usage_of(response) -> dict:
+    return {
+        "round_trips": int(response.headers["X-Redis-Round-Trips"]),
+        "commands": int(response.headers["X-Redis-Commands"]),
+    }
+
+
+def call(room, user, method: str, url: str, status: int = 200, **kwargs) -> dict:
+    """Calls an endpoint as a room member, and checks it against its budget - returns its usage."""
+    client = room.client(user)
+    response = client.open(url, method=method, **kwargs)
+    assert response.status_code == status, response.get_data(as_text=True)
+
+    endpoint = room.app.url_map.bind("localhost").match(url.split("?")[0], method=method)[0]
+    usage = usage_of(response)
+    BUDGETS[endpoint].check(endpoint, usage, len(room))
+    return usage
+
+
+class TestPublicApi:
+    """Every public API endpoint stays within its budget, in rooms of every size."""
+
+    def test_budgets_declared(self, app):
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.startswith("public_api.")}
+        assert endpoints == set(BUDGETS)
+
+    def test_room_get(self, room):
+        call(room, room.member("player"), "GET", f"/api/v1/rooms/{room.room.id}")
+        call(room, None, "GET", f"/api/v1/rooms/{room.room.id}")
+
+    def test_round_new(self, room):
+        call(room, room.member("master"), "POST", f"/api/v1/rooms/{room.room.id}/round")
+
+    def test_room_join(self, room):
+        from models import Code, User
+
+        user = User.create(name="Newcomer")
+        code = Code.create()
+        user.codes().add(code.id, type="login")
+        room.users.append(user)
+        room.codes.append(code.id)
+        call(room, user, "POST", f"/api/v1/rooms/{room.room.id}/join")
+
+    def test_room_message(self, room):
+        call(room, room.member("player"), "POST", f"/api/v1/rooms/{room.room.id}/message", json={"content": "Hello"})
+
+    def test_message_react(self, room):
+        url = f"/api/v1/rooms/{room.room.id}/messages/m0/react"
+        call(room, room.member("player"), "PATCH", url, json={"emoji": "👍", "action": "add"})
+
+    def test_card_score(self, room):
+        card_id = room.card_of(room.member("player"))
+        url = f"/api/v1/rooms/{room.room.id}/cards/{card_id}/score"
+        call(room, room.member("master"), "PATCH", url, json={"scored": 7})
+
+    def test_room_patch(self, room):
+        player = room.member("player")
+        card_id = room.card_of(player)
+        call(room, player, "PATCH", f"/api/v1/rooms/{room.room.id}?cards:{card_id}:flipped=False")
+
+    def test_card_peekers(self, room):
+        card_id = room.card_of(room.member("player"))
+        call(room, None, "GET", f"/api/v1/rooms/{room.room.id}/cards/{card_id}/peekers")
+
+    def test_room_user(self, room):
+        player = room.member("player")
+        call(room, player, "PATCH", f"/api/v1/rooms/{room.room.id}/user/{player.id}?next=watcher")
+
+    def test_qr_code(self, room):
+        call(room, room.member("player"), "GET", "/api/v1/qrcode?link=https://example.com")
+
+    def test_auth(self, room):
+        user = room.member("player")
+        client = room.app.test_client()
+        response = client.post(f"/api/auth/login?code_id={room.codes[room.users.index(user)]}")
+        assert response.status_code == 200
+        BUDGETS["public_api.auth_login"].check("public_api.auth_login", usage_of(response), len(room))
+
+        for method, url, endpoint in (
+            ("GET", "/api/auth/me", "public_api.me"),
+            ("GET", "/api/auth/test", "public_api.auth_ping"),
+            ("POST", "/api/auth/logout", "public_api.auth_logout"),
+        ):
+            response = client.open(url, method=method)
+            assert response.status_code == 200
+            BUDGETS[endpoint].check(endpoint, usage_of(response), len(room))
+
+
+class FakeWebSocket:
+    """A connected browser: accepts, and records what it is sent."""
+
+    def __init__(self):
+        self.received = []
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        self.received.append(data)
+
+
+def test_websocket_flow(room, websocket_service):
+    """Each member connects, one broadcasts to the room, then each disconnects - every event within its budget."""
+    async def flow():
+        manager = websocket_service.WebSocketManager()
+        sockets = [FakeWebSocket() for _ in room.users]
+        events = {"connect": [], "broadcast": [], "disconnect": []}
+
+        for user, socket in zip(room.users, sockets):
+            with accounting.scope("connect") as usage:
+                await manager.add_user_to_room(room.room.id, user.id, socket)
+            events["connect"].append(usage)
+
+        with accounting.scope("broadcast") as usage:
+            await manager.broadcast_to_room(room.room.id, f"user:{room.users[0].id}:ping::{json.dumps('hi')}")
+        events["broadcast"].append(usage)
+
+        for _ in range(100):  # the message goes through Redis pub/sub
+            if all(socket.received for socket in sockets):
+                break
+            await asyncio.sleep(0.01)
+        assert all(socket.received for socket in sockets)
+
+        for user, socket in zip(room.users, sockets):
+            with accounting.scope("disconnect") as usage:
+                await manager.remove_user_from_room(room.room.id, user.id, socket)
+            events["disconnect"].append(usage)
+        return events
+
+    for event, usages in asyncio.run(flow()).items():
+        for usage in usages:
+            usage = {"round_trips": usage.round_trips, "commands": usage.commands}
+            WEBSOCKET_BUDGETS[event].check(event, usage, len(room))
@@ -0,0 +1,107 @@
+"""
+Pytest configuration for the web app tests: the Flask app, the websocket service and rooms to run them against.
+Runs on the memory backend by default - or on Redis with REDIS_HOST set, which the websocket tests require.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("libs/redis-orm", "libs", "websocket", "flask"):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+if not os.environ.get("REDIS_HOST"):
+    os.environ.setdefault("REDIS_BACKEND", "memory")
+os.environ.setdefault("DD_TRACE_ENABLED", "false")
+
+import pytest
+from core import get_redis_client, reset_connection
+
+# Room sizes, in members: a duo, the integration test's room (box test) and a crowded one
+ROOM_SIZES = [2, 12, 50]
+
+
+class RoomSetup:
+    """A room with members of every role and a round dealt, whose members log in with their own test client."""
+
+    def __init__(self, app, size: int):
+        from models import Code, Room, User
+
+        self.app = app
+        self.room = Room.create(name=f"Room of {size}")
+        masters = max(1, size // 6)
+        players = min((size - masters + 1) // 2, 10)  # a round deals 10 cards at most
+        self.roles = ["master"] * masters + ["player"] * players + ["watcher"] * (size - masters - players)
+
+        self.users, self.codes = [], []
+        for i, role in enumerate(self.roles):
+            user = User.create(name=f"User {i}")
+            code = Code.create()
+            user.codes().add(code.id, type="login")
+            self.room.users().add(user.id, role=role, next=role)
+            self.users.append(user)
+            self.codes.append(code.id)
+
+        self.round, self.cards = self.room.new_round()
+        for i in range(3):
+            Room.patch(self.room.id, f"messages:m{i}:content", f"Message {i}", add=True)
+            Room.patch(self.room.id, f"messages:m{i}:author", self.users[0].id, add=True)
+        self.room = Room.get_by_id(self.room.id)
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def member(self, role: str):
+        """The first member of a role."""
+        return self.users[self.roles.index(role)]
+
+    def card_of(self, user) -> str:
+        """The id of the card dealt to a player."""
+        return next(card_id for card_id, card in self.cards.items() if card["player_id"] == user.id)
+
+    def client(self, user=None):
+        """A test client, logged in as a member - anonymous without one."""
+        client = self.app.test_client()
+        if user is not None:
+            response = client.post(f"/api/auth/login?code_id={self.codes[self.users.index(user)]}")
+            assert response.status_code == 200
+        return client
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The Flask app - in testing mode, returning the Redis usage of each request as X-Redis-* headers."""
+    from app import init_app
+
+    app = init_app()
+    app.config.update(SECRET_KEY="tests", TESTING=True)
+    return app
+
+
+@pytest.fixture
+def clean_redis(app):
+    """Ensure clean Redis state for each test."""
+    client = get_redis_client()
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture(params=ROOM_SIZES, ids=lambda size: f"{size}-members")
+def room(request, app, clean_redis) -> RoomSetup:
+    """A room of each size in ROOM_SIZES."""
+    return RoomSetup(app, request.param)
+
+
+@pytest.fixture
+def websocket_service(clean_redis):
+    """The websocket service's module - on Redis only, as it loads and publishes through asyncio clients."""
+    if os.environ.get("REDIS_BACKEND") == "memory":
+        pytest.skip("the websocket service requires Redis (REDIS_HOST)")
+
+    from core import aio
+    import managers
+
+    yield managers
+    aio.reset_connection()  # asyncio clients are bound to their test's event loop
+    reset_connection()
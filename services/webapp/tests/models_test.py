@@ -0,0 +1,36 @@
+"""
+Game models: what rooms keep beside them.
+"""
+
+from core import get_redis_client
+
+
+def test_reactions_leave_with_members(room):
+    """A member's reactions set goes with their membership - whether they leave, or the room is deleted."""
+    leaving, staying = room.member("player"), room.member("master")
+    for user in (leaving, staying):
+        room.room.react("m0", "👍", user.id)
+    client = get_redis_client()
+    assert client.exists(room.room.reactions_key(leaving.id), room.room.reactions_key(staying.id)) == 2
+
+    room.room.users().remove(leaving.id)
+    assert not client.exists(room.room.reactions_key(leaving.id))
+    assert client.exists(room.room.reactions_key(staying.id))
+
+    room.room.delete()
+    assert not client.exists(room.room.reactions_key(staying.id))
+
+
+def test_new_round_resets_reactions(room):
+    """A new round drops every member's reactions set within its own atomic save - no extra round trip."""
+    from core import accounting
+    from models import Room
+
+    player = room.member("player")
+    room.room.react("m0", "👍", player.id)
+    current = Room.get_by_id(room.room.id)
+
+    with accounting.scope() as usage:
+        current.new_round()
+    assert usage.round_trips == 3  # both lookups of the members, then the save
+    assert not get_redis_client().exists(room.room.reactions_key(player.id))
@@ -0,0 +1,37 @@
+"""
+API routes: request validation, and streamed admin listings.
+"""
+
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("field", ["peeked", "peeked:{user}:x", "flipped:x", ""])
+def test_room_patch_rejects_card_paths(room, field):
+    """Only cards:<card_id>:flipped and cards:<card_id>:peeked:<user_id> can be patched - nothing deeper."""
+    from models import Room
+
+    player = room.member("player")
+    card_id = room.card_of(player)
+    key = f"cards:{card_id}:{field.format(user=player.id)}".rstrip(":")
+
+    response = room.client(player).patch(f"/api/v1/rooms/{room.room.id}?{key}=True")
+    assert response.status_code == 400
+    assert Room.get_by_id(room.room.id).cards[card_id] == room.room.cards[card_id]
+
+
+def test_admin_listing_skips_deleted_objects(room):
+    """Listings stream every registered object, whatever was deleted before or while streaming."""
+    client = room.app.test_client()
+    room.users[-1].delete()
+
+    response = client.get("/admin/api/users", buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)  # headers are sent: delete what the listing has yet to stream
+    for user in room.users[1:-1]:
+        user.delete()
+    users = json.loads(b"".join([first, *chunks]))
+
+    assert response.status_code == 200
+    assert room.users[0].id in users and room.users[-1].id not in users
@@ -3,6 +3,7 @@ from ddtrace import tracer
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from managers import WebSocketManager
+from core import accounting
 
 import utils
 log = utils.get_logger(__name__)
@@ -27,7 +28,9 @@ socket_manager = WebSocketManager()
 @app.websocket("/ws/{room_id}/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
     
-    await socket_manager.add_user_to_room(room_id, user_id, websocket)
+    # Each event is an accounting scope: its Redis usage is logged, as a web request's
+    with accounting.scope("ws connect"):
+        await socket_manager.add_user_to_room(room_id, user_id, websocket)
 
     try:
 
@@ -36,12 +39,13 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
             data = await websocket.receive_text()
             key, value = data.split("::")
 
-            with tracer.trace("receive"):
+            with tracer.trace("receive"), accounting.scope(f"ws {key}"):
                 message = f"user:{user_id}:{key}::{value}"
                 await socket_manager.broadcast_to_room(room_id, message)
 
     except WebSocketDisconnect:
 
-        await socket_manager.remove_user_from_room(room_id, user_id, websocket)
+        with accounting.scope("ws disconnect"):
+            await socket_manager.remove_user_from_room(room_id, user_id, websocket)
 
 
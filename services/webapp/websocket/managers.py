@@ -1,9 +1,10 @@
 import asyncio
 import redis.asyncio as aioredis
-import os
 from fastapi import WebSocket
 
-from models import User
+from models import UsersRooms
+from core import accounting
+from core.aio import Loader, get_async_client
 
 import utils
 log = utils.get_logger(__name__)
@@ -19,22 +20,17 @@ class RedisPubSubManager:
     """
 
     def __init__(self):
-        self.redis_host = os.environ.get("REDIS_HOST")
-        self.redis_port = 6379
-        self.redis_db   = os.environ.get("REDIS_PUBSUB_DB")
         self.pubsub = None
 
     async def _get_redis_connection(self) -> aioredis.Redis:
         """
-        Establishes a connection to Redis.
+        Gets the process' shared pubsub client - each subscriber holds one connection of its pool
+        (see REDIS_PUBSUB_MAX_CONNECTIONS).
 
         Returns:
             aioredis.Redis: Redis connection object.
         """
-        return aioredis.Redis(host=self.redis_host,
-                              port=self.redis_port,
-                              db=self.redis_db,
-                              auto_close_connection_pool=False)
+        return get_async_client("pubsub")
 
     async def connect(self) -> None:
         """
@@ -85,9 +81,11 @@ class WebSocketManager:
         Attributes:
             rooms (dict): A dictionary to store WebSocket connections in different rooms.
             pubsub_client (RedisPubSubManager): An instance of the RedisPubSubManager class for pub-sub functionality.
+            loader (Loader): Async ORM access - the reads and writes of concurrent connections share round trips.
         """
         self.rooms: dict = {}
         self.pubsub_client = RedisPubSubManager()
+        self.loader = Loader(get_async_client("data"))
 
     async def add_user_to_room(self, room_id: str, user_id: str, websocket: WebSocket) -> None:
         """
@@ -116,8 +114,9 @@ class WebSocketManager:
             await ready_event.wait()
 
         try:
-            User.get_by_id(user_id).rooms().set(room_id, status="online")
-            utils.publish(room_id, "user:online", user_id)
+            # Neither the user nor the room need loading, and a burst of connects shares a round trip
+            if await self.loader.update(UsersRooms, (user_id, room_id), status="online"):
+                utils.publish(room_id, "user:online", user_id)
 
         except Exception as e:
             log.debug(f"Exception: {e}")
@@ -153,8 +152,9 @@ class WebSocketManager:
 
 
         try:
-            User.get_by_id(user_id).rooms().set(room_id, status="offline")
-            utils.publish(room_id, "user:offline", user_id)
+            # Neither the user nor the room need loading, and a burst of disconnects shares a round trip
+            if await self.loader.update(UsersRooms, (user_id, room_id), status="offline"):
+                utils.publish(room_id, "user:offline", user_id)
         except Exception as e:
             log.debug(f"Exception: {e}")
             pass # legit exception for visitors
@@ -171,6 +171,8 @@ class WebSocketManager:
             ready_event (asyncio.Event): Optional event to signal when the reader is ready.
 
         """
+        accounting.detach()  # the reader outlives the connect event which spawned it
+
         if ready_event:
             ready_event.set()  # Signal that the reader is ready
             
@@ -178,9 +180,9 @@ class WebSocketManager:
             message = await pubsub_subscriber.get_message(ignore_subscribe_messages=True)
             if message is not None:
 
-                room_id = message['channel'].decode('utf-8')
+                room_id = message['channel']  # shared clients decode responses
                 all_sockets = self.rooms[room_id]
                 for socket in all_sockets:
 
-                    data = message['data'].decode('utf-8')
+                    data = message['data']
                     await socket.send_text(data)